@@ -0,0 +1,753 @@
+"""Py Replay Benchmarks
+
+This script measures the performance of the recorder and the player without driving a real desktop: fake pynput
+listeners and controllers are injected into record_events and replay_events. It covers the listener callbacks cost,
+the recorder throughput at synthetic event rates, load time and memory of big recordings, the scheduler lateness,
+the loop mode overhead, the frame coalesced mouse injection, the storage codecs and the startup time. Results are written as json so different runs can be compared.
+
+Usage:
+    python bench.py [--output FILE] [--only NAME ...] [--sizes N ...] [--huge]
+
+Author: Facundo Giacconi AKA "GiacconiDev"
+
+"""
+
+import argparse
+import enum
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+
+# ---------------------------- CONSTANTS ------------------------------- #
+
+CALLBACK_SAMPLES = 100_000
+STARTUP_RUNS = 5
+THROUGHPUT_RATES = (1000, 2500, 5000, 10000)
+THROUGHPUT_SECONDS = 1.0
+LOAD_SIZES = (10_000, 1_000_000)
+# Size of the load benchmark only run with --huge, its plan needs several GB of memory
+HUGE_LOAD_SIZE = 10_000_000
+# json recordings bigger than this are not measured, they would need several GB of memory
+JSON_MAX_EVENTS = 1_000_000
+SCHEDULER_EVENTS = 2000
+SCHEDULER_INTERVAL = 0.002
+LOOP_PASSES = 20
+LOOP_EVENTS = 5000
+FRAME_EVENTS = 2000
+FRAME_INTERVAL = 0.001
+FRAME_RATES = (0, 60, 120)
+CODEC_EVENTS = 200_000
+
+DEFAULT_OUTPUT = "bench_results.json"
+
+CODE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Modules of the recorder and the player, imported without any GUI library
+CORE_MODULES = ("options", "storage", "plan", "record", "replay")
+
+# Globals of the recorder set by the callback benchmark, restored afterwards
+RECORDER_GLOBALS = ("recording", "stop_recording_key", "raw_events", "writer", "last_event", "start_time",
+                    "start_stamp", "last_stamp", "move_sampler")
+
+# ---------------------------- FUNCTIONS ------------------------------- #
+
+class FakeCharKey:
+    """Fake Char Key
+
+    Stand-in for a pynput character key received by the listeners.
+
+    Args:
+        char (str): The character of the key.
+    """
+
+    def __init__(self, char):
+        self.char = char
+
+    def __str__(self):
+        return f"'{self.char}'"
+
+
+class FakeKey(enum.Enum):
+    """Fake Key
+
+    Stand-in for pynput's Key enum.
+    """
+    alt = 1
+    backspace = 2
+    ctrl = 3
+    enter = 4
+    esc = 5
+    shift = 6
+    space = 7
+    tab = 8
+
+
+class FakeButton(enum.Enum):
+    """Fake Button
+
+    Stand-in for pynput's mouse Button enum.
+    """
+    left = 1
+    middle = 2
+    right = 3
+
+
+class FakeKeyCode:
+    """Fake Key Code
+
+    Stand-in for pynput's KeyCode.
+
+    Args:
+        vk (int): The virtual key code.
+    """
+
+    def __init__(self, vk=None):
+        self.vk = vk
+
+    @classmethod
+    def from_vk(cls, vk):
+        return cls(vk)
+
+
+class FakeKeyboardController:
+    """Fake Keyboard Controller
+
+    Stand-in for pynput's keyboard Controller, counting the injected events.
+    """
+
+    def __init__(self):
+        self.injected = 0
+
+    def press(self, key):
+        self.injected += 1
+
+    def release(self, key):
+        self.injected += 1
+
+
+class FakeMouseController:
+    """Fake Mouse Controller
+
+    Stand-in for pynput's mouse Controller, counting the injected events.
+    """
+
+    def __init__(self):
+        self.injected = 0
+        self._position = (0, 0)
+
+    @property
+    def position(self):
+        return self._position
+
+    @position.setter
+    def position(self, position):
+        self.injected += 1
+        self._position = position
+
+    def press(self, button):
+        self.injected += 1
+
+    def release(self, button):
+        self.injected += 1
+
+    def scroll(self, dx, dy):
+        self.injected += 1
+
+
+def fake_listeners(rate, count, stop_key):
+    """Fake Listeners
+
+    Builds fake listener classes: the mouse listener fires synthetic events at a fixed rate from its own thread,
+    timing every callback, and once it is done the keyboard listener presses the stop recording key.
+
+    Args:
+        rate (int): Events per second.
+        count (int): Number of events.
+        stop_key (str): The stop recording key.
+
+    Returns:
+        tuple: The keyboard listener class, the mouse listener class and the list filled with callback timings.
+    """
+    generated = threading.Event()
+    timings = []
+
+    class FakeListener:
+        def __init__(self, **callbacks):
+            self.callbacks = callbacks
+            self.stopped = False
+            self.thread = threading.Thread(target=self.run)
+
+        def start(self):
+            self.thread.start()
+
+        def stop(self):
+            self.stopped = True
+
+        def join(self):
+            self.thread.join()
+
+        def is_alive(self):
+            return self.thread.is_alive()
+
+    class FakeMouseListener(FakeListener):
+        def run(self):
+            perf_counter_ns = time.perf_counter_ns
+            begin = time.perf_counter()
+            for i in range(count):
+                if self.stopped:
+                    break
+                remaining = begin + i / rate - time.perf_counter()
+                if remaining > 0:
+                    time.sleep(remaining)
+                kind = i % 20
+                x, y = (i * 7) % 1920, (i * 3) % 1080
+                call_begin = perf_counter_ns()
+                if kind < 18:
+                    result = self.callbacks['on_move'](x, y)
+                elif kind == 18:
+                    result = self.callbacks['on_click'](x, y, FakeButton.left, i % 40 == 18)
+                else:
+                    result = self.callbacks['on_scroll'](x, y, 0, -1)
+                timings.append(perf_counter_ns() - call_begin)
+                if result is False:
+                    break
+            generated.set()
+
+    class FakeKeyboardListener(FakeListener):
+        def run(self):
+            generated.wait()
+            self.callbacks['on_press'](FakeCharKey(stop_key))
+
+    return FakeKeyboardListener, FakeMouseListener, timings
+
+def synthetic_events(count, interval=0.01):
+    """Synthetic Events
+
+    Generates a synthetic recording mixing moves, clicks, scrolls and key presses.
+
+    Args:
+        count (int): Number of events.
+        interval (float): Seconds between events.
+
+    Yields:
+        dict: The recorded events.
+    """
+    keys = [key.name for key in FakeKey] + ['a', 'b', 'c']
+    for i in range(count):
+        kind = i % 20
+        event_time = i * interval
+        x, y = (i * 7) % 1920, (i * 3) % 1080
+        if kind < 14:
+            yield {'action': 'moved', 'x': x, 'y': y, 'time': event_time, 'duration': interval}
+        elif kind in (14, 15):
+            yield {'action': 'pressed_mouse' if kind == 14 else 'released_mouse', 'button': 'left', 'x': x, 'y': y, 'time': event_time, 'duration': interval}
+        elif kind == 16:
+            yield {'action': 'scroll', 'vertical_direction': -1, 'horizontal_direction': 0, 'x': x, 'y': y, 'time': event_time, 'duration': interval}
+        elif kind == 17:
+            yield {'action': 'pressed_key', 'vk': 65, 'time': event_time, 'duration': interval}
+        else:
+            yield {'action': 'pressed_key' if kind == 18 else 'released_key', 'key': keys[i % len(keys)], 'time': event_time, 'duration': interval}
+
+def percentile(values, fraction):
+    """Percentile
+
+    Returns the value below which a fraction of the sorted values fall.
+
+    Args:
+        values (list): The sorted values.
+        fraction (float): The fraction, between 0 and 1.
+
+    Returns:
+        The percentile value.
+    """
+    if not values:
+        return 0
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def summarize_ns(samples):
+    """Summarize Nanoseconds
+
+    Builds the summary of a list of timings in nanoseconds.
+
+    Args:
+        samples (list): The timings.
+
+    Returns:
+        dict: mean, p50, p99 and max of the timings.
+    """
+    samples = sorted(samples)
+    return {
+        'samples': len(samples),
+        'mean_ns': statistics.fmean(samples) if samples else 0,
+        'p50_ns': percentile(samples, 0.50),
+        'p99_ns': percentile(samples, 0.99),
+        'max_ns': samples[-1] if samples else 0,
+    }
+
+def synthetic_callbacks(record, count):
+    """Synthetic Callbacks
+
+    Builds a list of listener callback invocations mixing moves, clicks, scrolls and key presses.
+
+    Args:
+        record (module): The record module.
+        count (int): Number of invocations.
+
+    Returns:
+        list: (callback, args) pairs.
+    """
+    key = FakeCharKey('a')
+    calls = []
+    for i in range(count):
+        kind = i % 10
+        if kind < 7:
+            calls.append((record.on_move, (i % 1920, i % 1080)))
+        elif kind == 7:
+            calls.append((record.on_click, (i % 1920, i % 1080, 'Button.left', i % 2 == 0)))
+        elif kind == 8:
+            calls.append((record.on_scroll, (i % 1920, i % 1080, 0, -1)))
+        else:
+            calls.append((record.on_release, (key,)))
+    return calls
+
+def time_calls(calls):
+    """Time Calls
+
+    Invokes every callback measuring each call.
+
+    Args:
+        calls (list): (callback, args) pairs.
+
+    Returns:
+        list: The duration of each call in nanoseconds.
+    """
+    perf_counter_ns = time.perf_counter_ns
+    samples = []
+    for callback, args in calls:
+        begin = perf_counter_ns()
+        callback(*args)
+        samples.append(perf_counter_ns() - begin)
+    return samples
+
+def bench_callbacks(count=CALLBACK_SAMPLES):
+    """Bench Callbacks
+
+    Measures the cost of the recorder listener callbacks, both enqueue-only (the events are normalised
+    and written later by the consumer thread) and doing the normalisation and writing inline.
+
+    Args:
+        count (int): Number of callback invocations per mode.
+
+    Returns:
+        dict: The timing summaries of both modes.
+    """
+    import record
+    import storage
+
+    results = {}
+    recorder_state = {name: getattr(record, name) for name in RECORDER_GLOBALS}
+    try:
+        with tempfile.TemporaryDirectory() as folder:
+            record.recording = True
+            record.stop_recording_key = None
+
+            # enqueue-only callbacks, the queue is drained afterwards
+            record.raw_events = record.queue.SimpleQueue()
+            results['queued'] = summarize_ns(time_calls(synthetic_callbacks(record, count)))
+
+            # same callbacks doing the consumer work on the listener thread
+            record.writer = storage.RecordingWriter(os.path.join(folder, "direct.rec"))
+            record.last_event = None
+            record.start_time, record.start_stamp = time.time(), time.perf_counter_ns()
+            record.last_stamp = record.start_stamp
+            record.move_sampler = record.MoveSampler(0.05, 2, 30)
+
+            def inline(callback):
+                def run(*args):
+                    callback(*args)
+                    record.consume_event(record.raw_events.get())
+                return run
+
+            record.raw_events = record.queue.SimpleQueue()
+            calls = [(inline(callback), args) for callback, args in synthetic_callbacks(record, count)]
+            try:
+                results['direct'] = summarize_ns(time_calls(calls))
+            finally:
+                record.writer.close()
+    finally:
+        # a recording started afterwards in this process finds the recorder as it was
+        for name, value in recorder_state.items():
+            setattr(record, name, value)
+
+    return results
+
+def time_command(command, runs):
+    """Time Command
+
+    Runs a command several times in a new interpreter.
+
+    Args:
+        command (list): The command and its arguments.
+        runs (int): Number of runs.
+
+    Returns:
+        dict: The best wall time in seconds, or the error of the command when it fails.
+    """
+    timings = []
+    for _ in range(runs):
+        begin = time.perf_counter()
+        completed = subprocess.run(command, cwd=CODE_DIR, capture_output=True, text=True)
+        timings.append(time.perf_counter() - begin)
+        if completed.returncode != 0:
+            return {'error': completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else completed.returncode}
+    return {'best_s': min(timings), 'mean_s': statistics.fmean(timings)}
+
+def bench_startup(runs=STARTUP_RUNS):
+    """Bench Startup
+
+    Measures the cold start of the command line entry point and of the recorder and player modules, against
+    importing the GUI, which creates the window and loads its images. The GUI is skipped without a display.
+
+    Args:
+        runs (int): Number of runs of each entry point.
+
+    Returns:
+        dict: The timings of the entry points.
+    """
+    results = {
+        'cli': time_command([sys.executable, os.path.join(CODE_DIR, "cli.py"), "--help"], runs),
+        'core': time_command([sys.executable, "-c", f"import {', '.join(CORE_MODULES)}"], runs),
+    }
+    if sys.platform in ("win32", "darwin") or os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"):
+        results['gui'] = time_command([sys.executable, "-c", "import main"], runs)
+    else:
+        results['gui'] = {'skipped': "no display"}
+    return results
+
+def bench_throughput(rates=THROUGHPUT_RATES, seconds=THROUGHPUT_SECONDS):
+    """Bench Throughput
+
+    Runs record_events with fake listeners firing events at several synthetic rates, into a temporary folder and
+    with the default options, so neither the data folder nor the options of the user are involved.
+
+    Args:
+        rates (iterable): Events per second to try.
+        seconds (float): Seconds of events generated at each rate.
+
+    Returns:
+        dict: By rate, the generated and recorded events, the achieved rate, the time to drain the queue after the
+        last event and the callback timings.
+    """
+    import options
+    import record
+
+    results = {}
+    user_options = options.options_config
+    # no simplification, optimisation nor instrumentation, whatever the user configured
+    options.options_config = dict(options.default_options_config)
+    try:
+        with tempfile.TemporaryDirectory() as folder:
+            for rate in rates:
+                count = int(rate * seconds)
+                KeyboardListener, MouseListener, timings = fake_listeners(rate, count, options.options_config["stop_recording_key"])
+                begin = time.perf_counter()
+                recording_writer = record.record_events(KeyboardListener, MouseListener, folder)
+                elapsed = time.perf_counter() - begin
+                os.remove(recording_writer.path)
+                results[str(rate)] = {
+                    'generated': len(timings),
+                    'recorded': recording_writer.count,
+                    'elapsed_s': elapsed,
+                    'achieved_rate': len(timings) / elapsed if elapsed else 0,
+                    'callback': summarize_ns(timings),
+                }
+    finally:
+        options.options_config = user_options
+    return results
+
+def bench_load(sizes=LOAD_SIZES):
+    """Bench Load
+
+    Measures the time and peak memory to load recordings of several sizes into a replay plan, in binary and json
+    format, and the time until the first operation of a streamed plan is ready. The time is measured without memory
+    tracing, the memory in a second traced run.
+
+    Args:
+        sizes (iterable): Number of events of the recordings.
+
+    Returns:
+        dict: By format and size, the file size, the time to the first operation, the load time and the peak memory.
+    """
+    import plan
+    import storage
+
+    keyboard, mouse = FakeKeyboardController(), FakeMouseController()
+
+    def load(path):
+        return len(plan.compile_events(storage.iter_events(path), keyboard, mouse, FakeKey, FakeKeyCode, FakeButton))
+
+    results = {}
+    with tempfile.TemporaryDirectory() as folder:
+        for size in sizes:
+            for extension in (storage.BINARY_EXTENSION, storage.JSON_EXTENSION):
+                if extension == storage.JSON_EXTENSION and size > JSON_MAX_EVENTS:
+                    continue
+                path = os.path.join(folder, f"{size}{extension}")
+                storage.save_events(path, synthetic_events(size))
+
+                plan.clear_plan_cache()
+                begin = time.perf_counter()
+                operations = plan.load_plan(path, keyboard, mouse, FakeKey, FakeKeyCode, FakeButton)
+                next(iter(operations))
+                first_operation = time.perf_counter() - begin
+                operations.close()
+
+                begin = time.perf_counter()
+                load(path)
+                elapsed = time.perf_counter() - begin
+
+                tracemalloc.start()
+                load(path)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+
+                results[f"{extension.lstrip('.')}-{size}"] = {
+                    'events': size,
+                    'bytes': os.path.getsize(path),
+                    'first_operation_s': first_operation,
+                    'load_s': elapsed,
+                    'events_per_s': size / elapsed if elapsed else 0,
+                    'peak_memory_bytes': peak,
+                }
+                os.remove(path)
+    return results
+
+def bench_scheduler(count=SCHEDULER_EVENTS, interval=SCHEDULER_INTERVAL):
+    """Bench Scheduler
+
+    Replays a synthetic recording with fake controllers and reports the scheduler lateness.
+
+    Args:
+        count (int): Number of events.
+        interval (float): Seconds between events.
+
+    Returns:
+        dict: The lateness report of the replay, in seconds.
+    """
+    import replay
+    import storage
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, f"scheduler{storage.BINARY_EXTENSION}")
+        storage.save_events(path, synthetic_events(count, interval))
+        return replay.replay_events(FakeKeyboardController, FakeMouseController, FakeButton, FakeKey, path, FakeKeyCode)
+
+def bench_loops(passes=LOOP_PASSES, count=LOOP_EVENTS):
+    """Bench Loops
+
+    Measures the loop mode overhead: a first replay pass that compiles the recording against cached passes,
+    replaying a recording without delays with fake controllers.
+
+    Args:
+        passes (int): Number of cached passes.
+        count (int): Number of events of the recording.
+
+    Returns:
+        dict: The first pass and mean cached pass times in seconds, and the per event cost of a cached pass.
+    """
+    import plan
+    import replay
+    import storage
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, f"loops{storage.BINARY_EXTENSION}")
+        storage.save_events(path, synthetic_events(count, 0))
+        plan.clear_plan_cache()
+
+        begin = time.perf_counter()
+        replay.replay_events(FakeKeyboardController, FakeMouseController, FakeButton, FakeKey, path, FakeKeyCode)
+        first_pass = time.perf_counter() - begin
+
+        begin = time.perf_counter()
+        replay.replay_events(FakeKeyboardController, FakeMouseController, FakeButton, FakeKey, path, FakeKeyCode, loops=passes)
+        cached_pass = (time.perf_counter() - begin) / passes
+
+    return {
+        'events': count,
+        'first_pass_s': first_pass,
+        'cached_pass_s': cached_pass,
+        'cached_event_us': cached_pass / count * 1e6,
+    }
+
+def bench_frames(rates=FRAME_RATES, count=FRAME_EVENTS, interval=FRAME_INTERVAL):
+    """Bench Frames
+
+    Measures the frame coalesced mouse injection: a dense recording is replayed in real time with fake controllers
+    at several frame rates, counting the injected events and the CPU time of the replay.
+
+    Args:
+        rates (tuple): Frame rates in Hz, 0 replays every move.
+        count (int): Number of events of the recording.
+        interval (float): Seconds between events.
+
+    Returns:
+        dict: Injected events, CPU and wall time by frame rate.
+    """
+    import plan
+    import replay
+    import storage
+
+    results = {}
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, f"frames{storage.BINARY_EXTENSION}")
+        storage.save_events(path, synthetic_events(count, interval))
+        keyboard, mouse = replay.get_controllers(FakeKeyboardController, FakeMouseController)
+        for rate in rates:
+            plan.clear_plan_cache()
+            injected = keyboard.injected + mouse.injected
+            cpu_begin, begin = time.process_time(), time.perf_counter()
+            replay.replay_events(FakeKeyboardController, FakeMouseController, FakeButton, FakeKey, path, FakeKeyCode,
+                                 plan.ReplayTiming(frame_rate=rate or None))
+            results[str(rate)] = {
+                'injected': keyboard.injected + mouse.injected - injected,
+                'cpu_s': time.process_time() - cpu_begin,
+                'wall_s': time.perf_counter() - begin,
+            }
+    return results
+
+def bench_codec(paths=None, count=CODEC_EVENTS):
+    """Bench Codec
+
+    Measures the compression ratio against the decode speed of every storage format, on the recordings of the data
+    folder or, when there are none, on a synthetic recording.
+
+    Args:
+        paths (list): The recordings to measure, the ones of the data folder by default.
+        count (int): Number of events of the synthetic recording.
+
+    Returns:
+        dict: By recording and format, the file size, the ratio to the json size and the decoded events per second.
+    """
+    import storage
+    from utils import SCRIPT_DIR
+
+    if paths is None:
+        folder = f"{SCRIPT_DIR}/data"
+        paths = [os.path.join(folder, name) for name in storage.list_recordings(folder)] if os.path.isdir(folder) else []
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        if not paths:
+            paths = [os.path.join(workdir, f"synthetic-{count}{storage.BINARY_EXTENSION}")]
+            storage.save_events(paths[0], synthetic_events(count))
+
+        for path in paths:
+            events = storage.load_events(path)
+            if not events:
+                continue
+            variants = {
+                'json': (storage.JSON_EXTENSION, None),
+                'binary': (storage.BINARY_EXTENSION, None),
+                'zlib': (storage.COMPRESSED_EXTENSION, 'zlib'),
+                'lzma': (storage.COMPRESSED_EXTENSION, 'lzma'),
+            }
+            sizes = {}
+            for name, (extension, compression) in variants.items():
+                variant_path = os.path.join(workdir, f"variant-{name}{extension}")
+                begin = time.perf_counter()
+                storage.save_events(variant_path, events, compression=compression)
+                encode = time.perf_counter() - begin
+                begin = time.perf_counter()
+                decoded = sum(1 for _ in storage.iter_events(variant_path))
+                decode = time.perf_counter() - begin
+                sizes[name] = {
+                    'bytes': os.path.getsize(variant_path),
+                    'encode_s': encode,
+                    'decode_events_per_s': decoded / decode if decode else 0,
+                }
+                os.remove(variant_path)
+            for measures in sizes.values():
+                measures['ratio_to_json'] = sizes['json']['bytes'] / measures['bytes']
+            results[os.path.basename(path)] = dict(sizes, events=len(events))
+    return results
+
+BENCHMARKS = {
+    'callbacks': bench_callbacks,
+    'throughput': bench_throughput,
+    'load': bench_load,
+    'scheduler': bench_scheduler,
+    'loops': bench_loops,
+    'frames': bench_frames,
+    'codec': bench_codec,
+    'startup': bench_startup,
+}
+
+def run_benchmarks(only=None, sizes=LOAD_SIZES, output=DEFAULT_OUTPUT):
+    """Run Benchmarks
+
+    Runs the benchmarks and writes their results as json.
+
+    Args:
+        only (list): Names of the benchmarks to run, all of them by default.
+        sizes (iterable): Number of events of the recordings of the load benchmark.
+        output (str): Path of the json results file, None to not write it.
+
+    Returns:
+        dict: The results, with the platform they were measured on.
+    """
+    import logging
+    logging.disable(logging.CRITICAL)
+
+    results = {
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'timestamp': time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    for name, benchmark in BENCHMARKS.items():
+        if only and name not in only:
+            continue
+        results[name] = benchmark(sizes) if name == 'load' else benchmark()
+
+    if output:
+        with open(output, 'w') as outfile:
+            json.dump(results, outfile, indent=2)
+    return results
+
+def build_parser():
+    """Build Parser
+
+    Builds the parser of the benchmark arguments.
+
+    Returns:
+        argparse.ArgumentParser: The parser.
+    """
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="path of the json results file")
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS), help="benchmarks to run, all of them by default")
+    parser.add_argument("--sizes", nargs="+", type=int, default=list(LOAD_SIZES), help="events of the recordings of the load benchmark")
+    parser.add_argument("--huge", action="store_true", help=f"also load a recording of {HUGE_LOAD_SIZE} events, needs several GB of memory")
+    return parser
+
+def load_sizes(args):
+    """Load Sizes
+
+    Args:
+        args (argparse.Namespace): The arguments parsed by build_parser.
+
+    Returns:
+        list: Number of events of the recordings of the load benchmark.
+    """
+    return args.sizes + [HUGE_LOAD_SIZE] if args.huge else args.sizes
+
+
+if __name__ == "__main__":
+    args = argparse.ArgumentParser(parents=[build_parser()]).parse_args()
+    print(json.dumps(run_benchmarks(args.only, load_sizes(args), args.output), indent=2))
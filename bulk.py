@@ -0,0 +1,230 @@
+"""Py Replay Bulk
+
+This script processes many recordings at once across a pool of processes, one file per task, so it scales with the
+number of cores. Operations:
+
+    validate: reports malformed events (unknown actions, missing or invalid fields, negative durations...)
+    normalise: rewrites every event with exactly the fields the recorder writes, dropping the ones that cannot be fixed
+    convert: writes a copy of every recording in another format, skipping the ones already in it and never
+        overwriting an existing file
+    retime: applies a replay timing (speed, gap cap, idle collapsing) to the recordings themselves
+    optimise: runs the optimisation passes (see optimise.py) over the recordings
+
+Progress and per-file errors are logged as files finish, outputs are written through a temporary file and a rename,
+and a json report is returned.
+
+Author: Facundo Giacconi AKA "GiacconiDev"
+
+"""
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import logging
+import os
+import time
+
+import screen
+import storage
+
+
+# ---------------------------- CONSTANTS ------------------------------- #
+
+OPERATIONS = ("validate", "normalise", "convert", "retime", "optimise")
+
+# Fields every event of an action must have
+REQUIRED_FIELDS = {
+    'pressed_key': ('duration',),
+    'released_key': ('duration',),
+    'moved': ('x', 'y', 'duration'),
+    'pressed_mouse': ('button', 'x', 'y', 'duration'),
+    'released_mouse': ('button', 'x', 'y', 'duration'),
+    'scroll': ('x', 'y', 'duration'),
+    'checkpoint': ('left', 'top', 'width', 'height', 'reference', 'duration'),
+}
+
+# Problems reported per file at most, the rest are only counted
+MAX_PROBLEMS = 20
+
+# ---------------------------- FUNCTIONS ------------------------------- #
+
+def event_problems(event):
+    """Event Problems
+
+    Checks a recorded event.
+
+    Args:
+        event: The recorded event, a dict when it is well formed.
+
+    Returns:
+        list: The problems found, empty when the event is valid.
+    """
+    if not isinstance(event, dict):
+        return [f"not an object: {event!r}"]
+    action = event.get('action')
+    if action not in REQUIRED_FIELDS:
+        return [f"unknown action {action!r}"]
+
+    problems = [f"{action} without '{field}'" for field in REQUIRED_FIELDS[action] if field not in event]
+    if action in ('pressed_key', 'released_key') and 'key' not in event and 'vk' not in event:
+        problems.append(f"{action} without 'key' or 'vk'")
+    if action == 'scroll' and 'button' in event:
+        problems.append("scroll with a 'button'")
+    for field in ('x', 'y', 'vk', 'vertical_direction', 'horizontal_direction', 'duration', 'time', 'left', 'top', 'width', 'height', 'timeout'):
+        if field in event and (isinstance(event[field], bool) or not isinstance(event[field], (int, float))):
+            problems.append(f"{action} with a non numeric '{field}': {event[field]!r}")
+    if isinstance(event.get('duration'), (int, float)) and event['duration'] < 0:
+        problems.append(f"{action} with a negative duration {event['duration']}")
+    if 'button' in event and action != 'scroll' and not isinstance(event['button'], str):
+        problems.append(f"{action} with an invalid 'button': {event['button']!r}")
+    if action == 'checkpoint' and not str(event.get('reference', '')).startswith((screen.HASH_PREFIX, screen.IMAGE_PREFIX)):
+        problems.append(f"checkpoint with an unknown 'reference': {event.get('reference')!r}")
+    return problems
+
+def normalise_events(events, problems):
+    """Normalise Events
+
+    Rewrites events with exactly the fields the recorder writes: coordinates and directions as integers, negative
+    durations as 0 and no extra fields. Events that cannot be fixed are dropped.
+
+    Args:
+        events (iterable): The recorded events.
+        problems (list): Receives the problems fixed and the ones of the dropped events.
+
+    Yields:
+        dict: The normalised events.
+    """
+    table = []
+    interned = {}
+
+    def intern(name):
+        if name not in interned:
+            interned[name] = len(table)
+            table.append(name)
+        return interned[name]
+
+    for position, event in enumerate(events):
+        found = event_problems(event)
+        fixable = all("negative duration" in problem or "scroll with a 'button'" in problem for problem in found)
+        if not fixable:
+            problems.extend(f"event {position} dropped: {problem}" for problem in found)
+            continue
+        problems.extend(f"event {position} fixed: {problem}" for problem in found)
+        event = dict(event, duration=max(event['duration'], 0))
+        yield storage.decode_event(storage.encode_event(event, intern), table)
+
+def output_path(path, output_format):
+    """Output Path
+
+    Args:
+        path (str): The path of the recording.
+        output_format (str): 'binary', 'compressed' or 'json'.
+
+    Returns:
+        str: The path of its converted copy.
+    """
+    extension = {'json': storage.JSON_EXTENSION, 'compressed': storage.COMPRESSED_EXTENSION}.get(output_format, storage.BINARY_EXTENSION)
+    return f"{os.path.splitext(path)[0]}{extension}"
+
+def process_file(operation, path, settings):
+    """Process File
+
+    Runs an operation on one recording, in a worker process.
+
+    Args:
+        operation (str): One of OPERATIONS.
+        path (str): The path of the recording.
+        settings (dict): 'format' and 'compression' for convert, 'speed', 'max_gap' and 'idle_threshold' for retime,
+            'passes' and 'optimise' (the settings of the passes) for optimise.
+
+    Returns:
+        dict: The file, its status ('ok', 'invalid', 'fixed', 'skipped' or 'error'), the number of events, the
+            problems found and the output path.
+    """
+    import index
+    import optimise
+    import plan
+
+    result = {'file': path, 'status': 'ok', 'events': 0, 'problems': [], 'output': None}
+    begin = time.perf_counter()
+    try:
+        problems = []
+        if operation == "validate":
+            for position, event in enumerate(storage.iter_events(path)):
+                problems.extend(f"event {position}: {problem}" for problem in event_problems(event))
+                result['events'] += 1
+        elif operation == "convert" and output_path(path, settings['format']) == path:
+            result['status'] = 'skipped'
+        else:
+            if operation == "convert" and os.path.exists(output_path(path, settings['format'])):
+                raise FileExistsError(f"{output_path(path, settings['format'])} already exists")
+            events = storage.load_events(path)
+            result['events'] = len(events)
+            if operation == "normalise":
+                destination = path
+                events = list(normalise_events(events, problems))
+            elif operation == "convert":
+                destination = output_path(path, settings['format'])
+            elif operation == "optimise":
+                destination = path
+                events, result['passes'] = optimise.optimise_events(events, settings.get('passes'), settings.get('optimise'))
+            else:
+                destination = path
+                timing = plan.ReplayTiming(settings.get('speed', 1.0), settings.get('max_gap'), settings.get('idle_threshold'))
+                events = list(plan.retime_events(events, timing))
+            storage.save_events_atomically(destination, events, settings.get('compression'))
+            if storage.is_binary_recording(destination):
+                index.build_index(destination)
+            result['output'] = destination
+        if problems:
+            result['status'] = 'invalid' if operation == "validate" else 'fixed'
+        result['problem_count'] = len(problems)
+        result['problems'] = problems[:MAX_PROBLEMS]
+    except Exception as error:
+        result['status'] = 'error'
+        result['error'] = f"{type(error).__name__}: {error}"
+    result['seconds'] = time.perf_counter() - begin
+    return result
+
+def run_bulk(operation, paths, settings=None, jobs=None):
+    """Run Bulk
+
+    Runs an operation on many recordings across a process pool, logging the progress and the per-file errors.
+
+    Args:
+        operation (str): One of OPERATIONS.
+        paths (list): The paths of the recordings.
+        settings (dict): Settings of the operation, see process_file.
+        jobs (int): Number of worker processes, one per core by default.
+
+    Returns:
+        dict: The totals by status, the elapsed seconds and the result of every file, in the given order.
+    """
+    if operation not in OPERATIONS:
+        raise ValueError(f"unknown operation {operation}")
+    settings = settings or {}
+    jobs = jobs or os.cpu_count() or 1
+    results = {}
+    begin = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(process_file, operation, path, settings): path for path in paths}
+        for done, future in enumerate(as_completed(futures), start=1):
+            result = future.result()
+            results[futures[future]] = result
+            if result['status'] == 'error':
+                logging.error(f"[{done}/{len(paths)}] {result['file']}: {result['error']}")
+            elif result['problems']:
+                logging.warning(f"[{done}/{len(paths)}] {result['file']}: {result['status']}, {result['problem_count']} problems, first: {result['problems'][0]}")
+            else:
+                logging.info(f"[{done}/{len(paths)}] {result['file']}: {result['status']}")
+
+    totals = {}
+    for result in results.values():
+        totals[result['status']] = totals.get(result['status'], 0) + 1
+    return {
+        'operation': operation,
+        'jobs': jobs,
+        'files': len(paths),
+        'totals': totals,
+        'seconds': time.perf_counter() - begin,
+        'results': [results[path] for path in paths],
+    }
@@ -0,0 +1,245 @@
+"""Py Replay Catalog
+
+This script keeps a persistent catalog of the recordings of the data folder with their metadata: duration, event
+counts by action, size, content hash and format version. Entries are validated by the modification time and size of
+their file, so listing the folder only costs a stat per recording, and stale or missing entries are rebuilt
+incrementally by a background thread.
+
+Usage:
+    python catalog.py
+
+Author: Facundo Giacconi AKA "GiacconiDev"
+
+"""
+
+import hashlib
+import json
+import logging
+import os
+import stat as stat_module
+import threading
+
+import storage
+from utils import SCRIPT_DIR
+
+
+# ---------------------------- CONSTANTS ------------------------------- #
+
+CATALOG_PATH = f"{SCRIPT_DIR}/.cache/catalog.json"
+CATALOG_VERSION = 1
+
+# Catalog entries by file name, loaded on first use
+catalog_entries = None
+catalog_lock = threading.Lock()
+refresh_thread = None
+
+# ---------------------------- FUNCTIONS ------------------------------- #
+
+def load_catalog():
+    """Load Catalog
+
+    Loads the catalog file, starting an empty catalog when it is missing, unreadable or from another version.
+
+    Returns:
+        dict: The catalog entries by file name.
+    """
+    global catalog_entries
+
+    with catalog_lock:
+        if catalog_entries is None:
+            try:
+                with open(CATALOG_PATH, 'r') as readfile:
+                    content = json.load(readfile)
+                catalog_entries = content['entries'] if content.get('version') == CATALOG_VERSION else {}
+            except (OSError, ValueError, KeyError, AttributeError):
+                catalog_entries = {}
+        return catalog_entries
+
+def save_catalog():
+    """Save Catalog
+
+    Writes the catalog file through a temporary file and a rename.
+    """
+    with catalog_lock:
+        content = json.dumps({'version': CATALOG_VERSION, 'entries': catalog_entries})
+    os.makedirs(os.path.dirname(CATALOG_PATH), exist_ok=True)
+    temp_path = f"{CATALOG_PATH}.{os.getpid()}{storage.TEMP_EXTENSION}"
+    with open(temp_path, 'w') as outfile:
+        outfile.write(content)
+    os.replace(temp_path, CATALOG_PATH)
+
+def content_hash(path):
+    """Content Hash
+
+    Args:
+        path (str): The path of the recording.
+
+    Returns:
+        str: The SHA-256 hex digest of the file.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as readfile:
+        for chunk in iter(lambda: readfile.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def build_entry(path, stat):
+    """Build Entry
+
+    Reads the metadata of a recording for the catalog.
+
+    Args:
+        path (str): The path of the recording.
+        stat (os.stat_result): The stat of the recording when it was listed.
+
+    Returns:
+        dict: The catalog entry.
+    """
+    entry = storage.recording_info(path)
+    entry.update({'mtime_ns': stat.st_mtime_ns, 'bytes': stat.st_size, 'hash': content_hash(path)})
+    return entry
+
+def is_valid_entry(entry, stat):
+    """Is Valid Entry
+
+    Args:
+        entry (dict): The catalog entry, or None.
+        stat (os.stat_result): The current stat of the recording.
+
+    Returns:
+        bool: Whether the entry describes the current content of the file.
+    """
+    return entry is not None and entry['mtime_ns'] == stat.st_mtime_ns and entry['bytes'] == stat.st_size
+
+def scan_folder(folder):
+    """Scan Folder
+
+    Lists the recordings of a folder with their stat.
+
+    Args:
+        folder (str): The folder where recordings are stored.
+
+    Returns:
+        dict: The os.stat_result of every recording, by file name.
+    """
+    stats = {}
+    for name in storage.list_recordings(folder):
+        try:
+            stat = os.stat(os.path.join(folder, name))
+        except OSError:
+            continue
+        if stat_module.S_ISREG(stat.st_mode):
+            stats[name] = stat
+    return stats
+
+def cached_recordings(folder):
+    """Cached Recordings
+
+    Lists the recordings of a folder with their catalog entry, without reading any of them.
+
+    Args:
+        folder (str): The folder where recordings are stored.
+
+    Returns:
+        list: (file name, entry) pairs, sorted by name, the entry is None when it is missing or stale.
+    """
+    entries = load_catalog()
+    result = []
+    for name, stat in sorted(scan_folder(folder).items()):
+        with catalog_lock:
+            entry = entries.get(name)
+        result.append((name, entry if is_valid_entry(entry, stat) else None))
+    return result
+
+def refresh_catalog(folder):
+    """Refresh Catalog
+
+    Rebuilds the missing and stale entries of the catalog and drops the ones of deleted recordings.
+    Recordings that cannot be read are logged once and kept with the error, until their file changes.
+
+    Args:
+        folder (str): The folder where recordings are stored.
+
+    Returns:
+        bool: Whether the catalog changed.
+    """
+    entries = load_catalog()
+    stats = scan_folder(folder)
+    changed = False
+
+    with catalog_lock:
+        for name in [name for name in entries if name not in stats]:
+            del entries[name]
+            changed = True
+
+    for name, stat in stats.items():
+        with catalog_lock:
+            entry = entries.get(name)
+        if is_valid_entry(entry, stat):
+            continue
+        try:
+            entry = build_entry(os.path.join(folder, name), stat)
+        except (OSError, ValueError, KeyError) as error:
+            logging.warning(f"cannot index recording {name}: {error}")
+            entry = {'error': str(error), 'mtime_ns': stat.st_mtime_ns, 'bytes': stat.st_size}
+        with catalog_lock:
+            entries[name] = entry
+        changed = True
+
+    if changed:
+        save_catalog()
+    return changed
+
+def start_refresh_thread(folder, on_change=None):
+    """Start Refresh Thread
+
+    Refreshes the catalog in a background thread, unless a refresh is already running.
+
+    Args:
+        folder (str): The folder where recordings are stored.
+        on_change (function): Called from the thread when the catalog changed.
+    """
+    global refresh_thread
+
+    if refresh_thread is not None and refresh_thread.is_alive():
+        return
+
+    def thread_function():
+        if refresh_catalog(folder) and on_change is not None:
+            on_change()
+
+    refresh_thread = threading.Thread(target=thread_function, daemon=True)
+    refresh_thread.start()
+
+def format_duration(seconds):
+    """Format Duration
+
+    Args:
+        seconds (float): The duration.
+
+    Returns:
+        str: The duration as m:ss, or h:mm:ss for an hour or more.
+    """
+    minutes, seconds = divmod(int(round(seconds)), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+def display_name(name, entry, events_label="events"):
+    """Display Name
+
+    Args:
+        name (str): The file name of the recording.
+        entry (dict): Its catalog entry, or None.
+        events_label (str): The translated word for events.
+
+    Returns:
+        str: The name with the duration and event count of the recording when they are known.
+    """
+    if entry is None or 'error' in entry:
+        return name
+    return f"{name} ({format_duration(entry['duration'])}, {entry['events']} {events_label})"
+
+
+if __name__ == "__main__":
+    refresh_catalog(f"{SCRIPT_DIR}/data")
+    print(json.dumps(dict(cached_recordings(f"{SCRIPT_DIR}/data")), indent=2))
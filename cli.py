@@ -0,0 +1,360 @@
+"""Py Replay Command Line
+
+This script provides a headless entry point to record and replay user actions, convert recordings between formats,
+show their metadata and run the benchmarks. It never loads tkinter or PIL, and pynput is only imported by the
+commands that drive the mouse and keyboard.
+
+Usage:
+    python cli.py record [-o OUTPUT]
+    python cli.py replay FILE [--loop N] [--speed S] [--max-gap SECONDS] [--idle-threshold SECONDS] [--frame-rate HZ]
+                             [--start-time SECONDS | --start-index N]
+    python cli.py playlist NAME FILE[*REPEAT] [FILE[*REPEAT] ...]
+    python cli.py convert SOURCE DESTINATION [--compression {zlib,lzma}]
+    python cli.py info FILE [FILE ...]
+    python cli.py bulk {validate,normalise,convert,retime,optimise} [FILE ...] [--jobs N] [--format {binary,compressed,json}]
+                       [--speed S] [--max-gap SECONDS] [--idle-threshold SECONDS] [--passes NAME,NAME...] [--report FILE]
+    python cli.py optimise [FILE ...] [--passes NAME,NAME...] [--max-gap SECONDS] [--dry-run]
+    python cli.py bench [--output FILE] [--only NAME ...] [--sizes N ...]
+    python cli.py daemon [--socket PATH]
+    python cli.py send {play,stop,status,list} [FILE] [--loops N] [--speed S] [--delay SECONDS | --at EPOCH]
+                       [--every SECONDS] [--schedule ID] [--socket PATH]
+
+Author: Facundo Giacconi AKA "GiacconiDev"
+
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+import bench
+import bulk
+import index
+import optimise
+import playlist
+import logs
+import storage
+from utils import SCRIPT_DIR
+
+
+# ---------------------------- FUNCTIONS ------------------------------- #
+
+def command_record(args):
+    """Command Record
+
+    Records events until the stop recording key is pressed and saves them.
+
+    Args:
+        args (argparse.Namespace): The parsed arguments.
+
+    Returns:
+        int: The exit code.
+    """
+    import record
+
+    import options
+
+    extension = storage.COMPRESSED_EXTENSION if options.get_option("compression") else storage.BINARY_EXTENSION
+    output = args.output or os.path.join(f"{SCRIPT_DIR}/data", time.strftime(f"record-%Y%m%d-%H%M%S{extension}"))
+    recording_writer = record.record_events()
+    if recording_writer.count <= 1:
+        os.remove(recording_writer.path)
+        logging.error("nothing recorded")
+        return 1
+    record.save_recording(recording_writer, output)
+    print(output)
+    return 0
+
+def command_replay(args):
+    """Command Replay
+
+    Replays a recording until it finishes or the stop playing key is pressed. The pause and step playing keys
+    pause, resume and step through the replay.
+
+    Args:
+        args (argparse.Namespace): The parsed arguments.
+
+    Returns:
+        int: The exit code.
+    """
+    import plan
+    import replay
+    from pynput.keyboard import Key, Controller as KeyboardController, KeyCode
+    from pynput.mouse import Button, Controller as MouseController
+
+    timing = plan.ReplayTiming(speed=args.speed, max_gap=args.max_gap, idle_threshold=args.idle_threshold, frame_rate=args.frame_rate)
+    replay.playing = True
+    # a loop count of 0 replays until the stop playing key is pressed
+    replay.looping = args.loop == 0
+    session = replay.start_session()
+    try:
+        replay.replay(KeyboardController, MouseController, Button, Key, args.file, KeyCode, timing, loops=max(args.loop, 1),
+                      start_time=args.start_time, start_index=args.start_index, session=session)
+    except KeyboardInterrupt:
+        # interrupted between two events, do not leave keys or buttons pressed
+        session.release_held()
+        return 130
+    return 0
+
+def command_playlist(args):
+    """Command Playlist
+
+    Saves a playlist in the data folder.
+
+    Args:
+        args (argparse.Namespace): The parsed arguments.
+
+    Returns:
+        int: The exit code.
+    """
+    name = args.name if playlist.is_playlist(args.name) else f"{args.name}{storage.PLAYLIST_EXTENSION}"
+    path = os.path.join(f"{SCRIPT_DIR}/data", name)
+    playlist.save_playlist(path, [playlist.parse_entry(text) for text in args.entries])
+    try:
+        playlist.load_playlist(path)
+    except ValueError as error:
+        logging.warning(error)
+    print(path)
+    return 0
+
+def command_convert(args):
+    """Command Convert
+
+    Converts a recording to the format given by the extension of the destination.
+
+    Args:
+        args (argparse.Namespace): The parsed arguments.
+
+    Returns:
+        int: The exit code.
+    """
+    storage.save_events(args.destination, storage.iter_events(args.source), compression=args.compression)
+    if storage.is_binary_recording(args.destination):
+        index.build_index(args.destination)
+    return 0
+
+def command_info(args):
+    """Command Info
+
+    Prints the metadata of recordings as json.
+
+    Args:
+        args (argparse.Namespace): The parsed arguments.
+
+    Returns:
+        int: The exit code.
+    """
+    print(json.dumps({file: storage.recording_info(file) for file in args.files}, indent=2))
+    return 0
+
+def command_bulk(args):
+    """Command Bulk
+
+    Processes recordings across a process pool, all the recordings of the data folder by default, and prints
+    the files that were not ok as json.
+
+    Args:
+        args (argparse.Namespace): The parsed arguments.
+
+    Returns:
+        int: The exit code, 1 when any file failed or is invalid.
+    """
+    files = args.files or [os.path.join(f"{SCRIPT_DIR}/data", name) for name in storage.list_recordings(f"{SCRIPT_DIR}/data")]
+    settings = {'format': args.format, 'compression': args.compression, 'speed': args.speed, 'max_gap': args.max_gap, 'idle_threshold': args.idle_threshold}
+    if args.operation == "optimise":
+        settings['passes'] = optimise.parse_passes(args.passes) if args.passes else None
+        settings['optimise'] = dict(optimise.default_settings(), max_gap=args.max_gap)
+    report = bulk.run_bulk(args.operation, files, settings, args.jobs)
+    if args.report:
+        with open(args.report, 'w') as outfile:
+            json.dump(report, outfile, indent=2)
+    print(json.dumps(dict(report, results=[result for result in report['results'] if result['status'] != 'ok']), indent=2))
+    return 1 if report['totals'].get('error') or report['totals'].get('invalid') else 0
+
+def command_optimise(args):
+    """Command Optimise
+
+    Runs the optimisation passes over recordings, all the recordings of the data folder by default, and prints
+    the events and seconds every pass saved as json.
+
+    Args:
+        args (argparse.Namespace): The parsed arguments.
+
+    Returns:
+        int: The exit code.
+    """
+    files = args.files or [os.path.join(f"{SCRIPT_DIR}/data", name) for name in storage.list_recordings(f"{SCRIPT_DIR}/data")]
+    passes = optimise.parse_passes(args.passes) if args.passes else None
+    settings = dict(optimise.default_settings(), max_gap=args.max_gap)
+    reports = {}
+    for file in files:
+        if args.dry_run:
+            events, pass_reports = optimise.optimise_events(storage.load_events(file), passes, settings)
+            reports[file] = {'events_after': len(events), 'passes': pass_reports}
+        else:
+            reports[file] = optimise.optimise_file(file, passes, settings)
+    print(json.dumps(reports, indent=2))
+    return 0
+
+def command_bench(args):
+    """Command Bench
+
+    Runs the benchmarks and prints their results as json.
+
+    Args:
+        args (argparse.Namespace): The parsed arguments.
+
+    Returns:
+        int: The exit code.
+    """
+    print(json.dumps(bench.run_benchmarks(args.only, bench.load_sizes(args), args.output), indent=2))
+    return 0
+
+def command_daemon(args):
+    """Command Daemon
+
+    Runs the replay daemon on a Unix domain socket until it is interrupted.
+
+    Args:
+        args (argparse.Namespace): The parsed arguments.
+
+    Returns:
+        int: The exit code.
+    """
+    import daemon
+
+    daemon.serve(args.socket or daemon.SOCKET_PATH)
+    return 0
+
+def command_send(args):
+    """Command Send
+
+    Sends a command to a running replay daemon and prints its response as json.
+
+    Args:
+        args (argparse.Namespace): The parsed arguments.
+
+    Returns:
+        int: The exit code, 1 when the daemon refused the command.
+    """
+    import daemon
+
+    request = {'command': args.command_name}
+    if args.command_name == "play":
+        if args.file is None:
+            logging.error("play needs a recording or playlist name")
+            return 2
+        request.update({'file': args.file, 'loops': args.loops, 'speed': args.speed, 'delay': args.delay, 'at': args.at, 'every': args.every})
+    elif args.command_name == "stop" and args.schedule is not None:
+        request['schedule'] = args.schedule if args.schedule == "all" else int(args.schedule)
+    response = daemon.send_command(request, args.socket or daemon.SOCKET_PATH)
+    print(json.dumps(response, indent=2))
+    return 0 if response.get('ok') else 1
+
+def build_parser():
+    """Build Parser
+
+    Builds the parser of the command line arguments.
+
+    Returns:
+        argparse.ArgumentParser: The parser.
+    """
+    parser = argparse.ArgumentParser(prog="copy-thon-app", description="Record and replay mouse and keyboard actions.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = subparsers.add_parser("record", help="record actions until the stop recording key is pressed")
+    record_parser.add_argument("-o", "--output", help="path of the recording, a timestamped file in the data folder by default")
+    record_parser.set_defaults(handler=command_record)
+
+    replay_parser = subparsers.add_parser("replay", help="replay a recording")
+    replay_parser.add_argument("file", help="recording or playlist name in the data folder or path")
+    replay_parser.add_argument("--loop", type=int, default=1, help="times to replay the recording, 0 to loop until the stop playing key is pressed")
+    replay_parser.add_argument("--speed", type=float, default=1.0, help="speed factor")
+    replay_parser.add_argument("--max-gap", type=float, default=None, help="cap in seconds of any single gap")
+    replay_parser.add_argument("--idle-threshold", type=float, default=None, help="length in seconds idle spans are collapsed to")
+    replay_parser.add_argument("--frame-rate", type=float, default=None, help="rate in Hz mouse moves are coalesced at, every move is replayed by default")
+    start_group = replay_parser.add_mutually_exclusive_group()
+    start_group.add_argument("--start-time", type=float, default=None, help="seconds from the start of the recording to replay from")
+    start_group.add_argument("--start-index", type=int, default=None, help="index of the event to replay from")
+    replay_parser.set_defaults(handler=command_replay)
+
+    playlist_parser = subparsers.add_parser("playlist", help="save a playlist of recordings in the data folder")
+    playlist_parser.add_argument("name", help="playlist name")
+    playlist_parser.add_argument("entries", nargs="+", metavar="FILE[*REPEAT]", help="recordings of the data folder, with their repeat count")
+    playlist_parser.set_defaults(handler=command_playlist)
+
+    convert_parser = subparsers.add_parser("convert", help="convert a recording, the destination extension chooses the format")
+    convert_parser.add_argument("source")
+    convert_parser.add_argument("destination")
+    convert_parser.add_argument("--compression", choices=("zlib", "lzma"), default=None, help="codec of '.recz' destinations, zlib by default (times and durations are kept to the nanosecond)")
+    convert_parser.set_defaults(handler=command_convert)
+
+    info_parser = subparsers.add_parser("info", help="show the metadata of recordings")
+    info_parser.add_argument("files", nargs="+")
+    info_parser.set_defaults(handler=command_info)
+
+    bulk_parser = subparsers.add_parser("bulk", help="validate, normalise, convert, retime or optimise many recordings in parallel")
+    bulk_parser.add_argument("operation", choices=bulk.OPERATIONS)
+    bulk_parser.add_argument("files", nargs="*", help="recordings to process, all the recordings of the data folder by default")
+    bulk_parser.add_argument("--jobs", type=int, default=None, help="worker processes, one per core by default")
+    bulk_parser.add_argument("--format", choices=("binary", "compressed", "json"), default="binary", help="output format of convert")
+    bulk_parser.add_argument("--compression", choices=("zlib", "lzma"), default="zlib", help="codec of compressed outputs")
+    bulk_parser.add_argument("--speed", type=float, default=1.0, help="speed factor applied by retime")
+    bulk_parser.add_argument("--max-gap", type=float, default=None, help="cap in seconds of any single gap applied by retime, or by the gap_cap pass of optimise")
+    bulk_parser.add_argument("--idle-threshold", type=float, default=None, help="length in seconds idle spans are collapsed to by retime")
+    bulk_parser.add_argument("--passes", default=None, help="comma separated passes run by optimise, all but simplify by default")
+    bulk_parser.add_argument("--report", help="write the full json report to this file")
+    bulk_parser.set_defaults(handler=command_bulk)
+
+    optimise_parser = subparsers.add_parser("optimise", help="clean the noise of recordings with optimisation passes")
+    optimise_parser.add_argument("files", nargs="*", help="recordings to optimise, all the recordings of the data folder by default")
+    optimise_parser.add_argument("--passes", default=None, help=f"comma separated passes among {', '.join(optimise.PASSES)}, all but simplify by default")
+    optimise_parser.add_argument("--max-gap", type=float, default=None, help="cap in seconds of any single gap applied by gap_cap")
+    optimise_parser.add_argument("--dry-run", action="store_true", help="report the savings without writing the recordings")
+    optimise_parser.set_defaults(handler=command_optimise)
+
+    bench_parser = subparsers.add_parser("bench", help="run the benchmarks", parents=[bench.build_parser()])
+    bench_parser.set_defaults(handler=command_bench)
+
+    daemon_parser = subparsers.add_parser("daemon", help="replay recordings on request of a local socket")
+    daemon_parser.add_argument("--socket", default=None, help="path of the Unix domain socket, .cache/daemon.sock by default")
+    daemon_parser.set_defaults(handler=command_daemon)
+
+    send_parser = subparsers.add_parser("send", help="send a command to a running replay daemon")
+    send_parser.add_argument("command_name", choices=("play", "stop", "status", "list"), metavar="{play,stop,status,list}")
+    send_parser.add_argument("file", nargs="?", default=None, help="recording or playlist name in the data folder, for play")
+    send_parser.add_argument("--loops", type=int, default=1, help="times to replay the recording")
+    send_parser.add_argument("--speed", type=float, default=1.0, help="speed factor")
+    when_group = send_parser.add_mutually_exclusive_group()
+    when_group.add_argument("--delay", type=float, default=None, help="seconds until the replay")
+    when_group.add_argument("--at", type=float, default=None, help="epoch time of the replay")
+    send_parser.add_argument("--every", type=float, default=None, help="replay again every this many seconds")
+    send_parser.add_argument("--schedule", default=None, help="id of the scheduled replay to cancel with stop, or 'all'")
+    send_parser.add_argument("--socket", default=None, help="path of the Unix domain socket, .cache/daemon.sock by default")
+    send_parser.set_defaults(handler=command_send)
+
+    return parser
+
+def main(argv=None):
+    """Main
+
+    Runs the command given in the arguments.
+
+    Args:
+        argv (list): The arguments, sys.argv by default.
+
+    Returns:
+        int: The exit code.
+    """
+    args = build_parser().parse_args(argv)
+    logs.setup_logging()
+    if not os.path.exists(f"{SCRIPT_DIR}/data/"):
+        os.makedirs(f"{SCRIPT_DIR}/data/")
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,272 @@
+"""Py Replay Codec
+
+This script provides the compressed recording format ('.recz'). Events are grouped in blocks and stored by column:
+opcodes, time and duration in nanoseconds, x, y and the two arguments of the binary record. Times and coordinates
+are delta encoded (each value minus the previous one), so the columns are mostly small repeated numbers, and the
+blocks go through a zlib or lzma stream. Encoding and decoding are streaming: one block is held in memory at a time.
+
+The format is lossy for times and durations: they are quantised to integer nanoseconds, so a round trip returns
+the nearest float to the stored nanosecond rather than the same float (0.35 comes back as 0.35000000000000003).
+Event times, around 1.7e9 seconds since the epoch, are only kept to the precision of their float64 nanoseconds,
+a few hundred nanoseconds. Everything else (actions, keys, buttons, coordinates, checkpoints) is kept exactly.
+
+Layout (little endian):
+    header: magic (4s), format version (H), codec (B), reserved (B), then the compressed stream of blocks
+    block: event count (I), new interned names count (I), names as length (H) + utf-8 bytes,
+           columns: opcode (B), time delta (q), duration (q), x delta (i), y delta (i), arg0 (i), arg1 (i)
+
+Author: Facundo Giacconi AKA "GiacconiDev"
+
+"""
+
+from array import array
+from itertools import accumulate
+import lzma
+import struct
+import sys
+import zlib
+
+import storage
+
+
+# ---------------------------- CONSTANTS ------------------------------- #
+
+COMPRESSED_VERSION = 1
+
+CODEC_ZLIB = 1
+CODEC_LZMA = 2
+CODECS = {'zlib': CODEC_ZLIB, 'lzma': CODEC_LZMA}
+
+COMPRESSED_HEADER = struct.Struct("<4sHBB")
+BLOCK_HEADER = struct.Struct("<II")
+NAME_LENGTH = struct.Struct("<H")
+
+# Events per block, a block is compressed as soon as it is full
+BLOCK_EVENTS = 4096
+
+# Bytes read per chunk while decoding
+READ_CHUNK_BYTES = 1 << 16
+
+# ---------------------------- FUNCTIONS ------------------------------- #
+
+def new_compressor(codec):
+    """New Compressor
+
+    Args:
+        codec (int): CODEC_ZLIB or CODEC_LZMA.
+
+    Returns:
+        The streaming compressor of the codec.
+    """
+    if codec == CODEC_LZMA:
+        return lzma.LZMACompressor(format=lzma.FORMAT_XZ, preset=6)
+    return zlib.compressobj(6)
+
+def new_decompressor(codec):
+    """New Decompressor
+
+    Args:
+        codec (int): CODEC_ZLIB or CODEC_LZMA.
+
+    Returns:
+        The streaming decompressor of the codec.
+    """
+    if codec == CODEC_LZMA:
+        return lzma.LZMADecompressor(format=lzma.FORMAT_XZ)
+    if codec == CODEC_ZLIB:
+        return zlib.decompressobj()
+    raise ValueError(f"unknown recording codec {codec}")
+
+
+class CompressedWriter:
+    """Compressed Writer
+
+    Writes events one by one into a compressed recording, compressing them block by block.
+
+    Args:
+        path (str): The path of the file to write.
+        codec (str): 'zlib' or 'lzma'.
+    """
+
+    def __init__(self, path, codec='zlib'):
+        self.path = path
+        self.count = 0
+        self.codec = CODECS[codec]
+        self.compressor = new_compressor(self.codec)
+        self.table = {}
+        self.new_names = []
+        self.fields = []
+        self.last = (0, 0, 0)
+        self.file = open(path, 'wb')
+        self.file.write(COMPRESSED_HEADER.pack(storage.COMPRESSED_MAGIC, COMPRESSED_VERSION, self.codec, 0))
+
+    def intern(self, name):
+        """Intern
+
+        Returns the table index of a name, adding it to the names of the current block the first time it is seen.
+
+        Args:
+            name (str): The key or button name.
+
+        Returns:
+            int: The table index.
+        """
+        index = self.table.get(name)
+        if index is None:
+            index = self.table[name] = len(self.table)
+            self.new_names.append(str(name).encode('utf-8'))
+        return index
+
+    def write(self, event):
+        """Write
+
+        Appends an event to the current block, compressing the block when it is full.
+
+        Args:
+            event (dict): The recorded event.
+        """
+        self.fields.append(storage.encode_event(event, self.intern))
+        self.count += 1
+        if len(self.fields) >= BLOCK_EVENTS:
+            self.write_block()
+
+    def write_block(self):
+        """Write Block
+
+        Delta encodes the events of the current block by column and feeds them to the compressor.
+        """
+        if not self.fields:
+            return
+        opcodes, times, durations, xs, ys, args0, args1 = zip(*self.fields)
+        last_time, last_x, last_y = self.last
+
+        times = [round(event_time * 1e9) for event_time in times]
+        time_deltas = array('q', (current - previous for previous, current in zip([last_time] + times, times)))
+        x_deltas = array('i', (current - previous for previous, current in zip((last_x,) + xs, xs)))
+        y_deltas = array('i', (current - previous for previous, current in zip((last_y,) + ys, ys)))
+        self.last = (times[-1], xs[-1], ys[-1])
+
+        parts = [BLOCK_HEADER.pack(len(self.fields), len(self.new_names))]
+        for encoded in self.new_names:
+            parts.append(NAME_LENGTH.pack(len(encoded)) + encoded)
+        parts.append(bytes(opcodes))
+        for column in (time_deltas, array('q', (round(duration * 1e9) for duration in durations)), x_deltas, y_deltas, array('i', args0), array('i', args1)):
+            if sys.byteorder == 'big':
+                column.byteswap()
+            parts.append(column.tobytes())
+        self.file.write(self.compressor.compress(b"".join(parts)))
+        self.fields = []
+        self.new_names = []
+
+    def close(self):
+        """Close
+
+        Compresses the last block, ends the compressed stream and closes the file.
+        """
+        if not self.file.closed:
+            self.write_block()
+            self.file.write(self.compressor.flush())
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def iter_decompressed(f, codec):
+    """Iterate Decompressed
+
+    Decompresses the rest of a file chunk by chunk.
+
+    Args:
+        f (file): The file opened in binary mode, after its header.
+        codec (int): CODEC_ZLIB or CODEC_LZMA.
+
+    Yields:
+        bytes: The decompressed chunks.
+    """
+    decompressor = new_decompressor(codec)
+    while True:
+        chunk = f.read(READ_CHUNK_BYTES)
+        if not chunk:
+            break
+        yield decompressor.decompress(chunk)
+    if codec == CODEC_ZLIB:
+        yield decompressor.flush()
+
+def iter_compressed_events(path):
+    """Iterate Compressed Events
+
+    Reads the events of a compressed recording one by one, decoding a block at a time.
+
+    Args:
+        path (str): The path of the recording.
+
+    Yields:
+        dict: The recorded events.
+    """
+    with open(path, 'rb') as f:
+        magic, version, codec, _ = COMPRESSED_HEADER.unpack(f.read(COMPRESSED_HEADER.size))
+        if magic != storage.COMPRESSED_MAGIC or version > COMPRESSED_VERSION:
+            raise ValueError(f"{path} is not a supported compressed recording")
+
+        table = []
+        buffer = bytearray()
+        last_time, last_x, last_y = 0, 0, 0
+        for chunk in iter_decompressed(f, codec):
+            buffer += chunk
+            while True:
+                block = read_block(buffer)
+                if block is None:
+                    break
+                size, names, columns = block
+                del buffer[:size]
+                table.extend(names)
+                opcodes, time_deltas, durations, x_deltas, y_deltas, args0, args1 = columns
+                times = list(accumulate(time_deltas, initial=last_time))[1:]
+                xs = list(accumulate(x_deltas, initial=last_x))[1:]
+                ys = list(accumulate(y_deltas, initial=last_y))[1:]
+                last_time, last_x, last_y = times[-1], xs[-1], ys[-1]
+                for opcode, event_time, duration, x, y, arg0, arg1 in zip(opcodes, times, durations, xs, ys, args0, args1):
+                    yield storage.decode_event((opcode, event_time / 1e9, duration / 1e9, x, y, arg0, arg1), table)
+        if buffer:
+            raise ValueError(f"{path} ends in the middle of a block")
+
+def read_block(buffer):
+    """Read Block
+
+    Parses the first block of a decompressed buffer.
+
+    Args:
+        buffer (bytearray): The decompressed bytes not parsed yet.
+
+    Returns:
+        tuple: The block size in bytes, its new names and its columns, or None when the block is not complete yet.
+    """
+    if len(buffer) < BLOCK_HEADER.size:
+        return None
+    count, names_count = BLOCK_HEADER.unpack_from(buffer, 0)
+    offset = BLOCK_HEADER.size
+    names = []
+    for _ in range(names_count):
+        if len(buffer) < offset + NAME_LENGTH.size:
+            return None
+        length = NAME_LENGTH.unpack_from(buffer, offset)[0]
+        offset += NAME_LENGTH.size
+        names.append(bytes(buffer[offset:offset + length]).decode('utf-8'))
+        offset += length
+    if len(buffer) < offset + count * (1 + 8 + 8 + 4 * 4):
+        return None
+
+    columns = [bytes(buffer[offset:offset + count])]
+    offset += count
+    for typecode, width in (('q', 8), ('q', 8), ('i', 4), ('i', 4), ('i', 4), ('i', 4)):
+        column = array(typecode)
+        column.frombytes(bytes(buffer[offset:offset + count * width]))
+        if sys.byteorder == 'big':
+            column.byteswap()
+        columns.append(column)
+        offset += count * width
+    return offset, names, columns
@@ -0,0 +1,214 @@
+"""Py Replay Control
+
+This script provides the control of a replay session: pause, resume, step one event and cancel. The replay thread
+waits for every event deadline through the control, in slices of at most the stop latency, so a cancel or a pause
+takes effect within that many milliseconds whatever the gap before the next event. The keys and mouse buttons
+pressed by the replay are tracked, released while paused and when the session ends, and pressed again on resume.
+
+Author: Facundo Giacconi AKA "GiacconiDev"
+
+"""
+
+import logging
+import threading
+
+
+# ---------------------------- CONSTANTS ------------------------------- #
+
+# Most milliseconds between a cancel or pause and the replay thread noticing it (a controller call in progress
+# is not interrupted)
+STOP_LATENCY_MS = 10
+
+PLAYING = "playing"
+PAUSED = "paused"
+CANCELLED = "cancelled"
+
+# Releasing action of every pressing action
+RELEASE_ACTIONS = {'released_key': 'pressed_key', 'released_mouse': 'pressed_mouse'}
+
+# ---------------------------- FUNCTIONS ------------------------------- #
+
+class ReplayControl:
+    """Replay Control
+
+    Control of a replay session, shared by the replay thread and the hotkeys and buttons driving it.
+
+    Args:
+        stop_latency_ms (float): Most milliseconds before a cancel or pause takes effect.
+    """
+
+    def __init__(self, stop_latency_ms=STOP_LATENCY_MS):
+        self.stop_latency = stop_latency_ms / 1000
+        self.condition = threading.Condition()
+        self.state = PLAYING
+        self.steps = 0
+        self.held = {}
+        self.keyboard = None
+        self.mouse = None
+
+    @property
+    def paused(self):
+        return self.state == PAUSED
+
+    @property
+    def cancelled(self):
+        return self.state == CANCELLED
+
+    def set_state(self, state, steps=0):
+        """Set State
+
+        Changes the state of a session not cancelled yet and wakes the replay thread up.
+
+        Args:
+            state (str): PLAYING, PAUSED or CANCELLED.
+            steps (int): Events to replay before staying paused.
+        """
+        with self.condition:
+            if self.state != CANCELLED:
+                self.state = state
+                self.steps += steps
+            self.condition.notify_all()
+
+    def pause(self):
+        """Pause
+
+        Pauses the replay before its next event.
+        """
+        self.set_state(PAUSED)
+
+    def resume(self):
+        """Resume
+
+        Resumes a paused replay, the events keep their spacing from the pause on.
+        """
+        self.set_state(PLAYING)
+
+    def toggle_pause(self):
+        """Toggle Pause
+
+        Pauses a playing replay or resumes a paused one.
+        """
+        with self.condition:
+            self.set_state(PLAYING if self.state == PAUSED else PAUSED)
+
+    def step(self):
+        """Step
+
+        Replays the next event of a paused replay right away, staying paused after it. Pauses a playing replay.
+        """
+        with self.condition:
+            self.set_state(PAUSED, steps=1 if self.state == PAUSED else 0)
+
+    def cancel(self):
+        """Cancel
+
+        Stops the replay before its next event, for good.
+        """
+        self.set_state(CANCELLED)
+
+    def wait(self, seconds):
+        """Wait
+
+        Waits some seconds unless the replay is cancelled meanwhile.
+
+        Args:
+            seconds (float): Seconds to wait.
+
+        Returns:
+            bool: Whether the replay was not cancelled.
+        """
+        with self.condition:
+            if self.state != CANCELLED:
+                self.condition.wait(seconds)
+            return self.state != CANCELLED
+
+    def attach(self, keyboard, mouse):
+        """Attach
+
+        Sets the controllers the held keys and buttons are released and pressed again with.
+
+        Args:
+            keyboard: The keyboard controller of the replay.
+            mouse: The mouse controller of the replay.
+        """
+        self.keyboard = keyboard
+        self.mouse = mouse
+
+    def executed(self, action, args):
+        """Executed
+
+        Tracks the keys and buttons held after a replayed event.
+
+        Args:
+            action (str): The recorded action of the event.
+            args (tuple): The arguments the controller was called with.
+        """
+        if action in ('pressed_key', 'pressed_mouse'):
+            self.held[(action, args)] = True
+        elif action in RELEASE_ACTIONS:
+            self.held.pop((RELEASE_ACTIONS[action], args), None)
+
+    def release_held(self, forget=True):
+        """Release Held
+
+        Releases the keys and buttons still held by the replay, the last pressed first.
+
+        Args:
+            forget (bool): Stop tracking them, otherwise they are pressed again by press_held.
+        """
+        for action, args in reversed(list(self.held)):
+            controller = self.keyboard if action == 'pressed_key' else self.mouse
+            logging.info(f"releasing held {args[0]}")
+            controller.release(*args)
+        if forget:
+            self.held.clear()
+
+    def press_held(self):
+        """Press Held
+
+        Presses again the keys and buttons released by a pause.
+        """
+        for action, args in self.held:
+            controller = self.keyboard if action == 'pressed_key' else self.mouse
+            controller.press(*args)
+
+    def wait_until(self, scheduler, deadline):
+        """Wait Until
+
+        Waits until the deadline of an event like scheduler.wait_until, in slices of at most the stop latency.
+        The time spent paused shifts the origin of the scheduler, so it is not counted as lateness.
+
+        Args:
+            scheduler (DeadlineScheduler): The scheduler of the replay pass.
+            deadline (float): Seconds from the start of the schedule to the event.
+
+        Returns:
+            float: Seconds the event is late, or None when the replay was cancelled.
+        """
+        if scheduler.origin is None:
+            scheduler.start()
+        with self.condition:
+            while True:
+                if self.state == CANCELLED:
+                    return None
+                if self.state == PAUSED and self.steps == 0:
+                    paused_at = scheduler.clock()
+                    self.release_held(forget=False)
+                    while self.state == PAUSED and self.steps == 0:
+                        self.condition.wait(self.stop_latency)
+                    scheduler.origin += scheduler.clock() - paused_at
+                    if self.state == CANCELLED:
+                        self.held.clear()
+                    else:
+                        self.press_held()
+                    continue
+                if self.steps > 0:
+                    # a stepped event is replayed right away
+                    self.steps -= 1
+                    scheduler.origin = min(scheduler.origin, scheduler.clock() - deadline)
+                    break
+                remaining = scheduler.origin + deadline - scheduler.clock()
+                if remaining <= scheduler.spin_window:
+                    break
+                self.condition.wait(min(remaining - scheduler.spin_window, self.stop_latency))
+        return scheduler.wait_until(deadline)
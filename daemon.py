@@ -0,0 +1,476 @@
+"""Py Replay Daemon
+
+This script provides a background service replaying recordings on request of other local tools. It listens on a
+Unix domain socket, keeps the compiled plans of the most recent recordings in memory so a play command reaches its
+first event in milliseconds, and runs scheduled and recurring replays. Requests and responses are json objects,
+one per line:
+
+    {"command": "play", "file": "login.rec", "loops": 1, "speed": 1.0, "delay": 0, "every": 3600}
+    {"command": "stop"}                      stops the current replay
+    {"command": "stop", "schedule": 2}       cancels a scheduled replay, "schedule": "all" cancels every one
+    {"command": "status"}
+    {"command": "list"}
+
+Responses carry "ok": true and the result, or "ok": false and an "error". One replay runs at a time: a play
+command received while replaying is refused, and a scheduled replay due while replaying is skipped. Every replay
+has its own control session, so the daemon never stops a replay of the GUI running in the same process.
+
+Usage:
+    python daemon.py [SOCKET]
+
+Author: Facundo Giacconi AKA "GiacconiDev"
+
+"""
+
+import heapq
+import itertools
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+import time
+
+import catalog
+import options
+import plan
+import playlist
+import replay
+import storage
+from control import ReplayControl
+from utils import SCRIPT_DIR
+
+
+# ---------------------------- CONSTANTS ------------------------------- #
+
+SOCKET_PATH = f"{SCRIPT_DIR}/.cache/daemon.sock"
+DATA_FOLDER = f"{SCRIPT_DIR}/data"
+
+COMMANDS = ("play", "stop", "status", "list")
+
+# Longest request line accepted, in bytes
+MAX_REQUEST_BYTES = 1 << 16
+
+# Seconds a client waits for the response of the daemon
+CLIENT_TIMEOUT = 5.0
+
+# ---------------------------- FUNCTIONS ------------------------------- #
+
+def default_controllers():
+    """Default Controllers
+
+    Returns:
+        tuple: pynput's KeyboardController, MouseController, Button, Key and KeyCode.
+    """
+    from pynput.keyboard import Key, Controller as KeyboardController, KeyCode
+    from pynput.mouse import Button, Controller as MouseController
+
+    return KeyboardController, MouseController, Button, Key, KeyCode
+
+def request_timing(request):
+    """Request Timing
+
+    Args:
+        request (dict): A play request.
+
+    Returns:
+        plan.ReplayTiming: The timing of the request, the replay timing options for the missing settings.
+
+    Raises:
+        ValueError: When a setting is not a number or the speed is not positive.
+    """
+    def setting(name, option):
+        value = request.get(name)
+        value = value if value is not None else options.get_option(option) or None
+        return float(value) if value is not None else None
+
+    speed = float(request.get('speed') or 1.0)
+    if speed <= 0:
+        raise ValueError("'speed' must be a positive number")
+    return plan.ReplayTiming(
+        speed=speed,
+        max_gap=setting('max_gap', "replay_max_gap"),
+        idle_threshold=setting('idle_threshold', "replay_idle_threshold"),
+        frame_rate=setting('frame_rate', "replay_frame_rate"))
+
+def request_loops(request):
+    """Request Loops
+
+    Args:
+        request (dict): A play request.
+
+    Returns:
+        int: Number of times the recording is replayed, 1 when missing.
+
+    Raises:
+        ValueError: When the count is not a positive integer.
+    """
+    loops = int(request['loops']) if request.get('loops') is not None else 1
+    if loops < 1:
+        raise ValueError("'loops' must be a positive integer")
+    return loops
+
+
+class ReplayDaemon:
+    """Replay Daemon
+
+    Replays, schedules and preloads recordings of a data folder for the socket server.
+
+    Args:
+        folder (str): The folder where recordings are stored.
+        controllers (tuple): KeyboardController, MouseController, Button, Key and KeyCode, pynput's by default.
+    """
+
+    def __init__(self, folder=DATA_FOLDER, controllers=None):
+        self.folder = folder
+        self.KeyboardController, self.MouseController, self.Button, self.Key, self.KeyCode = controllers or default_controllers()
+        self.keyboard, self.mouse = replay.get_controllers(self.KeyboardController, self.MouseController)
+        self.lock = threading.Lock()
+        self.current = None
+        self.session = None
+        self.replay_thread = None
+        self.schedules = []
+        self.schedule_ids = itertools.count(1)
+        self.schedule_changed = threading.Condition(self.lock)
+        self.running = True
+        self.scheduler_thread = threading.Thread(target=self.run_schedules, daemon=True)
+        self.scheduler_thread.start()
+
+    def path(self, file):
+        """Path
+
+        Args:
+            file (str): The name of a recording or playlist of the data folder.
+
+        Returns:
+            str: Its path.
+
+        Raises:
+            ValueError: When the file is not in the data folder.
+        """
+        path = os.path.join(self.folder, os.path.basename(file))
+        if not os.path.isfile(path):
+            raise ValueError(f"no recording or playlist named {file}")
+        return path
+
+    def preload(self, count=plan.PLAN_CACHE_SIZE):
+        """Preload
+
+        Compiles the plans of the most recently modified recordings into the plan cache, with the default timing.
+
+        Args:
+            count (int): Number of recordings preloaded.
+
+        Returns:
+            list: The names of the preloaded recordings.
+        """
+        paths = [os.path.join(self.folder, name) for name in storage.list_recordings(self.folder)]
+        paths = sorted((path for path in paths if os.path.isfile(path)), key=os.path.getmtime, reverse=True)[:count]
+        for path in paths:
+            replay.preload_plan(path, self.keyboard, self.mouse, self.Key, self.KeyCode, self.Button, request_timing({})).join()
+        return [os.path.basename(path) for path in paths]
+
+    def handle(self, request):
+        """Handle
+
+        Runs a request of a client.
+
+        Args:
+            request (dict): The request, with its "command".
+
+        Returns:
+            dict: The response.
+        """
+        command = request.get('command') if isinstance(request, dict) else None
+        if command not in COMMANDS:
+            return {'ok': False, 'error': f"unknown command {command!r}, expected one of {', '.join(COMMANDS)}"}
+        try:
+            return dict(getattr(self, f"command_{command}")(request), ok=True)
+        except (OSError, ValueError, KeyError, TypeError) as error:
+            return {'ok': False, 'error': str(error)}
+
+    def command_play(self, request):
+        """Command Play
+
+        Plays a recording or playlist now, or schedules it when the request has a "delay", an "at" epoch time
+        or an "every" interval in seconds.
+        """
+        path = self.path(request['file'])
+        if playlist.is_playlist(path):
+            playlist.load_playlist(path)
+        # a bad setting is refused now rather than when a scheduled replay is due
+        request_timing(request)
+        request_loops(request)
+        if any(request.get(name) is not None for name in ('delay', 'at', 'every')):
+            return {'schedule': self.schedule(request)}
+        if not self.start(path, request):
+            raise ValueError("a replay is already running")
+        return {'playing': request['file']}
+
+    def command_stop(self, request):
+        """Command Stop
+
+        Stops the current replay, or cancels a scheduled replay when the request has a "schedule" id.
+        """
+        schedule = request.get('schedule')
+        if schedule is None:
+            with self.lock:
+                stopped = self.current['file'] if self.current is not None else None
+                if self.current is not None:
+                    self.session.cancel()
+            return {'stopped': stopped}
+        with self.lock:
+            before = len(self.schedules)
+            self.schedules = [entry for entry in self.schedules if schedule != "all" and entry[1] != schedule]
+            heapq.heapify(self.schedules)
+            self.schedule_changed.notify_all()
+            return {'cancelled': before - len(self.schedules)}
+
+    def command_status(self, request):
+        """Command Status
+
+        Returns the current replay and the scheduled ones.
+        """
+        with self.lock:
+            current = dict(self.current, state=self.session.state) if self.current is not None else None
+            schedules = [{'schedule': schedule_id, 'file': entry['file'], 'next': when, 'every': entry.get('every')}
+                         for when, schedule_id, entry in sorted(self.schedules)]
+        return {'current': current, 'schedules': schedules, 'cached_plans': len(plan.plan_cache)}
+
+    def command_list(self, request):
+        """Command List
+
+        Returns the recordings of the data folder with their catalog metadata, and the playlists.
+        """
+        recordings = [dict(entry or {}, file=name) for name, entry in catalog.cached_recordings(self.folder)]
+        return {'recordings': recordings, 'playlists': playlist.list_playlists(self.folder)}
+
+    def schedule(self, request):
+        """Schedule
+
+        Adds a scheduled replay.
+
+        Args:
+            request (dict): The play request, with "delay" or "at" for its first replay and "every" to repeat it.
+
+        Returns:
+            int: The schedule id.
+        """
+        if request.get('every') is not None and float(request['every']) <= 0:
+            raise ValueError("'every' must be a positive number of seconds")
+        if request.get('at') is not None:
+            when = float(request['at'])
+        else:
+            # a recurring replay without a delay first runs after one interval
+            delay = request['delay'] if request.get('delay') is not None else request.get('every')
+            when = time.time() + float(delay or 0)
+        with self.lock:
+            schedule_id = next(self.schedule_ids)
+            heapq.heappush(self.schedules, (when, schedule_id, request))
+            self.schedule_changed.notify_all()
+        logging.info(f"scheduled {request['file']} ({schedule_id}) at {time.ctime(when)}")
+        return schedule_id
+
+    def run_schedules(self):
+        """Run Schedules
+
+        Scheduler thread: starts every scheduled replay when it is due and reschedules the recurring ones.
+        """
+        with self.lock:
+            while self.running:
+                if not self.schedules:
+                    self.schedule_changed.wait()
+                    continue
+                when, schedule_id, request = self.schedules[0]
+                remaining = when - time.time()
+                if remaining > 0:
+                    self.schedule_changed.wait(remaining)
+                    continue
+                heapq.heappop(self.schedules)
+                if request.get('every') is not None:
+                    heapq.heappush(self.schedules, (max(when + float(request['every']), time.time()), schedule_id, request))
+                self.lock.release()
+                try:
+                    if not self.start(self.path(request['file']), request):
+                        logging.warning(f"skipping scheduled {request['file']} ({schedule_id}), a replay is already running")
+                except (OSError, ValueError) as error:
+                    logging.error(f"scheduled {request['file']} ({schedule_id}): {error}")
+                finally:
+                    self.lock.acquire()
+
+    def start(self, path, request):
+        """Start
+
+        Starts replaying a recording or playlist on a new thread, unless a replay is running.
+
+        Args:
+            path (str): The path of the recording or playlist.
+            request (dict): The play request, with the "loops" count and the timing settings.
+
+        Returns:
+            bool: Whether the replay started.
+
+        Raises:
+            ValueError: When a setting of the request is invalid.
+        """
+        # parsed before claiming the daemon, so a bad request never leaves it busy
+        timing = request_timing(request)
+        loops = request_loops(request)
+
+        with self.lock:
+            if self.current is not None:
+                return False
+            self.current = {'file': os.path.basename(path), 'started': time.time()}
+            self.session = session = ReplayControl()
+
+        def replay_thread_function():
+            try:
+                if playlist.is_playlist(path):
+                    replay.replay_playlist(self.KeyboardController, self.MouseController, self.Button, self.Key, path, self.KeyCode, timing, session)
+                else:
+                    replay.replay_events(self.KeyboardController, self.MouseController, self.Button, self.Key, path, self.KeyCode, timing, loops, session=session)
+            except Exception:
+                logging.exception(f"replay of {path} failed")
+            finally:
+                with self.lock:
+                    self.current = None
+
+        self.replay_thread = threading.Thread(target=replay_thread_function, daemon=True)
+        self.replay_thread.start()
+        return True
+
+    def close(self):
+        """Close
+
+        Stops the current replay and the scheduler thread.
+        """
+        with self.lock:
+            if self.current is not None:
+                self.session.cancel()
+            self.running = False
+            self.schedule_changed.notify_all()
+        if self.replay_thread is not None:
+            self.replay_thread.join()
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """Request Handler
+
+    Answers every json request line of a client connection.
+    """
+
+    def handle(self):
+        while True:
+            line = self.rfile.readline(MAX_REQUEST_BYTES)
+            if not line:
+                break
+            try:
+                response = self.server.replay_daemon.handle(json.loads(line))
+            except ValueError as error:
+                response = {'ok': False, 'error': f"invalid request: {error}"}
+            self.wfile.write(json.dumps(response).encode('utf-8') + b"\n")
+
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Daemon Server
+
+    Unix domain socket server of a replay daemon, one thread per client connection.
+
+    Args:
+        socket_path (str): The path of the socket.
+        replay_daemon (ReplayDaemon): The daemon running the requests.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, replay_daemon):
+        self.replay_daemon = replay_daemon
+        remove_stale_socket(socket_path)
+        os.makedirs(os.path.dirname(os.path.abspath(socket_path)), exist_ok=True)
+        # only the user running the daemon can connect
+        previous_umask = os.umask(0o177)
+        try:
+            super().__init__(socket_path, RequestHandler)
+        finally:
+            os.umask(previous_umask)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+
+def remove_stale_socket(socket_path):
+    """Remove Stale Socket
+
+    Removes the socket left by a daemon that did not shut down cleanly.
+
+    Args:
+        socket_path (str): The path of the socket.
+
+    Raises:
+        OSError: When another daemon is listening on the socket.
+    """
+    if not os.path.exists(socket_path):
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(socket_path)
+        except OSError:
+            os.remove(socket_path)
+            return
+    raise OSError(f"a daemon is already listening on {socket_path}")
+
+def serve(socket_path=SOCKET_PATH, folder=DATA_FOLDER, controllers=None, ready=None):
+    """Serve
+
+    Runs a replay daemon until it is interrupted.
+
+    Args:
+        socket_path (str): The path of the socket.
+        folder (str): The folder where recordings are stored.
+        controllers (tuple): KeyboardController, MouseController, Button, Key and KeyCode, pynput's by default.
+        ready (function): Called with the server once it listens.
+    """
+    replay_daemon = ReplayDaemon(folder, controllers)
+    logging.info(f"preloaded {', '.join(replay_daemon.preload()) or 'no recordings'}")
+    with DaemonServer(socket_path, replay_daemon) as server:
+        logging.info(f"replay daemon listening on {socket_path}")
+        if ready is not None:
+            ready(server)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            replay_daemon.close()
+
+def send_command(request, socket_path=SOCKET_PATH, timeout=CLIENT_TIMEOUT):
+    """Send Command
+
+    Sends a request to a running daemon.
+
+    Args:
+        request (dict): The request, with its "command".
+        socket_path (str): The path of the socket.
+        timeout (float): Seconds to wait for the response.
+
+    Returns:
+        dict: The response of the daemon.
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(socket_path)
+        client.sendall(json.dumps(request).encode('utf-8') + b"\n")
+        with client.makefile('rb') as response:
+            return json.loads(response.readline())
+
+
+if __name__ == "__main__":
+    import sys
+
+    import logs
+
+    logs.setup_logging()
+    serve(sys.argv[1] if len(sys.argv) > 1 else SOCKET_PATH)
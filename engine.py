@@ -0,0 +1,262 @@
+"""Py Replay Engine
+
+This script provides an asyncio replay engine for embedding replays in other applications. Unlike replay.py it keeps
+no module state: every session owns its controllers and its cache of compiled plans, so several sessions can replay
+in one event loop against separate controller backends. play() is awaited, cancelling its task stops the replay and releases the keys and
+buttons it held, and progress() is an async iterator over the replayed events.
+
+    session = ReplaySession(keyboard, mouse, Key, KeyCode, Button)
+    task = asyncio.create_task(session.play("login.rec", loops=2))
+    async for progress in session.progress():
+        print(progress.events, progress.elapsed)
+    report = await task
+
+Author: Facundo Giacconi AKA "GiacconiDev"
+
+"""
+
+import asyncio
+from collections import namedtuple
+from itertools import islice
+import logging
+import os
+import threading
+
+import plan
+import playlist
+from control import ReplayControl
+from scheduler import DeadlineScheduler
+from utils import SCRIPT_DIR
+
+
+# ---------------------------- CONSTANTS ------------------------------- #
+
+# Operations compiled per batch on a worker thread when a plan is not cached, so reading the recording
+# never blocks the event loop for long
+COMPILE_BATCH = 1024
+
+# Progress of a session: file being replayed, replay pass (from 1), events replayed in the pass, events of the pass
+# when its plan is cached (None otherwise), seconds from the start of the pass and lateness of the last event
+Progress = namedtuple('Progress', ['file', 'replay_pass', 'events', 'total', 'elapsed', 'late'])
+
+# ---------------------------- FUNCTIONS ------------------------------- #
+
+async def iter_plan(operations):
+    """Iterate Plan
+
+    Iterates over a replay plan, compiling the plans not cached yet batch by batch on a worker thread. A plan being
+    compiled is closed when the iteration ends or is cancelled, once the batch compiling on the worker thread, if
+    any, is done.
+
+    Args:
+        operations (iterable): The plan returned by plan.load_plan.
+
+    Yields:
+        tuple: (deadline, function, args, action) operations.
+    """
+    if isinstance(operations, list):
+        for operation in operations:
+            yield operation
+        return
+    batch_future = None
+    try:
+        while True:
+            batch_future = asyncio.ensure_future(asyncio.to_thread(lambda: list(islice(operations, COMPILE_BATCH))))
+            # shielded, so a cancel does not leave the worker thread running the generator unnoticed
+            batch = await asyncio.shield(batch_future)
+            if not batch:
+                break
+            for operation in batch:
+                yield operation
+    finally:
+        close = getattr(operations, 'close', None)
+        if close is not None and batch_future is not None and not batch_future.done():
+            # a running generator cannot be closed, it is once its batch is compiled
+            batch_future.add_done_callback(lambda future: close())
+        elif close is not None:
+            close()
+
+
+class ReplaySession:
+    """Replay Session
+
+    Replays recordings with its own controllers and plan cache, in an asyncio event loop.
+
+    Args:
+        keyboard: The keyboard controller the session replays with.
+        mouse: The mouse controller the session replays with.
+        Key: The keyboard key of the backend.
+        KeyCode: The keyboard key code of the backend.
+        Button: The mouse button of the backend.
+        plan_cache (plan.PlanCache): The cache of the compiled plans, a new one by default. Sessions replaying
+            the same recordings can share one.
+    """
+
+    def __init__(self, keyboard, mouse, Key, KeyCode, Button, plan_cache=None):
+        self.keyboard = keyboard
+        self.mouse = mouse
+        self.Key = Key
+        self.KeyCode = KeyCode
+        self.Button = Button
+        self.plan_cache = plan_cache if plan_cache is not None else plan.PlanCache()
+        self.subscribers = []
+        self.playing = False
+
+    def publish(self, progress):
+        """Publish
+
+        Args:
+            progress (Progress): The progress to send to every progress() iterator, None once the replay ended.
+        """
+        for subscriber in self.subscribers:
+            subscriber.put_nowait(progress)
+
+    async def progress(self):
+        """Progress
+
+        Async iterator over the progress of the session, one Progress per replayed event, until the current or next
+        play() ends.
+
+        Yields:
+            Progress: The progress after every replayed event.
+        """
+        queue = asyncio.Queue()
+        self.subscribers.append(queue)
+        try:
+            while True:
+                progress = await queue.get()
+                if progress is None:
+                    break
+                yield progress
+        finally:
+            self.subscribers.remove(queue)
+
+    async def play(self, file, timing=None, loops=1, start_time=None, start_index=None):
+        """Play
+
+        Replays a recording or playlist. Cancelling the task awaiting it stops the replay before its next event.
+
+        Args:
+            file (str): The name of the recording or playlist in the data folder, or its path.
+            timing (plan.ReplayTiming): Speed factor, gap cap, idle collapsing and frame rate of the replay.
+            loops (int): Number of times the recording is replayed.
+            start_time (float): Seconds from the start of the recording the first pass starts at.
+            start_index (int): Index of the event the first pass starts at.
+
+        Returns:
+            dict: The lateness report of the last replay pass.
+
+        Raises:
+            RuntimeError: When the session is already playing.
+        """
+        if self.playing:
+            raise RuntimeError("the session is already playing")
+        self.playing = True
+        # keys and buttons held by the replay, released when it ends or is cancelled
+        held = ReplayControl()
+        held.attach(self.keyboard, self.mouse)
+        path = os.path.join(f"{SCRIPT_DIR}/data", file)
+        try:
+            if playlist.is_playlist(path):
+                report = None
+                for entry_path, repeat in playlist.load_playlist(path):
+                    report = await self.play_recording(entry_path, held, timing, repeat)
+                return report
+            return await self.play_recording(path, held, timing, loops, start_time, start_index)
+        finally:
+            held.release_held()
+            self.playing = False
+            self.publish(None)
+
+    async def play_recording(self, path, held, timing=None, loops=1, start_time=None, start_index=None):
+        """Play Recording
+
+        Replays a recording, waiting for every event deadline on the event loop.
+
+        Args:
+            path (str): The path of the recording.
+            held (ReplayControl): Tracks the keys and buttons held by the replay.
+            timing (plan.ReplayTiming): Speed factor, gap cap, idle collapsing and frame rate of the replay.
+            loops (int): Number of times the recording is replayed.
+            start_time (float): Seconds from the start of the recording the first pass starts at.
+            start_index (int): Index of the event the first pass starts at.
+
+        Returns:
+            dict: The lateness report of the last replay pass.
+        """
+        loop = asyncio.get_running_loop()
+        scheduler = DeadlineScheduler(clock=loop.time)
+        name = os.path.basename(path)
+
+        for replay_pass in range(1, loops + 1):
+            operations = plan.load_plan(path, self.keyboard, self.mouse, self.Key, self.KeyCode, self.Button, timing, start_time, start_index, self.plan_cache)
+            # only the first pass is sought, the next ones replay the whole recording
+            start_time = start_index = None
+            total = len(operations) if isinstance(operations, list) else None
+            scheduler.start()
+
+            events = 0
+            plan_iterator = iter_plan(operations)
+            try:
+                async for deadline, function, args, action in plan_iterator:
+                    if action == 'checkpoint':
+                        await self.wait_for_checkpoint(function, args)
+                        # the next events keep their spacing from the match
+                        scheduler.origin = loop.time() - deadline
+                        late = 0
+                    else:
+                        delay = scheduler.origin + deadline - loop.time()
+                        if delay > 0:
+                            await asyncio.sleep(delay)
+                        late = max(loop.time() - scheduler.origin - deadline, 0)
+                        scheduler.lateness.append(late)
+                        function(*args)
+                        held.executed(action, args)
+                    events += 1
+                    if self.subscribers:
+                        self.publish(Progress(name, replay_pass, events, total, loop.time() - scheduler.origin, late))
+            finally:
+                # closes the recording of a plan still being compiled, also when the task is cancelled
+                await plan_iterator.aclose()
+            logging.info(f"{name} - lateness report: {scheduler.report()}")
+        return scheduler.report()
+
+    async def wait_for_checkpoint(self, function, args):
+        """Wait For Checkpoint
+
+        Waits for a checkpoint on a worker thread, abandoning it when the task is cancelled.
+
+        Args:
+            function (function): screen.wait_for_checkpoint.
+            args (tuple): Its arguments, the checkpoint event.
+
+        Raises:
+            RuntimeError: When the screen did not reach the checkpoint in time.
+        """
+        abandoned = threading.Event()
+        try:
+            matched = await asyncio.to_thread(function, *args, wait=lambda seconds: not abandoned.wait(seconds))
+        finally:
+            abandoned.set()
+        if not matched:
+            raise RuntimeError(f"the screen did not reach checkpoint {args[0]['reference']}")
+
+
+async def play(file, keyboard, mouse, Key, KeyCode, Button, **kwargs):
+    """Play
+
+    Replays a recording or playlist in a new session.
+
+    Args:
+        file (str): The name of the recording or playlist in the data folder, or its path.
+        keyboard: The keyboard controller.
+        mouse: The mouse controller.
+        Key: The keyboard key of the backend.
+        KeyCode: The keyboard key code of the backend.
+        Button: The mouse button of the backend.
+        **kwargs: timing, loops, start_time and start_index, see ReplaySession.play.
+
+    Returns:
+        dict: The lateness report of the last replay pass.
+    """
+    return await ReplaySession(keyboard, mouse, Key, KeyCode, Button).play(file, **kwargs)
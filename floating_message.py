@@ -2,7 +2,7 @@
 import tkinter
 
 class FloatingMessage(tkinter.Toplevel):
-    def __init__(self, master, message):
+    def __init__(self, master, message, buttons=None):
         super().__init__(master)
         self.withdraw()  # Hide the window initially
         self.attributes('-alpha', 0.8)  # Set transparency level
@@ -11,7 +11,11 @@ class FloatingMessage(tkinter.Toplevel):
         
         # Create and place the label with the message
         self.label = tkinter.Label(self, text=message, fg='white', bg='green', padx=10, pady=5)
-        self.label.pack()
+        self.label.pack(side='left')
+        
+        # Optional (text, command) buttons next to the message
+        for text, command in buttons or []:
+            tkinter.Button(self, text=text, command=command, padx=5).pack(side='left', padx=2, pady=2)
         
         # Calculate middle of the current screen and setting message box in middle top
         screen_width = self.winfo_screenwidth()
@@ -0,0 +1,114 @@
+"""Py Replay Icons
+
+This script provides the images of the GUI already resized, so they load straight into a tkinter PhotoImage
+without PIL. Resized copies are built ahead of time into img/cache (run this script before bundling the app)
+or, when missing, on first run into the .cache folder next to the app. PIL is only imported to build them.
+
+Usage:
+    python icons.py
+
+Author: Facundo Giacconi AKA "GiacconiDev"
+
+"""
+
+import os
+
+from utils import RESOURCES_DIR, SCRIPT_DIR
+
+
+# ---------------------------- CONSTANTS ------------------------------- #
+
+BUILD_CACHE_DIR = f"{RESOURCES_DIR}/img/cache"
+RUNTIME_CACHE_DIR = f"{SCRIPT_DIR}/.cache/icons"
+
+# Images used by the GUI and their size in pixels
+ICON_SIZES = {
+    "arrow-one": 40,
+    "record": 40,
+    "play": 40,
+    "delete": 40,
+    "gear": 40,
+    "arrow-repeat": 40,
+    "disk": 50,
+}
+
+# PhotoImages already loaded, they must be referenced to not be garbage collected
+loaded_icons = {}
+
+# ---------------------------- FUNCTIONS ------------------------------- #
+
+def source_path(name):
+    """Source Path
+
+    Returns the path of an original image.
+
+    Args:
+        name (str): The image name, without extension.
+
+    Returns:
+        str: The image path.
+    """
+    return f"{RESOURCES_DIR}/img/{name}.png"
+
+def build_icon(name, size, folder):
+    """Build Icon
+
+    Resizes an original image and saves it in a cache folder.
+
+    Args:
+        name (str): The image name, without extension.
+        size (int): The size in pixels.
+        folder (str): The cache folder.
+
+    Returns:
+        str: The path of the resized image.
+    """
+    from PIL import Image
+
+    os.makedirs(folder, exist_ok=True)
+    path = f"{folder}/{name}-{size}.png"
+    Image.open(source_path(name)).resize((size, size), Image.LANCZOS).save(path)
+    return path
+
+def icon_path(name, size):
+    """Icon Path
+
+    Returns the path of a resized image, building it when no up to date copy exists.
+
+    Args:
+        name (str): The image name, without extension.
+        size (int): The size in pixels.
+
+    Returns:
+        str: The path of the resized image.
+    """
+    source_mtime = os.path.getmtime(source_path(name))
+    for folder in (BUILD_CACHE_DIR, RUNTIME_CACHE_DIR):
+        path = f"{folder}/{name}-{size}.png"
+        if os.path.exists(path) and os.path.getmtime(path) >= source_mtime:
+            return path
+    return build_icon(name, size, RUNTIME_CACHE_DIR)
+
+def load_icon(name, size=None):
+    """Load Icon
+
+    Loads an image into a PhotoImage, resized when a size is given. A tkinter root window must exist.
+
+    Args:
+        name (str): The image name, without extension.
+        size (int): The size in pixels, the original size by default.
+
+    Returns:
+        tkinter.PhotoImage: The image.
+    """
+    import tkinter
+
+    if (name, size) not in loaded_icons:
+        path = source_path(name) if size is None else icon_path(name, size)
+        loaded_icons[(name, size)] = tkinter.PhotoImage(file=path)
+    return loaded_icons[(name, size)]
+
+
+if __name__ == "__main__":
+    for name, size in ICON_SIZES.items():
+        print(build_icon(name, size, BUILD_CACHE_DIR))
@@ -0,0 +1,400 @@
+"""Py Replay Index
+
+This script provides the time-offset index of binary recordings, so a replay can start at any time or event index
+without decoding the events before it. The index is a sidecar file next to the recording ('<recording>.idx'),
+validated by the size and modification time of the recording and rebuilt when missing or stale. Both the index and
+the recording are memory-mapped, so seeking costs a binary search plus the decoding of at most one checkpoint
+interval of records, whatever the size of the file.
+
+Every checkpoint keeps the keys and mouse buttons held and the last mouse position at that point, which are restored
+before replaying from it.
+
+Index layout (little endian):
+    header: magic (4s), index version (H), reserved (H), recording size (Q), recording mtime in ns (q),
+            checkpoint interval (I), checkpoint count (I), table length (I), states length (I)
+    checkpoint: event index (Q), record byte offset (Q), seconds before the event (d), state offset (I), state length (I)
+    table: utf-8 json list with the interned names of the recording
+    states: utf-8 json lists with the held state of every checkpoint
+
+Author: Facundo Giacconi AKA "GiacconiDev"
+
+"""
+
+import bisect
+import json
+import mmap
+import os
+import struct
+
+import storage
+
+
+# ---------------------------- CONSTANTS ------------------------------- #
+
+INDEX_MAGIC = b"CPYI"
+INDEX_VERSION = 1
+
+INDEX_HEADER = struct.Struct("<4sHHQqIIII")
+CHECKPOINT = struct.Struct("<QQdII")
+
+# Events between checkpoints, the most events decoded to reach any point
+CHECKPOINT_INTERVAL = 256
+
+# ---------------------------- FUNCTIONS ------------------------------- #
+
+class HeldState:
+    """Held State
+
+    Keys and mouse buttons held and last mouse position while going through a recording.
+    """
+
+    def __init__(self):
+        self.keys = {}
+        self.buttons = {}
+        self.position = None
+
+    def update(self, event):
+        """Update
+
+        Applies a recorded event to the state.
+
+        Args:
+            event (dict): The recorded event.
+        """
+        action = event['action']
+        if action == 'pressed_key':
+            self.keys[key_identity(event)] = event
+        elif action == 'released_key':
+            self.keys.pop(key_identity(event), None)
+        elif action == 'pressed_mouse':
+            self.buttons[event['button']] = event
+        elif action == 'released_mouse':
+            self.buttons.pop(event['button'], None)
+        if 'x' in event:
+            self.position = (event['x'], event['y'])
+
+    def events(self):
+        """Events
+
+        Returns:
+            list: The events restoring the state without waiting: a move to the last position, then the presses
+            of the held keys and buttons.
+        """
+        restore = []
+        if self.position is not None:
+            restore.append({'action': 'moved', 'x': self.position[0], 'y': self.position[1], 'time': 0, 'duration': 0})
+        for event in list(self.keys.values()) + list(self.buttons.values()):
+            restore.append(dict(event, duration=0))
+        return restore
+
+    @classmethod
+    def from_events(cls, events):
+        """From Events
+
+        Args:
+            events (list): Events returned by HeldState.events().
+
+        Returns:
+            HeldState: The state they restore.
+        """
+        state = cls()
+        for event in events:
+            state.update(event)
+        return state
+
+
+class CheckpointTimes:
+    """Checkpoint Times
+
+    Read-only sequence of the seconds before every checkpoint of an index, for binary searches.
+
+    Args:
+        recording_index (RecordingIndex): The index.
+    """
+
+    def __init__(self, recording_index):
+        self.recording_index = recording_index
+
+    def __len__(self):
+        return self.recording_index.count
+
+    def __getitem__(self, position):
+        return self.recording_index.checkpoint(position)[2]
+
+
+class RecordingIndex:
+    """Recording Index
+
+    Memory-mapped index of a binary recording.
+
+    Args:
+        path (str): The path of the recording.
+
+    Raises:
+        ValueError: When the index is not valid or does not match the current recording.
+    """
+
+    def __init__(self, path):
+        stat = os.stat(path)
+        with open(index_path(path), 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, _, size, mtime_ns, self.interval, self.count, table_length, _ = INDEX_HEADER.unpack_from(self.data, 0)
+            if magic != INDEX_MAGIC or version != INDEX_VERSION:
+                raise ValueError(f"{index_path(path)} is not a recording index")
+            if size != stat.st_size or mtime_ns != stat.st_mtime_ns:
+                raise ValueError(f"{index_path(path)} is stale")
+            table_offset = INDEX_HEADER.size + CHECKPOINT.size * self.count
+            self.table = json.loads(self.data[table_offset:table_offset + table_length].decode('utf-8'))
+            self.states_offset = table_offset + table_length
+        except struct.error as error:
+            self.close()
+            raise ValueError(f"{index_path(path)} is not a recording index: {error}") from error
+        except ValueError:
+            self.close()
+            raise
+
+    def checkpoint(self, position):
+        """Checkpoint
+
+        Args:
+            position (int): The checkpoint number.
+
+        Returns:
+            tuple: The event index, record byte offset and seconds before the event of the checkpoint.
+        """
+        return CHECKPOINT.unpack_from(self.data, INDEX_HEADER.size + CHECKPOINT.size * position)[:3]
+
+    def state(self, position):
+        """State
+
+        Args:
+            position (int): The checkpoint number.
+
+        Returns:
+            HeldState: The held state at the checkpoint.
+        """
+        state_offset, state_length = CHECKPOINT.unpack_from(self.data, INDEX_HEADER.size + CHECKPOINT.size * position)[3:]
+        start = self.states_offset + state_offset
+        return HeldState.from_events(json.loads(self.data[start:start + state_length].decode('utf-8')))
+
+    def locate(self, start_time=None, start_index=None):
+        """Locate
+
+        Finds the last checkpoint at or before a point of the recording.
+
+        Args:
+            start_time (float): Seconds from the start of the recording.
+            start_index (int): Index of the event.
+
+        Returns:
+            int: The checkpoint number.
+        """
+        if start_index is not None:
+            return max(min(start_index // self.interval, self.count - 1), 0)
+        return max(bisect.bisect_right(CheckpointTimes(self), start_time) - 1, 0)
+
+    def close(self):
+        """Close
+
+        Unmaps the index.
+        """
+        self.data.close()
+
+
+def index_path(path):
+    """Index Path
+
+    Args:
+        path (str): The path of the recording.
+
+    Returns:
+        str: The path of its index.
+    """
+    return f"{path}{storage.INDEX_EXTENSION}"
+
+def key_identity(event):
+    """Key Identity
+
+    Args:
+        event (dict): A recorded key event.
+
+    Returns:
+        tuple: What identifies the key of the event, its name or its virtual key code.
+    """
+    return ('vk', event['vk']) if 'vk' in event else ('key', event['key'])
+
+def map_recording(f, path):
+    """Map Recording
+
+    Memory-maps a binary recording and checks its header.
+
+    Args:
+        f (file): The recording opened in binary mode.
+        path (str): The path of the recording, for error messages.
+
+    Returns:
+        tuple: The mmap and the end offset of its last whole record.
+    """
+    data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, record_size = storage.HEADER.unpack_from(data, 0)
+    if magic != storage.MAGIC or version > storage.FORMAT_VERSION or record_size != storage.RECORD.size:
+        data.close()
+        raise ValueError(f"{path} is not a supported binary recording")
+    # ignore a trailing partial record (e.g. a recording interrupted mid write)
+    return data, len(data) - (len(data) - storage.HEADER.size) % storage.RECORD.size
+
+def build_index(path, interval=CHECKPOINT_INTERVAL):
+    """Build Index
+
+    Writes the index of a binary recording next to it.
+
+    Args:
+        path (str): The path of the recording.
+        interval (int): Events between checkpoints.
+    """
+    stat = os.stat(path)
+    table, checkpoints, states = [], [], []
+    state = HeldState()
+    elapsed, event_index = 0, 0
+
+    with open(path, 'rb') as f:
+        data, end = map_recording(f, path)
+        with data:
+            for offset in range(storage.HEADER.size, end, storage.RECORD.size):
+                if data[offset] == storage.OP_INTERN:
+                    storage.read_intern(table, storage.INTERN.unpack_from(data, offset))
+                    continue
+                if event_index % interval == 0:
+                    checkpoints.append((event_index, offset, elapsed))
+                    states.append(json.dumps(state.events()).encode('utf-8'))
+                event = storage.decode_event(storage.RECORD.unpack_from(data, offset), table)
+                state.update(event)
+                elapsed += event['duration']
+                event_index += 1
+
+    if not checkpoints:
+        checkpoints.append((0, end, 0))
+        states.append(b"[]")
+
+    table_blob = json.dumps(table).encode('utf-8')
+    temp_path = f"{index_path(path)}.{os.getpid()}{storage.TEMP_EXTENSION}"
+    with open(temp_path, 'wb') as outfile:
+        outfile.write(INDEX_HEADER.pack(INDEX_MAGIC, INDEX_VERSION, 0, stat.st_size, stat.st_mtime_ns, interval,
+                                        len(checkpoints), len(table_blob), sum(len(blob) for blob in states)))
+        state_offset = 0
+        for (checkpoint_index, offset, seconds), blob in zip(checkpoints, states):
+            outfile.write(CHECKPOINT.pack(checkpoint_index, offset, seconds, state_offset, len(blob)))
+            state_offset += len(blob)
+        outfile.write(table_blob)
+        for blob in states:
+            outfile.write(blob)
+    os.replace(temp_path, index_path(path))
+
+def open_index(path):
+    """Open Index
+
+    Opens the index of a binary recording, building it first when it is missing or stale.
+
+    Args:
+        path (str): The path of the recording.
+
+    Returns:
+        RecordingIndex: The index, to be closed by the caller.
+    """
+    try:
+        return RecordingIndex(path)
+    except (OSError, ValueError):
+        build_index(path)
+        return RecordingIndex(path)
+
+def seek_events(events, start_time=None, start_index=None, state=None, elapsed=0, event_index=0):
+    """Seek Events
+
+    Skips the events before a point of a recording, then yields the events restoring the held state at that point
+    and the rest of the events. With a start time the first event only waits what remains until it.
+
+    Args:
+        events (iterable): The recorded events, from event_index on.
+        start_time (float): Seconds from the start of the recording.
+        start_index (int): Index of the first event to replay.
+        state (HeldState): The held state before the first of the events.
+        elapsed (float): Seconds before the first of the events.
+        event_index (int): Index of the first of the events.
+
+    Yields:
+        dict: The events to replay.
+    """
+    state = state or HeldState()
+    events = iter(events)
+    for event in events:
+        if (start_index is not None and event_index < start_index) or \
+                (start_time is not None and elapsed + event['duration'] < start_time):
+            state.update(event)
+            elapsed += event['duration']
+            event_index += 1
+            continue
+        yield from state.events()
+        if start_time is not None:
+            event = dict(event, duration=elapsed + event['duration'] - start_time)
+        yield event
+        yield from events
+
+def iter_binary_events_from(path, start_time=None, start_index=None):
+    """Iterate Binary Events From
+
+    Reads a binary recording from a point, through its index.
+
+    Args:
+        path (str): The path of the recording.
+        start_time (float): Seconds from the start of the recording.
+        start_index (int): Index of the first event to replay.
+
+    Yields:
+        dict: The events restoring the held state at that point, then the rest of the events.
+    """
+    recording_index = open_index(path)
+    try:
+        position = recording_index.locate(start_time, start_index)
+        event_index, start_offset, elapsed = recording_index.checkpoint(position)
+        state = recording_index.state(position)
+        table = recording_index.table
+    finally:
+        recording_index.close()
+
+    with open(path, 'rb') as f:
+        data, end = map_recording(f, path)
+        with data:
+            records = (storage.decode_event(storage.RECORD.unpack_from(data, offset), table)
+                       for offset in range(start_offset, end, storage.RECORD.size)
+                       if data[offset] != storage.OP_INTERN)
+            yield from seek_events(records, start_time, start_index, state, elapsed, event_index)
+
+def iter_events_from(path, start_time=None, start_index=None):
+    """Iterate Events From
+
+    Reads a recording from a time or event index, restoring the keys and buttons held and the mouse position
+    at that point first. Binary recordings are read through their index, json ones from the start.
+
+    Args:
+        path (str): The path of the recording.
+        start_time (float): Seconds from the start of the recording.
+        start_index (int): Index of the first event to replay.
+
+    Yields:
+        dict: The events to replay.
+    """
+    if start_time is None and start_index is None:
+        yield from storage.iter_events(path)
+    elif storage.is_binary_recording(path):
+        yield from iter_binary_events_from(path, start_time, start_index)
+    else:
+        yield from seek_events(storage.iter_events(path), start_time, start_index)
+
+
+if __name__ == "__main__":
+    import sys
+
+    for recording_path in sys.argv[1:]:
+        build_index(recording_path)
+        print(index_path(recording_path))
@@ -0,0 +1,293 @@
+"""Py Replay Instrumentation
+
+This script provides the opt-in instrumentation of recording and replay sessions: histograms of the time spent per
+event (listener callbacks, replay sleep overshoot and injection latency), event counts and rates by action, and
+tracked values such as the recorder queue depth or the replay drift. Sessions are only created when the
+'instrumentation' option is enabled, so the hot paths only pay a None check when it is off.
+
+At the end of a session a json summary is written next to the recording and, when the 'prometheus_textfile_dir'
+option is set, a Prometheus text file for the node exporter textfile collector.
+
+Author: Facundo Giacconi AKA "GiacconiDev"
+
+"""
+
+import bisect
+import json
+import os
+import threading
+import time
+
+import options
+import storage
+
+
+# ---------------------------- CONSTANTS ------------------------------- #
+
+# Upper bounds in seconds of the histogram buckets
+BUCKETS = (0.000001, 0.0000025, 0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+           0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+METRIC_PREFIX = "copython"
+
+# ---------------------------- FUNCTIONS ------------------------------- #
+
+class Histogram:
+    """Histogram
+
+    Histogram of durations with fixed buckets, plus their count, sum and max.
+    """
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+
+    def observe(self, value):
+        """Observe
+
+        Adds a duration to the histogram.
+
+        Args:
+            value (float): The duration in seconds.
+        """
+        self.buckets[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, fraction):
+        """Quantile
+
+        Estimates a quantile as the upper bound of the bucket it falls in.
+
+        Args:
+            fraction (float): The quantile, between 0 and 1.
+
+        Returns:
+            float: The estimated duration in seconds.
+        """
+        target = self.count * fraction
+        seen = 0
+        for index, bucket in enumerate(self.buckets):
+            seen += bucket
+            if seen >= target and bucket:
+                return BUCKETS[index] if index < len(BUCKETS) else self.max
+        return 0
+
+    def summary(self):
+        """Summary
+
+        Returns:
+            dict: count, mean, p50, p99 and max in seconds.
+        """
+        return {
+            'count': self.count,
+            'mean': self.sum / self.count if self.count else 0,
+            'p50': self.quantile(0.50),
+            'p99': self.quantile(0.99),
+            'max': self.max,
+        }
+
+
+class TrackedValue:
+    """Tracked Value
+
+    Keeps the last, max and mean of a sampled value.
+    """
+
+    def __init__(self):
+        self.last = 0
+        self.max = 0
+        self.sum = 0
+        self.count = 0
+
+    def track(self, value):
+        """Track
+
+        Adds a sample of the value.
+
+        Args:
+            value (float): The sample.
+        """
+        self.last = value
+        self.sum += value
+        self.count += 1
+        if value > self.max:
+            self.max = value
+
+    def summary(self):
+        """Summary
+
+        Returns:
+            dict: last, max and mean of the samples.
+        """
+        return {'last': self.last, 'max': self.max, 'mean': self.sum / self.count if self.count else 0}
+
+
+class SessionMetrics:
+    """Session Metrics
+
+    Metrics of one recording or replay session. Observations may come from several threads.
+
+    Args:
+        kind (str): 'record' or 'replay'.
+    """
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.started = time.perf_counter()
+        self.finished = None
+        self.histograms = {}
+        self.counts = {}
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def observe(self, metric, action, seconds):
+        """Observe
+
+        Adds a duration to the histogram of a metric and action.
+
+        Args:
+            metric (str): The metric name, e.g. 'callback' or 'injection'.
+            action (str): The event action.
+            seconds (float): The duration.
+        """
+        with self.lock:
+            histogram = self.histograms.get((metric, action))
+            if histogram is None:
+                histogram = self.histograms[(metric, action)] = Histogram()
+            histogram.observe(seconds)
+
+    def count(self, action):
+        """Count
+
+        Counts an event.
+
+        Args:
+            action (str): The event action.
+        """
+        with self.lock:
+            self.counts[action] = self.counts.get(action, 0) + 1
+
+    def track(self, name, value):
+        """Track
+
+        Adds a sample of a tracked value, e.g. the queue depth.
+
+        Args:
+            name (str): The value name.
+            value (float): The sample.
+        """
+        with self.lock:
+            tracked = self.values.get(name)
+            if tracked is None:
+                tracked = self.values[name] = TrackedValue()
+            tracked.track(value)
+
+    def finish(self):
+        """Finish
+
+        Marks the end of the session.
+        """
+        self.finished = time.perf_counter()
+
+    def summary(self):
+        """Summary
+
+        Returns:
+            dict: The session metrics.
+        """
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        with self.lock:
+            histograms = {}
+            for (metric, action), histogram in sorted(self.histograms.items()):
+                histograms.setdefault(metric, {})[action] = histogram.summary()
+            return {
+                'kind': self.kind,
+                'elapsed_s': elapsed,
+                'events': dict(self.counts),
+                'rates_per_s': {action: count / elapsed for action, count in self.counts.items()} if elapsed else {},
+                'timings_s': histograms,
+                'values': {name: tracked.summary() for name, tracked in self.values.items()},
+            }
+
+    def prometheus(self):
+        """Prometheus
+
+        Renders the session metrics in the Prometheus text exposition format.
+
+        Returns:
+            str: The metrics text.
+        """
+        prefix = f"{METRIC_PREFIX}_{self.kind}"
+        lines = []
+        with self.lock:
+            for metric in sorted({metric for metric, _ in self.histograms}):
+                lines.append(f"# TYPE {prefix}_{metric}_seconds histogram")
+                for (name, action), histogram in sorted(self.histograms.items()):
+                    if name != metric:
+                        continue
+                    cumulative = 0
+                    for bound, bucket in zip(BUCKETS + ("+Inf",), histogram.buckets):
+                        cumulative += bucket
+                        lines.append(f'{prefix}_{metric}_seconds_bucket{{action="{action}",le="{bound}"}} {cumulative}')
+                    lines.append(f'{prefix}_{metric}_seconds_sum{{action="{action}"}} {histogram.sum}')
+                    lines.append(f'{prefix}_{metric}_seconds_count{{action="{action}"}} {histogram.count}')
+            lines.append(f"# TYPE {prefix}_events_total counter")
+            for action, count in sorted(self.counts.items()):
+                lines.append(f'{prefix}_events_total{{action="{action}"}} {count}')
+            for name, tracked in sorted(self.values.items()):
+                lines.append(f"# TYPE {prefix}_{name} gauge")
+                lines.append(f"{prefix}_{name} {tracked.last}")
+                lines.append(f"{prefix}_{name}_max {tracked.max}")
+        lines.append(f"# TYPE {prefix}_last_session_timestamp_seconds gauge")
+        lines.append(f"{prefix}_last_session_timestamp_seconds {time.time()}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, recording_path):
+        """Write
+
+        Writes the json summary next to the recording and the Prometheus text file when configured.
+
+        Args:
+            recording_path (str): The path of the recording of the session.
+        """
+        if self.finished is None:
+            self.finish()
+        write_atomically(f"{recording_path}.{self.kind}{storage.STATS_EXTENSION}", json.dumps(self.summary(), indent=2))
+        textfile_dir = options.get_option("prometheus_textfile_dir")
+        if textfile_dir:
+            write_atomically(os.path.join(textfile_dir, f"{METRIC_PREFIX}_{self.kind}.prom"), self.prometheus())
+
+
+def write_atomically(path, content):
+    """Write Atomically
+
+    Writes a text file through a temporary file and a rename, so readers never see it half written.
+
+    Args:
+        path (str): The path of the file.
+        content (str): The text to write.
+    """
+    temp_path = f"{path}.{os.getpid()}{storage.TEMP_EXTENSION}"
+    with open(temp_path, 'w') as outfile:
+        outfile.write(content)
+    os.replace(temp_path, path)
+
+def new_session(kind):
+    """New Session
+
+    Creates the metrics of a session when instrumentation is enabled.
+
+    Args:
+        kind (str): 'record' or 'replay'.
+
+    Returns:
+        SessionMetrics: The session metrics, or None when instrumentation is disabled.
+    """
+    if options.get_option("instrumentation") != 1:
+        return None
+    return SessionMetrics(kind)
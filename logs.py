@@ -0,0 +1,109 @@
+"""Py Replay Logs
+
+This script configures the logging of the application. Records are put on a queue by the thread logging them and
+formatted and written by a background listener thread, so the listener and replay threads never block on log I/O.
+Per-event messages (moves, clicks, key presses...) go through log_event, which drops them cheaply when their level
+is disabled and lets at most one message of each kind through per 'event_log_interval' seconds.
+
+Author: Facundo Giacconi AKA "GiacconiDev"
+
+"""
+
+import atexit
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+
+import options
+
+
+# ---------------------------- CONSTANTS ------------------------------- #
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(threadName)s %(name)s: %(message)s"
+
+# Logger of the per-event messages, so they can be silenced or raised on their own
+event_logger = logging.getLogger("copython.events")
+
+log_listener = None
+
+# Time of the last message and messages suppressed since then, by kind of event
+event_log_state = {}
+event_log_lock = threading.Lock()
+
+# ---------------------------- FUNCTIONS ------------------------------- #
+
+def get_log_level():
+    """Get Log Level
+
+    Returns:
+        int: The level of the 'log_level' option, INFO when it is not a valid level name.
+    """
+    level = logging.getLevelName(str(options.get_option("log_level")).upper())
+    return level if isinstance(level, int) else logging.INFO
+
+def setup_logging(level=None):
+    """Setup Logging
+
+    Routes the root logger through a queue served by a background thread writing to stderr. Calling it again only
+    updates the level.
+
+    Args:
+        level (int): The log level, the 'log_level' option by default.
+    """
+    global log_listener
+
+    root = logging.getLogger()
+    root.setLevel(get_log_level() if level is None else level)
+    if log_listener is not None:
+        return
+
+    records = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(logging.handlers.QueueHandler(records))
+
+    log_listener = logging.handlers.QueueListener(records, stream_handler, respect_handler_level=True)
+    log_listener.start()
+    atexit.register(stop_logging)
+
+def stop_logging():
+    """Stop Logging
+
+    Writes the records still queued and stops the background thread.
+    """
+    global log_listener
+
+    if log_listener is not None:
+        log_listener.stop()
+        log_listener = None
+
+def log_event(kind, message, *args):
+    """Log Event
+
+    Logs a per-event message at DEBUG level, at most once per 'event_log_interval' seconds for each kind of event.
+    The message is only formatted when it is written, with the count of the messages of its kind suppressed since
+    the previous one.
+
+    Args:
+        kind (str): The kind of event, e.g. the action.
+        message (str): The message, with %-style placeholders.
+        *args: The values of the placeholders.
+    """
+    if not event_logger.isEnabledFor(logging.DEBUG):
+        return
+    interval = options.get_option("event_log_interval")
+    now = time.monotonic()
+    with event_log_lock:
+        last, suppressed = event_log_state.get(kind, (None, 0))
+        if last is not None and now - last < interval:
+            event_log_state[kind] = (last, suppressed + 1)
+            return
+        event_log_state[kind] = (now, 0)
+    if suppressed:
+        event_logger.debug(f"{message} (+%d suppressed)", *args, suppressed)
+    else:
+        event_logger.debug(message, *args)
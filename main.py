@@ -3,24 +3,31 @@
 This script provides a graphical user interface (GUI) for recording and replaying user actions 
 in a Python application. It allows users to record their actions, replay them, and manage the recorded files.
 
-The script utilizes Tkinter for the GUI, PIL for image handling, and other modules for various functionalities related by the mouse and keyboard control.
+The script utilizes Tkinter for the GUI, PIL to build the resized images cache (see icons.py), and other modules for various functionalities related by the mouse and keyboard control.
 
 Author: Facundo Giacconi AKA "GiacconiDev"
 
 """
 
 # Import necessary modules
+import time
+STARTUP_BEGIN = time.perf_counter()
+
 from tkinter import *
 import os
 from tkinter.messagebox import askyesno
 from tkinter.ttk import Combobox
-from PIL import ImageTk, Image
 import logging
 
+import catalog
+import icons
+import logs
 import options
+import playlist
+import storage
 from record import start_record_events_thread
 from replay import start_replay_events_thread
-from utils import GREEN, SCRIPT_DIR, RESOURCES_DIR, YELLOW
+from utils import GREEN, REPLAY_SPEEDS, SCRIPT_DIR, YELLOW
 
 # Initialize TK
 window = Tk()
@@ -29,36 +36,26 @@ window = Tk()
 if not os.path.exists(f"{SCRIPT_DIR}/data/"):
     os.makedirs(f"{SCRIPT_DIR}/data/")
 
-# Constants
-ARROW_IMG = Image.open(f"{RESOURCES_DIR}/img/arrow-one.png").resize((40,40), Image.LANCZOS)
-ARROW_TK = ImageTk.PhotoImage(ARROW_IMG)
-
-RECORD_IMG = Image.open(f"{RESOURCES_DIR}/img/record.png").resize((40,40), Image.LANCZOS)
-RECORD_TK = ImageTk.PhotoImage(RECORD_IMG)
-
-PLAY_IMG = Image.open(f"{RESOURCES_DIR}/img/play.png").resize((40,40), Image.LANCZOS)
-PLAY_TK = ImageTk.PhotoImage(PLAY_IMG)
-
-DELETE_IMG = Image.open(f"{RESOURCES_DIR}/img/delete.png").resize((40,40), Image.LANCZOS)
-DELETE_TK = ImageTk.PhotoImage(DELETE_IMG)
-
-GEAR_IMG = Image.open(f"{RESOURCES_DIR}/img/gear.png").resize((40,40), Image.LANCZOS)
-GEAR_TK = ImageTk.PhotoImage(GEAR_IMG)
-
-LOOP_ARROW_IMG = Image.open(f"{RESOURCES_DIR}/img/arrow-repeat.png").resize((40,40), Image.LANCZOS)
-LOOP_ARROW_TK = ImageTk.PhotoImage(LOOP_ARROW_IMG)
-
-ICON_IMG = Image.open(f"{RESOURCES_DIR}/img/snake.png")
-ICON_TK = ImageTk.PhotoImage(ICON_IMG)
+# Constants (pre-sized images, loaded without PIL)
+ARROW_TK = icons.load_icon("arrow-one", icons.ICON_SIZES["arrow-one"])
+RECORD_TK = icons.load_icon("record", icons.ICON_SIZES["record"])
+PLAY_TK = icons.load_icon("play", icons.ICON_SIZES["play"])
+DELETE_TK = icons.load_icon("delete", icons.ICON_SIZES["delete"])
+GEAR_TK = icons.load_icon("gear", icons.ICON_SIZES["gear"])
+LOOP_ARROW_TK = icons.load_icon("arrow-repeat", icons.ICON_SIZES["arrow-repeat"])
+ICON_TK = icons.load_icon("snake")
 
 reps = 0
 timer = None
 
-# Action Listener to Register Movements
-logging.basicConfig(level=logging.DEBUG)
+# Logs are written by a background thread, at the level of the 'log_level' option
+logs.setup_logging()
 
 looping_check = False
 
+# File names of the recordings by their name in the file selector
+recording_names = {}
+
 
 def open_options():
     """Open Options
@@ -73,20 +70,36 @@ def delete_current_file():
     Deletes the currently selected file from the data folder.
     """
     answer = askyesno(options.get_i18n_literal('delete'), options.get_i18n_literal('confirm'))
-    current_file = file_selector.get()
+    current_file = get_selected_file()
     if answer == True and current_file is not None and current_file != "":
-        os.remove(f"{SCRIPT_DIR}/data/{current_file}")
+        storage.remove_recording(f"{SCRIPT_DIR}/data/{current_file}")
         refresh_file_selector()
         logging.info(f"deleted file:{current_file}")
 
 def update_data_folder():
     """Update Data Folder
     
-    Updates the list of files in the data folder.
+    Updates the list of files in the data folder from the recordings catalog, without reading any recording,
+    followed by the playlists.
+    The catalog is refreshed in the background and the file selector refreshed again when it changes.
+    """
+    events_label = options.get_i18n_literal("events_label")
+    recording_names.clear()
+    for name, entry in catalog.cached_recordings(f"{SCRIPT_DIR}/data"):
+        recording_names[catalog.display_name(name, entry, events_label)] = name
+    for name in playlist.list_playlists(f"{SCRIPT_DIR}/data"):
+        recording_names[name] = name
+    logging.info(f"updating data folder elements, {len(recording_names)} recordings")
+    catalog.start_refresh_thread(f"{SCRIPT_DIR}/data", on_change=lambda: window.after(0, refresh_file_selector))
+    return list(recording_names)
+
+def get_selected_file():
+    """Get Selected File
+    
+    Returns the file name of the recording selected in the file selector.
     """
-    folder_files = os.listdir(f"{SCRIPT_DIR}/data")
-    logging.info(f"updating data folder elements to {folder_files}")
-    return folder_files
+    selected = file_selector.get()
+    return recording_names.get(selected, selected)
 
 
 def toggle_looping_mode():
@@ -107,6 +120,13 @@ def toggle_looping_mode():
     record_loop_btn.config(image=result)
             
             
+def get_replay_speed():
+    """Get Replay Speed
+    
+    Returns the speed factor selected in the speed selector.
+    """
+    return float(speed_selector.get().lstrip("x"))
+
 def refresh_file_selector():
     """Refresh File Selector
     
@@ -114,9 +134,12 @@ def refresh_file_selector():
     """
     global file_selector, delete_btn, play_btn, record_loop_btn
     
+    selected_file = get_selected_file()
     file_selector['values'] = update_data_folder()
     if len(file_selector['values']) > 0:
-        file_selector.current(0)
+        # keep the selected recording when it still exists
+        names = list(recording_names.values())
+        file_selector.current(names.index(selected_file) if selected_file in names else 0)
         delete_btn.config(state="active")
         play_btn.config(state="active")
         record_loop_btn.config(state="active")
@@ -141,19 +164,26 @@ if __name__ == "__main__":
     record_loop_btn = Button(image=ARROW_TK, bg=YELLOW, fg=GREEN, justify="center", command=toggle_looping_mode)
     record_loop_btn.grid(column=1, row=1)
 
+    # Replay speed factor
+    speed_selector = Combobox(state = 'readonly', values=REPLAY_SPEEDS, width=3)
+    speed_selector.grid(column=2, row=1)
+    speed_selector.current(0)
+
     # Generating Combobox with loaded files
     file_selector_var = StringVar()
-    file_selector = Combobox(state = 'readonly', textvariable=file_selector_var)
-    file_selector.grid(column=2, row=1, sticky="ew")
+    file_selector = Combobox(state = 'readonly', textvariable=file_selector_var, width=40)
+    file_selector.grid(column=3, row=1, sticky="ew")
 
-    play_btn = Button(image=PLAY_TK, command= lambda: start_replay_events_thread([play_btn, record_btn, record_loop_btn, delete_btn, options_btn], file_selector.get(), window, looping_check), justify="left")
-    play_btn.grid(column=3, row=1)
+    play_btn = Button(image=PLAY_TK, command= lambda: start_replay_events_thread([play_btn, record_btn, record_loop_btn, delete_btn, options_btn], get_selected_file(), window, looping_check, speed=get_replay_speed()), justify="left")
+    play_btn.grid(column=4, row=1)
 
     delete_btn = Button(image=DELETE_TK, command= delete_current_file, justify="center")
-    delete_btn.grid(column=4, row=1)
+    delete_btn.grid(column=5, row=1)
 
     options_btn = Button(image=GEAR_TK, command= open_options, justify="center")
-    options_btn.grid(column=5, row=1)
+    options_btn.grid(column=6, row=1)
 
     refresh_file_selector()
+    # time until the window is ready to handle events, to track startup regressions
+    window.after_idle(lambda: logging.info(f"startup took {(time.perf_counter() - STARTUP_BEGIN) * 1000:.1f} ms"))
     window.mainloop()
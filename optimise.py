@@ -0,0 +1,325 @@
+"""Py Replay Optimiser
+
+This script cleans the noise of raw recordings with a pipeline of passes, each one taking the events and returning
+the events to keep. Events dropped in the middle of a recording carry their duration to the next kept event, so the
+rest of the recording keeps its timing; only the trimmed idle time and the capped gaps shorten it.
+
+    idle_trim: drops the moves and the wait before the first key, click, scroll or checkpoint, but the move putting
+        the cursor in place, and the events after the last one
+    stop_key_scrub: drops the modifiers left pressed at the end to type the stop recording key, which itself is
+        never recorded
+    dead_moves: drops moves to the same position and the moves before a click other than the last one
+    bounces: drops repeated press and release pairs, releases of keys or buttons not pressed and repeated clicks
+    gap_cap: caps every wait to a maximum gap
+    simplify: simplifies the mouse paths (see simplify.py)
+
+More passes can be added with register_pass. Every pass reports the events and seconds it saved.
+
+Usage:
+    python optimise.py [recording ...]   (defaults to every recording in the data folder)
+
+Author: Facundo Giacconi AKA "GiacconiDev"
+
+"""
+
+import logging
+import os
+import sys
+
+import options
+import simplify
+import storage
+from utils import SCRIPT_DIR
+
+
+# ---------------------------- CONSTANTS ------------------------------- #
+
+# Passes by name, in the order they run when no passes are given
+PASSES = {}
+
+# Seconds within which a press and release pair repeating the previous one is a bounce
+BOUNCE_INTERVAL = 0.03
+
+# Modifier keys pressed to type the stop recording key
+MODIFIER_KEYS = ('shift', 'shift_r', 'ctrl', 'ctrl_r', 'alt', 'alt_r', 'alt_gr', 'cmd', 'cmd_r')
+
+MEANINGFUL_ACTIONS = ('pressed_key', 'released_key', 'pressed_mouse', 'released_mouse', 'scroll', 'checkpoint')
+
+# ---------------------------- FUNCTIONS ------------------------------- #
+
+def register_pass(name):
+    """Register Pass
+
+    Decorator adding a pass to the pipeline. A pass takes the events and the settings of the pipeline and returns
+    the events to keep.
+
+    Args:
+        name (str): The name of the pass.
+
+    Returns:
+        function: The decorator.
+    """
+    def decorator(function):
+        PASSES[name] = function
+        return function
+    return decorator
+
+def drop_events(events, dropped):
+    """Drop Events
+
+    Args:
+        events (list): The recorded events.
+        dropped (set): Indexes of the events to drop.
+
+    Returns:
+        list: The kept events, each one carrying the durations of the dropped events before it.
+    """
+    result = []
+    carried = 0
+    for position, event in enumerate(events):
+        if position in dropped:
+            carried += event['duration']
+            continue
+        if carried:
+            event = dict(event, duration=event['duration'] + carried)
+            carried = 0
+        result.append(event)
+    return result
+
+def input_identity(event):
+    """Input Identity
+
+    Args:
+        event (dict): A recorded key or mouse button event.
+
+    Returns:
+        tuple: What identifies its key or button.
+    """
+    if event['action'] in ('pressed_mouse', 'released_mouse'):
+        return ('button', event['button'])
+    return ('vk', event['vk']) if 'vk' in event else ('key', event['key'])
+
+@register_pass("idle_trim")
+def idle_trim(events, settings):
+    """Idle Trim
+
+    Drops the moves before the first key, click, scroll or checkpoint but the last one, which puts the cursor where
+    the replay starts, and the wait before that event. Drops the events after the last key, click, scroll or
+    checkpoint.
+    """
+    meaningful = [position for position, event in enumerate(events) if event['action'] in MEANINGFUL_ACTIONS]
+    if not meaningful:
+        return [dict(event, duration=0) if position == 0 else event for position, event in enumerate(events)]
+    first, last = meaningful[0], meaningful[-1]
+    start = max(first - 1, 0)
+    return [dict(event, duration=0) for event in events[start:first + 1]] + events[first + 1:last + 1]
+
+@register_pass("stop_key_scrub")
+def stop_key_scrub(events, settings):
+    """Stop Key Scrub
+
+    Drops the presses of modifiers never released at the end of the recording, left by typing the stop recording
+    key: the recorder stops on the key itself, so neither its press nor its release are recorded.
+    """
+    dropped = set()
+    released = set()
+    for position in range(len(events) - 1, -1, -1):
+        event = events[position]
+        if event['action'] == 'released_key':
+            released.add(input_identity(event))
+        elif event['action'] == 'pressed_key' and event.get('key') in MODIFIER_KEYS and input_identity(event) not in released:
+            dropped.add(position)
+        elif event['action'] != 'moved':
+            break
+    return drop_events(events, dropped)
+
+@register_pass("dead_moves")
+def dead_moves(events, settings):
+    """Dead Moves
+
+    Drops the moves to the position the cursor already is at, and the moves of a run ending in a click other than
+    its last one, which puts the cursor where the click happens. Moves while a button is held are drags and are kept.
+    """
+    dropped = set()
+    position_now = None
+    run = []
+    buttons_held = 0
+    for position, event in enumerate(events):
+        action = event['action']
+        if action == 'moved':
+            if (event['x'], event['y']) == position_now:
+                dropped.add(position)
+                continue
+            position_now = (event['x'], event['y'])
+            if buttons_held == 0:
+                run.append(position)
+            continue
+        if action == 'pressed_mouse' and buttons_held == 0:
+            dropped.update(run[:-1])
+        if action == 'pressed_mouse':
+            buttons_held += 1
+        elif action == 'released_mouse':
+            buttons_held = max(buttons_held - 1, 0)
+        if 'x' in event:
+            position_now = (event['x'], event['y'])
+        run = []
+    return drop_events(events, dropped)
+
+def find_release(events, position, identity, interval):
+    """Find Release
+
+    Args:
+        events (list): The recorded events.
+        position (int): Index of a press event.
+        identity (tuple): The key or button of the press.
+        interval (float): Most seconds between the press and its release.
+
+    Returns:
+        int: Index of the release of the press within the interval, or None.
+    """
+    waited = 0
+    for later in range(position + 1, len(events)):
+        waited += events[later]['duration']
+        if waited > interval:
+            return None
+        if events[later]['action'].startswith('released') and input_identity(events[later]) == identity:
+            return later
+    return None
+
+@register_pass("bounces")
+def bounces(events, settings):
+    """Bounces
+
+    Drops the press and release pairs repeating the previous pair of the same key or button within the bounce
+    interval, the releases of keys or buttons not pressed and the presses of mouse buttons already pressed.
+    """
+    interval = settings.get('bounce_interval', BOUNCE_INTERVAL)
+    dropped = set()
+    held = set()
+    last_release = {}
+    elapsed = 0
+    for position, event in enumerate(events):
+        elapsed += event['duration']
+        action = event['action']
+        if action not in ('pressed_key', 'released_key', 'pressed_mouse', 'released_mouse'):
+            continue
+        identity = input_identity(event)
+        if action.startswith('pressed'):
+            if identity in held and action == 'pressed_mouse':
+                dropped.add(position)
+                continue
+            if identity in last_release and elapsed - last_release[identity] <= interval:
+                release = find_release(events, position, identity, interval)
+                if release is not None:
+                    dropped.update((position, release))
+                    continue
+            held.add(identity)
+        elif position not in dropped:
+            if identity not in held:
+                dropped.add(position)
+                continue
+            held.discard(identity)
+            last_release[identity] = elapsed
+    return drop_events(events, dropped)
+
+@register_pass("gap_cap")
+def gap_cap(events, settings):
+    """Gap Cap
+
+    Caps every wait to the max_gap setting, when it is set.
+    """
+    max_gap = settings.get('max_gap')
+    if not max_gap:
+        return events
+    return [dict(event, duration=max_gap) if event['duration'] > max_gap else event for event in events]
+
+@register_pass("simplify")
+def simplify_pass(events, settings):
+    """Simplify
+
+    Simplifies the mouse paths of the recording.
+    """
+    return simplify.simplify_moves(events)
+
+def default_settings():
+    """Default Settings
+
+    Returns:
+        dict: The pipeline settings from the options: the gap cap.
+    """
+    return {'max_gap': options.get_option("optimise_max_gap") or None}
+
+def parse_passes(text):
+    """Parse Passes
+
+    Args:
+        text (str): Comma separated pass names.
+
+    Returns:
+        list: The pass names.
+
+    Raises:
+        ValueError: When a pass is unknown.
+    """
+    names = [name.strip() for name in text.split(",") if name.strip()]
+    unknown = [name for name in names if name not in PASSES]
+    if unknown:
+        raise ValueError(f"unknown optimisation passes: {', '.join(unknown)}, expected some of {', '.join(PASSES)}")
+    return names
+
+def optimise_events(events, passes=None, settings=None):
+    """Optimise Events
+
+    Runs the passes of the pipeline over recorded events.
+
+    Args:
+        events (list): The recorded events.
+        passes (list): Names of the passes to run in order, all but simplify by default.
+        settings (dict): Settings of the passes, from the options by default.
+
+    Returns:
+        tuple: The optimised events and the report of every pass: its name and the events and seconds it saved.
+    """
+    passes = passes if passes is not None else [name for name in PASSES if name != "simplify"]
+    settings = settings if settings is not None else default_settings()
+    reports = []
+    for name in passes:
+        before_count, before_seconds = len(events), sum(event['duration'] for event in events)
+        events = PASSES[name](events, settings)
+        reports.append({
+            'pass': name,
+            'events_saved': before_count - len(events),
+            # rounded to the microsecond, the durations carried by dropped events only move float noise
+            'seconds_saved': round(before_seconds - sum(event['duration'] for event in events), 6),
+        })
+    return events, reports
+
+def optimise_file(path, passes=None, settings=None, output=None):
+    """Optimise File
+
+    Optimises a recording file, through a temporary file and a rename.
+
+    Args:
+        path (str): The path of the recording.
+        passes (list): Names of the passes to run in order, all but simplify by default.
+        settings (dict): Settings of the passes, from the options by default.
+        output (str): The path of the optimised recording, the same file by default.
+
+    Returns:
+        dict: The events before and after the optimisation and the report of every pass.
+    """
+    events = storage.load_events(path)
+    optimised, reports = optimise_events(events, passes, settings)
+    storage.save_events_atomically(output or path, optimised)
+    report = {'events_before': len(events), 'events_after': len(optimised), 'passes': reports}
+    logging.info(f"optimised {path}: {report}")
+    return report
+
+
+if __name__ == "__main__":
+    files = sys.argv[1:] or [os.path.join(f"{SCRIPT_DIR}/data", name) for name in storage.list_recordings(f"{SCRIPT_DIR}/data")]
+    for file in files:
+        report = optimise_file(file)
+        print(f"{file}: {report['events_before']} -> {report['events_after']} events")
+        for pass_report in report['passes']:
+            print(f"    {pass_report['pass']}: {pass_report['events_saved']} events, {pass_report['seconds_saved']:.3f} seconds saved")
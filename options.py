@@ -9,13 +9,10 @@ Author: Facundo Giacconi AKA "GiacconiDev"
 
 import json
 import threading
-from tkinter import *
-from tkinter import END, ttk
-import tkinter
-from pynput import keyboard
-from PIL import ImageTk, Image
 
-from utils import FONT_NAME, RESOURCES_DIR, YELLOW, languages, i18n, SCRIPT_DIR
+# tkinter and pynput are imported by the functions using them, so the command line entry point
+# can read the options without loading any GUI library
+from utils import FONT_NAME, YELLOW, languages, i18n, SCRIPT_DIR
 
 # Default options configuration
 default_options_config = {
@@ -24,10 +21,32 @@ default_options_config = {
     "minimize_when_record": 0,
     "stop_recording_key": "º",
     "stop_playing_key": "º",
+    "pause_playing_key": "ª",
+    "step_playing_key": "¡",
+    "checkpoint_key": "",
+    "checkpoint_size": 64,
+    "checkpoint_timeout": 30,
+    "optimise_passes": "",
+    "optimise_max_gap": 0,
+    "simplify_moves": 0,
+    "move_min_interval": 0.05,
+    "move_min_distance": 2,
+    "move_angle_threshold": 30,
+    "replay_max_gap": 0,
+    "replay_idle_threshold": 0,
+    "replay_frame_rate": 0,
+    "compression": "",
+    "instrumentation": 0,
+    "prometheus_textfile_dir": "",
+    "log_level": "INFO",
+    "event_log_interval": 1.0,
 }
 
 options_config = {}
 
+# Codecs new recordings can be compressed with, the empty one saves them uncompressed
+COMPRESSION_CODECS = ["", "zlib", "lzma"]
+
 # Attempt to read options from config file, otherwise set defaults
 try:
     readfile = open(f"{SCRIPT_DIR}/config.json", 'r')
@@ -37,6 +56,19 @@ except:
         json.dump(default_options_config, readfile)
     options_config = default_options_config
     
+def get_option(name):
+    """Get Option
+    
+    Retrieves an option, falling back to its default value for config files saved by older versions.
+
+    Args:
+        name (str): The option name.
+
+    Returns:
+        The option value.
+    """
+    return options_config.get(name, default_options_config.get(name))
+
 def get_i18n_literal(literal):
     """Get Internationalization Literal
     
@@ -65,18 +97,40 @@ def on_press_change_key(key, entry):
     Returns:
         bool: False to stop the listener.
     """
+    import tkinter
+    
     val = ""
     try:
         val = key.char
     except AttributeError:
         val = str(key).split(".")[-1]
     entry.config(state="normal")
-    entry.delete(0,END)
+    entry.delete(0,tkinter.END)
     entry.insert(0,val)
     entry.config(state="readonly")
     
     return False
 
+def parse_number_option(name, value):
+    """Parse Number Option
+    
+    Parses the value of a numeric option typed by the user, keeping the current value when it is not a valid number.
+
+    Args:
+        name (str): The option name.
+        value (str): The typed value.
+
+    Returns:
+        float: The option value.
+    """
+    try:
+        number = float(value)
+        if number >= 0:
+            return number
+    except ValueError:
+        pass
+    return get_option(name)
+
 def update_entry_value(entry, value):
     """Update Entry Value
     
@@ -86,8 +140,10 @@ def update_entry_value(entry, value):
         entry (tkinter.Entry): The entry field to update.
         value (str): The new value for the entry field.
     """
+    import tkinter
+    
     entry.config(state="normal")
-    entry.delete(0,END)
+    entry.delete(0,tkinter.END)
     entry.insert(0,value)
     entry.config(state="readonly")
 
@@ -100,17 +156,21 @@ def change_key(entry, root):
         entry (tkinter.Entry): The entry field to update with the new key.
         root (tkinter.Tk): The root Tkinter window.
     """
-    tk_key_assignation = Toplevel(root)
+    import tkinter
+    
+    tk_key_assignation = tkinter.Toplevel(root)
     tk_key_assignation.title("")
     tk_key_assignation.config(padx=100, pady=50, bg=YELLOW)
     
-    label = Label(tk_key_assignation, text=get_i18n_literal(literal="key_assignation_label"))
+    label = tkinter.Label(tk_key_assignation, text=get_i18n_literal(literal="key_assignation_label"))
     label.grid(row=0, column=1, padx=10, pady=10)
     
     tk_key_assignation.grab_set()
     
     # Change key thread
     def change_key_thread(entry):
+        from pynput import keyboard
+        
         keyboard_listener = keyboard.Listener(on_press=lambda event: on_press_change_key(event, entry))
         keyboard_listener.start()
         keyboard_listener.join()
@@ -119,7 +179,7 @@ def change_key(entry, root):
     thread = threading.Thread(target=lambda: change_key_thread(entry))
     thread.start()
     
-def save_options(options_window, lang, minimize_record, minimize_play, record_key, play_key):
+def save_options(options_window, lang, minimize_record, minimize_play, record_key, play_key, flags, settings):
     """Save Options
     
     Saves the configured options to a JSON file.
@@ -131,18 +191,29 @@ def save_options(options_window, lang, minimize_record, minimize_play, record_ke
         minimize_play (tkinter.IntVar): The minimize play checkbox variable.
         record_key (str): The stop recording key.
         play_key (str): The stop playing key.
+        flags (dict): The checkbox variables of the other on/off options, by option name.
+        settings (dict): The typed or selected values of the other options, by option name. The values of
+            numeric options are parsed, keeping the current value when they are not valid numbers.
     """
     global options_config
     
     with open(f"{SCRIPT_DIR}/config.json", 'w+') as outfile:
         try:
-            new_options_config = {
+            # options without a field in this window are kept as they are
+            new_options_config = dict(options_config)
+            new_options_config.update({
                 "language": lang,
                 "minimize_when_record": minimize_record.get(),
                 "minimize_when_play": minimize_play.get(),
                 "stop_recording_key": record_key,
                 "stop_playing_key": play_key,
-                }
+                })
+            for name, flag in flags.items():
+                new_options_config[name] = flag.get()
+            for name, value in settings.items():
+                if isinstance(default_options_config[name], (int, float)):
+                    value = parse_number_option(name, value)
+                new_options_config[name] = value
             json.dump(new_options_config, outfile)
             options_config = new_options_config
             options_window.destroy()
@@ -157,14 +228,19 @@ def open_options(root):
     Args:
         root (tkinter.Tk): The root Tkinter window.
     """
+    import tkinter
+    from tkinter import ttk
+    
+    import icons
+    
     # Create a new window for the options menu
-    options_window = Toplevel(root)
+    options_window = tkinter.Toplevel(root)
     options_window.resizable(False, False)
     options_window.title(get_i18n_literal(literal="options"))
     options_window.config(padx=10, pady=5, bg=YELLOW)
 
     # Combobox language select
-    combo_label = Label(options_window, text=get_i18n_literal(literal="lang_label"))
+    combo_label = tkinter.Label(options_window, text=get_i18n_literal(literal="lang_label"))
     combo_label.grid(row=1, column=0, padx=10, pady=5)
     
     combo_lang = ttk.Combobox(options_window, values=languages['names'])
@@ -172,7 +248,7 @@ def open_options(root):
     combo_lang.current(options_config["language"])
     
     # Minimize on play event checkbox
-    minimize_when_play_label = Label(options_window, text=get_i18n_literal(literal="minimize_when_play_label"))
+    minimize_when_play_label = tkinter.Label(options_window, text=get_i18n_literal(literal="minimize_when_play_label"))
     minimize_when_play_label.grid(row=3, column=0, padx=10, pady=5)
     
     minimize_p_flag = tkinter.IntVar()
@@ -183,7 +259,7 @@ def open_options(root):
     
     # Minimize on record event checkbox
     
-    minimize_when_record_label = Label(options_window, text=get_i18n_literal(literal="minimize_when_record_label"))
+    minimize_when_record_label = tkinter.Label(options_window, text=get_i18n_literal(literal="minimize_when_record_label"))
     minimize_when_record_label.grid(row=4, column=0, padx=10, pady=5)
     
     minimize_r_flag = tkinter.IntVar()
@@ -193,10 +269,10 @@ def open_options(root):
     minimize_r_flag.set(options_config['minimize_when_record'])
     
     # Stop record key assignation
-    minimize_when_record_label = Label(options_window, text=get_i18n_literal(literal="stop_recording_key_label"))
+    minimize_when_record_label = tkinter.Label(options_window, text=get_i18n_literal(literal="stop_recording_key_label"))
     minimize_when_record_label.grid(row=5, column=0, padx=10, pady=5)
     
-    stop_record_key = Entry(options_window, state="readonly", width=5, font=(FONT_NAME, 15, 'normal'),  justify="center")
+    stop_record_key = tkinter.Entry(options_window, state="readonly", width=5, font=(FONT_NAME, 15, 'normal'),  justify="center")
     stop_record_key.bind("<1>", lambda event: change_key(stop_record_key, options_window))
     stop_record_key.grid(row=5, column=2, padx=10, pady=5)
     # Update value of entry
@@ -204,21 +280,103 @@ def open_options(root):
     
     # Stop play key assignation
     
-    minimize_when_play_label = Label(options_window, text=get_i18n_literal(literal="stop_playing_key_label"))
+    minimize_when_play_label = tkinter.Label(options_window, text=get_i18n_literal(literal="stop_playing_key_label"))
     minimize_when_play_label.grid(row=6, column=0, padx=10, pady=5)
     
-    stop_play_key = Entry(options_window, state="readonly", width=5, font=(FONT_NAME, 15, 'normal'),  justify="center")
+    stop_play_key = tkinter.Entry(options_window, state="readonly", width=5, font=(FONT_NAME, 15, 'normal'),  justify="center")
     stop_play_key.bind("<1>", lambda event: change_key(stop_play_key, options_window))
     stop_play_key.grid(row=6, column=2, padx=10, pady=5)
     # Update value of entry
     update_entry_value(stop_play_key, options_config['stop_playing_key'])
     
-    SAVE_IMG = Image.open(f"{RESOURCES_DIR}/img/disk.png").resize((50,50), Image.LANCZOS)
-    SAVE_TK = ImageTk.PhotoImage(SAVE_IMG)
+    # Simplify moves after recording checkbox
+    simplify_moves_label = tkinter.Label(options_window, text=get_i18n_literal(literal="simplify_moves_label"))
+    simplify_moves_label.grid(row=7, column=0, padx=10, pady=5)
+    
+    simplify_moves_flag = tkinter.IntVar()
+    simplify_moves = ttk.Checkbutton(options_window, variable=simplify_moves_flag)
+    simplify_moves.grid(row=7, column=2, padx=10, pady=5)
+    # updating value from config
+    simplify_moves_flag.set(get_option('simplify_moves'))
+    
+    # Mouse move sampling and replay timing entries
+    move_sampling_entries = {}
+    for row, name in enumerate(["move_min_interval", "move_min_distance", "move_angle_threshold", "replay_max_gap", "replay_idle_threshold", "replay_frame_rate"], start=8):
+        move_sampling_label = tkinter.Label(options_window, text=get_i18n_literal(literal=f"{name}_label"))
+        move_sampling_label.grid(row=row, column=0, padx=10, pady=5)
+        
+        move_sampling_entry = tkinter.Entry(options_window, width=5, font=(FONT_NAME, 15, 'normal'),  justify="center")
+        move_sampling_entry.grid(row=row, column=2, padx=10, pady=5)
+        move_sampling_entry.insert(0, get_option(name))
+        move_sampling_entries[name] = move_sampling_entry
+    
+    # Session stats checkbox
+    instrumentation_label = tkinter.Label(options_window, text=get_i18n_literal(literal="instrumentation_label"))
+    instrumentation_label.grid(row=14, column=0, padx=10, pady=5)
+    
+    instrumentation_flag = tkinter.IntVar()
+    instrumentation = ttk.Checkbutton(options_window, variable=instrumentation_flag)
+    instrumentation.grid(row=14, column=2, padx=10, pady=5)
+    # updating value from config
+    instrumentation_flag.set(get_option('instrumentation'))
+    
+    # Compression of new recordings
+    compression_label = tkinter.Label(options_window, text=get_i18n_literal(literal="compression_label"))
+    compression_label.grid(row=15, column=0, padx=10, pady=5)
+    
+    combo_compression = ttk.Combobox(options_window, state='readonly', values=COMPRESSION_CODECS)
+    combo_compression.grid(row=15, column=2, padx=10, pady=5)
+    combo_compression.current(COMPRESSION_CODECS.index(get_option('compression')) if get_option('compression') in COMPRESSION_CODECS else 0)
+    
+    # Pause, step and checkpoint keys assignation
+    replay_control_keys = {}
+    for row, name in enumerate(["pause_playing_key", "step_playing_key", "checkpoint_key"], start=16):
+        replay_control_label = tkinter.Label(options_window, text=get_i18n_literal(literal=f"{name}_label"))
+        replay_control_label.grid(row=row, column=0, padx=10, pady=5)
+        
+        replay_control_key = tkinter.Entry(options_window, state="readonly", width=5, font=(FONT_NAME, 15, 'normal'),  justify="center")
+        replay_control_key.bind("<1>", lambda event, entry=replay_control_key: change_key(entry, options_window))
+        replay_control_key.grid(row=row, column=2, padx=10, pady=5)
+        update_entry_value(replay_control_key, get_option(name))
+        replay_control_keys[name] = replay_control_key
+    
+    # Checkpoints size and timeout entries
+    checkpoint_entries = {}
+    for row, name in enumerate(["checkpoint_size", "checkpoint_timeout"], start=19):
+        checkpoint_label = tkinter.Label(options_window, text=get_i18n_literal(literal=f"{name}_label"))
+        checkpoint_label.grid(row=row, column=0, padx=10, pady=5)
+        
+        checkpoint_entry = tkinter.Entry(options_window, width=5, font=(FONT_NAME, 15, 'normal'),  justify="center")
+        checkpoint_entry.grid(row=row, column=2, padx=10, pady=5)
+        checkpoint_entry.insert(0, get_option(name))
+        checkpoint_entries[name] = checkpoint_entry
+    
+    # Optimisation passes run after recording, comma separated, and their gap cap
+    optimise_entries = {}
+    optimise_passes_label = tkinter.Label(options_window, text=get_i18n_literal(literal="optimise_passes_label"))
+    optimise_passes_label.grid(row=21, column=0, padx=10, pady=5)
+    
+    optimise_passes = tkinter.Entry(options_window, width=30)
+    optimise_passes.grid(row=21, column=2, padx=10, pady=5)
+    optimise_passes.insert(0, get_option("optimise_passes"))
+    optimise_entries["optimise_passes"] = optimise_passes
+    
+    optimise_max_gap_label = tkinter.Label(options_window, text=get_i18n_literal(literal="optimise_max_gap_label"))
+    optimise_max_gap_label.grid(row=22, column=0, padx=10, pady=5)
+    
+    optimise_max_gap = tkinter.Entry(options_window, width=5, font=(FONT_NAME, 15, 'normal'),  justify="center")
+    optimise_max_gap.grid(row=22, column=2, padx=10, pady=5)
+    optimise_max_gap.insert(0, get_option("optimise_max_gap"))
+    optimise_entries["optimise_max_gap"] = optimise_max_gap
+    
+    flags = {"simplify_moves": simplify_moves_flag, "instrumentation": instrumentation_flag}
+    settings_entries = {"compression": combo_compression, **replay_control_keys, **move_sampling_entries, **checkpoint_entries, **optimise_entries}
+    
+    SAVE_TK = icons.load_icon("disk", icons.ICON_SIZES["disk"])
     
-    apply_btn = Button(options_window, image=SAVE_TK, command=lambda: save_options(options_window, combo_lang.current(), minimize_r_flag, minimize_p_flag, stop_record_key.get(), stop_play_key.get()))
+    apply_btn = tkinter.Button(options_window, image=SAVE_TK, command=lambda: save_options(options_window, combo_lang.current(), minimize_r_flag, minimize_p_flag, stop_record_key.get(), stop_play_key.get(), flags, {name: entry.get() for name, entry in settings_entries.items()}))
     apply_btn.image = SAVE_TK  # This line is crucial to prevent garbage collection
-    apply_btn.grid(row=7, column=1)
+    apply_btn.grid(row=23, column=1)
 
     # Make the options menu modal
     options_window.grab_set()
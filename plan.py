@@ -0,0 +1,362 @@
+"""Py Replay Plan
+
+This script compiles recordings into replay plans: flat lists of operations with the controller method to call,
+its already resolved arguments (Key, KeyCode, Button...) and the deadline of the operation from the start of the
+replay. Compiled plans are kept in a small LRU cache keyed by the path, modification time and size of the recording,
+so loops and repeated plays skip parsing entirely. The cache of the module is shared by the replays of the GUI, the
+command line and the daemon; embedders can give their replays a cache of their own.
+
+Author: Facundo Giacconi AKA "GiacconiDev"
+
+"""
+
+from collections import OrderedDict, namedtuple
+from functools import partial
+import os
+import threading
+
+import index
+import screen
+import storage
+
+
+# ---------------------------- CONSTANTS ------------------------------- #
+
+PLAN_CACHE_SIZE = 8
+# Plans with more operations are streamed on every pass instead of being cached, to bound memory
+PLAN_CACHE_MAX_OPERATIONS = 500_000
+
+# Moves closer than this to the position of the last meaningful event do not end an idle span
+IDLE_MOVE_TOLERANCE_PX = 5
+
+# Replay timing: global speed factor, cap in seconds of any single gap, length in seconds idle spans are collapsed to
+# and rate in Hz mouse moves are coalesced at
+ReplayTiming = namedtuple('ReplayTiming', ['speed', 'max_gap', 'idle_threshold', 'frame_rate'], defaults=[1.0, None, None, None])
+
+# ---------------------------- FUNCTIONS ------------------------------- #
+
+class PlanCache:
+    """Plan Cache
+
+    LRU cache of compiled replay plans, safe to share between threads.
+
+    Args:
+        size (int): Number of plans kept.
+    """
+
+    def __init__(self, size=PLAN_CACHE_SIZE):
+        self.size = size
+        self.plans = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.plans)
+
+    def get(self, cache_key, keyboard, mouse):
+        """Get
+
+        Args:
+            cache_key (tuple): The cache key of the plan.
+            keyboard: The keyboard controller the plan must be bound to.
+            mouse: The mouse controller the plan must be bound to.
+
+        Returns:
+            list: The cached operations, None when the plan is not cached for these controllers.
+        """
+        with self.lock:
+            cached = self.plans.get(cache_key)
+            if cached is None or cached[0] is not keyboard or cached[1] is not mouse:
+                return None
+            self.plans.move_to_end(cache_key)
+            return cached[2]
+
+    def put(self, cache_key, keyboard, mouse, compiled):
+        """Put
+
+        Caches a compiled plan, dropping the least recently used ones beyond the size of the cache.
+
+        Args:
+            cache_key (tuple): The cache key of the plan.
+            keyboard: The keyboard controller the plan is bound to.
+            mouse: The mouse controller the plan is bound to.
+            compiled (list): The operations of the plan.
+        """
+        with self.lock:
+            self.plans[cache_key] = (keyboard, mouse, compiled)
+            self.plans.move_to_end(cache_key)
+            while len(self.plans) > self.size:
+                self.plans.popitem(last=False)
+
+    def clear(self):
+        """Clear
+
+        Drops every cached plan.
+        """
+        with self.lock:
+            self.plans.clear()
+
+
+# Plans cached for the replays of the GUI, the command line and the daemon
+plan_cache = PlanCache()
+
+def resolve_key(json_line, Key, KeyCode):
+    """Resolve Key
+
+    Resolves the key of a recorded key event into the value expected by the keyboard controller.
+
+    Args:
+        json_line (dict): The recorded key event.
+        Key: The keyboard key from pynput.
+        KeyCode: The keyboard key code from pynput.
+
+    Returns:
+        The Key, KeyCode or character to press or release.
+    """
+    if "key" in json_line and hasattr(Key, json_line['key']):
+        return Key[json_line['key']]
+    elif "vk" in json_line:
+        return KeyCode.from_vk(json_line['vk'])
+    return json_line['key']
+
+def compile_event(json_line, keyboard, mouse, Key, KeyCode, Button):
+    """Compile Event
+
+    Compiles a recorded event into the controller call that replays it.
+
+    Args:
+        json_line (dict): The recorded event.
+        keyboard: The keyboard controller.
+        mouse: The mouse controller.
+        Key: The keyboard key from pynput.
+        KeyCode: The keyboard key code from pynput.
+        Button: The mouse button from pynput.
+
+    Returns:
+        tuple: The function to call and its arguments, or None for unknown actions.
+    """
+    action = json_line['action']
+    if action == 'pressed_key':
+        return keyboard.press, (resolve_key(json_line, Key, KeyCode),)
+    elif action == 'released_key':
+        return keyboard.release, (resolve_key(json_line, Key, KeyCode),)
+    elif action == 'moved':
+        return partial(setattr, mouse, 'position'), ((json_line['x'], json_line['y']),)
+    elif action == 'pressed_mouse':
+        return mouse.press, (Button[json_line['button']],)
+    elif action == 'released_mouse':
+        return mouse.release, (Button[json_line['button']],)
+    elif action == 'scroll':
+        return mouse.scroll, (json_line.get('horizontal_direction', 0), json_line.get('vertical_direction', 0))
+    elif action == 'checkpoint':
+        return screen.wait_for_checkpoint, (json_line,)
+    return None
+
+def collapse_idle(events, idle_threshold):
+    """Collapse Idle
+
+    Shortens the idle spans of a recording to a maximum length. An idle span goes from a meaningful event to the next
+    one, where meaningful events are key, click and scroll events and moves that take the cursor away from the position
+    of the previous meaningful event. Durations inside a longer span are scaled down proportionally. Only the events
+    of the current span are held back, so recordings are collapsed as they are read.
+
+    Args:
+        events (iterable): The recorded events.
+        idle_threshold (float): Maximum seconds of an idle span.
+
+    Yields:
+        dict: The events with their durations shortened.
+    """
+    span = []
+    span_duration = 0
+    anchor = None
+
+    def shorten():
+        ratio = idle_threshold / span_duration if span_duration > idle_threshold else 1
+        for json_line in span:
+            yield dict(json_line, duration=json_line['duration'] * ratio) if ratio != 1 else json_line
+
+    for position, json_line in enumerate(events):
+        if position == 0:
+            # the wait before the first event starts no span
+            yield json_line
+        else:
+            span.append(json_line)
+            span_duration += json_line['duration']
+        if json_line['action'] == 'moved' and anchor is not None and \
+                abs(json_line['x'] - anchor[0]) + abs(json_line['y'] - anchor[1]) < IDLE_MOVE_TOLERANCE_PX:
+            continue
+        yield from shorten()
+        span, span_duration = [], 0
+        if 'x' in json_line:
+            anchor = (json_line['x'], json_line['y'])
+    yield from shorten()
+
+def retime_events(events, timing):
+    """Retime Events
+
+    Applies a replay timing to recorded events: idle spans are collapsed first, then every gap is capped and finally
+    all the durations are divided by the speed factor. The frame rate applies to the compiled plan (see coalesce_moves).
+
+    Args:
+        events (iterable): The recorded events.
+        timing (ReplayTiming): The replay timing.
+
+    Returns:
+        iterable: The events with their new durations.
+    """
+    if timing is None or timing._replace(frame_rate=None) == ReplayTiming():
+        return events
+    if timing.idle_threshold:
+        events = collapse_idle(events, timing.idle_threshold)
+    max_gap = timing.max_gap or float('inf')
+    return (dict(json_line, duration=min(json_line['duration'], max_gap) / timing.speed) for json_line in events)
+
+def iter_operations(events, keyboard, mouse, Key, KeyCode, Button):
+    """Iterate Operations
+
+    Compiles recorded events into replay operations one by one.
+
+    Args:
+        events (iterable): The recorded events.
+        keyboard: The keyboard controller.
+        mouse: The mouse controller.
+        Key: The keyboard key from pynput.
+        KeyCode: The keyboard key code from pynput.
+        Button: The mouse button from pynput.
+
+    Yields:
+        tuple: (deadline, function, args, action) operations, deadlines in seconds from the start of the replay.
+    """
+    deadline = 0
+    for json_line in events:
+        deadline += json_line['duration']
+        compiled = compile_event(json_line, keyboard, mouse, Key, KeyCode, Button)
+        if compiled is not None:
+            yield deadline, compiled[0], compiled[1], json_line['action']
+
+def coalesce_moves(operations, frame_rate):
+    """Coalesce Moves
+
+    Groups the consecutive mouse moves of a plan into frames of 1 / frame_rate seconds and keeps only the last move
+    of every frame, at its own deadline. Any other operation ends the current frame first, so moves are never
+    reordered across clicks, keys or scrolls.
+
+    Args:
+        operations (iterable): (deadline, function, args, action) operations.
+        frame_rate (float): Frames per second.
+
+    Yields:
+        tuple: The operations with the moves coalesced.
+    """
+    frame_length = 1 / frame_rate
+    pending = None
+    frame_end = None
+    for operation in operations:
+        if operation[3] != 'moved':
+            if pending is not None:
+                yield pending
+                pending = None
+            yield operation
+            continue
+        if pending is not None and operation[0] >= frame_end:
+            yield pending
+            pending = None
+        if pending is None:
+            frame_end = operation[0] + frame_length
+        pending = operation
+    if pending is not None:
+        yield pending
+
+def compile_events(events, keyboard, mouse, Key, KeyCode, Button):
+    """Compile Events
+
+    Compiles recorded events into a replay plan.
+
+    Args:
+        events (iterable): The recorded events.
+        keyboard: The keyboard controller.
+        mouse: The mouse controller.
+        Key: The keyboard key from pynput.
+        KeyCode: The keyboard key code from pynput.
+        Button: The mouse button from pynput.
+
+    Returns:
+        list: (deadline, function, args, action) operations, deadlines in seconds from the start of the replay.
+    """
+    return list(iter_operations(events, keyboard, mouse, Key, KeyCode, Button))
+
+def load_plan(path, keyboard, mouse, Key, KeyCode, Button, timing=None, start_time=None, start_index=None, cache=None):
+    """Load Plan
+
+    Returns the replay plan of a recording, compiling it only when it is not cached yet, the file changed
+    or it was compiled for other controllers. Plans not cached are compiled while they are replayed (see
+    cache_operations). Plans starting from a time or event index are never cached: the recording is sought through
+    its index.
+
+    Args:
+        path (str): The path of the recording.
+        keyboard: The keyboard controller.
+        mouse: The mouse controller.
+        Key: The keyboard key from pynput.
+        KeyCode: The keyboard key code from pynput.
+        Button: The mouse button from pynput.
+        timing (ReplayTiming): The replay timing, recorded durations by default.
+        start_time (float): Seconds from the start of the recording to replay from.
+        start_index (int): Index of the event to replay from.
+        cache (PlanCache): The cache of the plan, the one of the module by default.
+
+    Returns:
+        iterable: (deadline, function, args, action) operations, a list when cached, a generator otherwise.
+    """
+    cache = cache if cache is not None else plan_cache
+    if timing == ReplayTiming():
+        timing = None
+    if start_time is not None or start_index is not None:
+        events = index.iter_events_from(path, start_time, start_index)
+        operations = iter_operations(retime_events(events, timing), keyboard, mouse, Key, KeyCode, Button)
+        return coalesce_moves(operations, timing.frame_rate) if timing is not None and timing.frame_rate else operations
+    stat = os.stat(path)
+    cache_key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size, timing)
+
+    cached = cache.get(cache_key, keyboard, mouse)
+    if cached is not None:
+        return cached
+
+    operations = iter_operations(retime_events(storage.iter_events(path), timing), keyboard, mouse, Key, KeyCode, Button)
+    if timing is not None and timing.frame_rate:
+        operations = coalesce_moves(operations, timing.frame_rate)
+    return cache_operations(cache_key, keyboard, mouse, operations, cache)
+
+def cache_operations(cache_key, keyboard, mouse, operations, cache=None):
+    """Cache Operations
+
+    Yields the operations of a plan while they are compiled, so the replay starts on the first event, and caches
+    the plan once it has been completely compiled, unless it has more than PLAN_CACHE_MAX_OPERATIONS operations.
+
+    Args:
+        cache_key (tuple): The cache key of the plan.
+        keyboard: The keyboard controller.
+        mouse: The mouse controller.
+        operations (iterable): The operations being compiled.
+        cache (PlanCache): The cache of the plan, the one of the module by default.
+
+    Yields:
+        tuple: (deadline, function, args, action) operations.
+    """
+    compiled = []
+    for operation in operations:
+        if compiled is not None:
+            compiled.append(operation)
+            if len(compiled) > PLAN_CACHE_MAX_OPERATIONS:
+                compiled = None
+        yield operation
+    if compiled is None:
+        return
+    (cache if cache is not None else plan_cache).put(cache_key, keyboard, mouse, compiled)
+
+def clear_plan_cache():
+    """Clear Plan Cache
+
+    Drops every replay plan cached by the module.
+    """
+    plan_cache.clear()
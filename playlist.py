@@ -0,0 +1,107 @@
+"""Py Replay Playlist
+
+This script provides playlists: ordered lists of recordings with a repeat count per entry, replayed back to back.
+Playlists are json files saved in the data folder next to the recordings they list:
+
+    {"version": 1, "entries": [{"file": "login.rec", "repeat": 1}, {"file": "fill-form.rec", "repeat": 3}]}
+
+Author: Facundo Giacconi AKA "GiacconiDev"
+
+"""
+
+import json
+import os
+
+import storage
+
+
+# ---------------------------- CONSTANTS ------------------------------- #
+
+PLAYLIST_VERSION = 1
+
+# ---------------------------- FUNCTIONS ------------------------------- #
+
+def is_playlist(path):
+    """Is Playlist
+
+    Args:
+        path (str): The path or name of a file.
+
+    Returns:
+        bool: Whether the file is a playlist, by its extension.
+    """
+    return path.lower().endswith(storage.PLAYLIST_EXTENSION)
+
+def list_playlists(folder):
+    """List Playlists
+
+    Args:
+        folder (str): The folder where playlists are stored.
+
+    Returns:
+        list: The sorted file names of the playlists.
+    """
+    return sorted(name for name in os.listdir(folder) if is_playlist(name))
+
+def parse_entry(text):
+    """Parse Entry
+
+    Parses an entry typed as FILE or FILE*REPEAT.
+
+    Args:
+        text (str): The typed entry.
+
+    Returns:
+        tuple: The file name and repeat count.
+    """
+    file, _, repeat = text.rpartition("*")
+    if not file or not repeat.isdigit():
+        return text, 1
+    return file, int(repeat)
+
+def load_playlist(path):
+    """Load Playlist
+
+    Loads a playlist and checks that every recording it lists exists.
+
+    Args:
+        path (str): The path of the playlist.
+
+    Returns:
+        list: (recording path, repeat count) entries, recording paths relative to the folder of the playlist.
+
+    Raises:
+        ValueError: When the playlist is not valid or lists missing recordings.
+    """
+    with open(path, 'r') as readfile:
+        content = json.load(readfile)
+    if not isinstance(content, dict) or content.get('version') != PLAYLIST_VERSION:
+        raise ValueError(f"{path} is not a playlist")
+
+    folder = os.path.dirname(os.path.abspath(path))
+    entries = []
+    for entry in content.get('entries', []):
+        repeat = int(entry.get('repeat', 1))
+        if repeat < 1:
+            raise ValueError(f"{path}: repeat count of {entry['file']} must be at least 1")
+        entries.append((os.path.join(folder, entry['file']), repeat))
+
+    missing = [os.path.basename(file) for file, _ in entries if not os.path.isfile(file)]
+    if missing:
+        raise ValueError(f"{path} lists missing recordings: {', '.join(missing)}")
+    return entries
+
+def save_playlist(path, entries):
+    """Save Playlist
+
+    Saves a playlist, through a temporary file and a rename.
+
+    Args:
+        path (str): The path of the playlist.
+        entries (list): (recording file name, repeat count) entries.
+    """
+    content = {'version': PLAYLIST_VERSION, 'entries': [{'file': file, 'repeat': repeat} for file, repeat in entries]}
+    temp_path = f"{path}.{os.getpid()}{storage.TEMP_EXTENSION}"
+    with open(temp_path, 'w') as outfile:
+        json.dump(content, outfile, indent=2)
+    os.replace(temp_path, path)
@@ -8,37 +8,161 @@ Author: [Author Name]
 
 """
 
-import json
-from tkinter import *
+import math
+import os
+import queue
 import time
 import threading
 
-from pynput import keyboard, mouse
 import logging
-from floating_message import FloatingMessage
 
+import index
+import instrumentation
+import logs
+import optimise
 import options
+import screen
+import simplify
+import storage
 from utils import SCRIPT_DIR
 
 
 # ---------------------------- CONSTANTS ------------------------------- # 
 
-events = []
+# Streaming writer of the recording being captured and the last event written to it
+writer = None
+last_event = None
 recording = False
 
+# Raw events pushed by the listener callbacks and normalised by the consumer thread
+raw_events = queue.SimpleQueue()
+stop_recording_key = None
+# Key capturing a screen checkpoint, unset ("") by default so no key is taken away from the recordings
+checkpoint_key = None
+
+# Last cursor position seen by the mouse listener, where checkpoints are captured
+cursor = None
+
+# Sampling policy of the mouse moves of the recording being captured
+move_sampler = None
+
+# Metrics of the recording session, None when instrumentation is disabled
+metrics = None
+
+# Clock references of the recording, to turn monotonic stamps into event times
+start_time = 0
+start_stamp = 0
+last_stamp = 0
+
 # ---------------------------- FUNCTIONS ------------------------------- # 
 
-def get_duration_event():
+def get_duration_event(stamp):
     """Get Duration of Event
     
-    Calculates the duration of the last event.
+    Calculates the time elapsed between the last recorded event and a new one.
+
+    Args:
+        stamp (int): The time.perf_counter_ns() stamp of the new event.
 
     Returns:
         float: The duration of the event.
     """
-    if len(events) == 0:
+    if last_event is None:
         return 0
-    return time.time() - events[-1]['time']
+    return (stamp - last_stamp) / 1e9
+
+def store_event(json_object, stamp):
+    """Store Event
+    
+    Appends an event to the recording file being captured.
+
+    Args:
+        json_object (dict): The recorded event.
+        stamp (int): The time.perf_counter_ns() stamp of the event.
+    """
+    global last_event, last_stamp
+    
+    writer.write(json_object)
+    last_event = json_object
+    last_stamp = stamp
+
+class MoveSampler:
+    """Move Sampler
+    
+    Sampling policy of the recorded mouse moves. A move is recorded when the cursor travelled at least a minimum
+    distance since the last recorded move and either a minimum time passed or the cursor changed its direction.
+    Moves held back are kept as pending so the latest position can be recorded before other events.
+
+    Args:
+        min_interval (float): Minimum seconds between recorded moves going in the same direction.
+        min_distance (float): Minimum pixels between recorded moves.
+        angle_threshold (float): Direction change in degrees that records a move regardless of the interval.
+    """
+    
+    def __init__(self, min_interval, min_distance, angle_threshold):
+        self.min_interval_ns = int(float(min_interval) * 1e9)
+        self.min_distance = float(min_distance)
+        self.angle_threshold = math.radians(float(angle_threshold))
+        self.last = None
+        self.heading = None
+        self.pending = None
+    
+    def accept(self, stamp, x, y):
+        """Accept
+        
+        Marks a move as recorded.
+
+        Args:
+            stamp (int): The time.perf_counter_ns() stamp of the move.
+            x (int): The x-coordinate of the mouse.
+            y (int): The y-coordinate of the mouse.
+        """
+        if self.last is not None and (x, y) != self.last[1:]:
+            self.heading = math.atan2(y - self.last[2], x - self.last[1])
+        self.last = (stamp, x, y)
+        self.pending = None
+    
+    def offer(self, stamp, x, y):
+        """Offer
+        
+        Decides whether a move must be recorded.
+
+        Args:
+            stamp (int): The time.perf_counter_ns() stamp of the move.
+            x (int): The x-coordinate of the mouse.
+            y (int): The y-coordinate of the mouse.
+
+        Returns:
+            bool: True when the move must be recorded now.
+        """
+        if self.last is not None:
+            last_stamp, last_x, last_y = self.last
+            if math.hypot(x - last_x, y - last_y) < self.min_distance:
+                self.pending = (stamp, x, y)
+                return False
+            if stamp - last_stamp < self.min_interval_ns:
+                turn = 0
+                if self.heading is not None:
+                    turn = abs(math.atan2(y - last_y, x - last_x) - self.heading) % (2 * math.pi)
+                    turn = min(turn, 2 * math.pi - turn)
+                if turn < self.angle_threshold:
+                    self.pending = (stamp, x, y)
+                    return False
+        self.accept(stamp, x, y)
+        return True
+    
+    def take_pending(self):
+        """Take Pending
+        
+        Returns the move held back since the last recorded one, marking it as recorded.
+
+        Returns:
+            tuple: stamp, x and y of the move, or None.
+        """
+        pending = self.pending
+        if pending is not None:
+            self.accept(*pending)
+        return pending
 
 def minimize_window(window):
     """Minimize Window
@@ -63,90 +187,75 @@ def maximize_window(window):
 def on_press(key, mouse_listener):
     """On Press
     
-    Event handler for key press events.
+    Event handler for key press events. Runs on the listener thread, so it only enqueues the raw event.
 
     Args:
         key: The key pressed.
+        mouse_listener: The mouse listener to stop when recording finishes.
     """
     global recording
     
+    stamp = time.perf_counter_ns()
     if recording is not True:
-        logging.info("finishing keyboard thread recording")
         mouse_listener.stop()
         return False
-    try:
-        logging.info(f"pressing-{key}")
-        # check to finish keyboard listener (detect button configured as 'stop_recording_key')
-        if hasattr(key, "char") and key.char is not None:
-            if key.char == options.options_config["stop_recording_key"]:
-                recording = False
-                mouse_listener.stop()
-                return False
-            json_object = {'action':'pressed_key', 'key':key.char, 'time': time.time(), 'duration': get_duration_event()}
-        elif hasattr(key, "name"):
-            json_object = {'action':'pressed_key', 'key':key.name, 'time': time.time(), 'duration': get_duration_event()}
-        elif hasattr(key, "vk"):
-            json_object = {'action':'pressed_key', 'vk':key.vk, 'time': time.time(), 'duration': get_duration_event()}
-    except AttributeError:
-        json_object = {'action':'pressed_key', 'key':str(key).split(".")[-1], 'time': time.time(), 'duration': get_duration_event()}
-    events.append(json_object)
+    # check to finish keyboard listener (detect button configured as 'stop_recording_key')
+    if getattr(key, "char", None) == stop_recording_key:
+        recording = False
+        mouse_listener.stop()
+        return False
+    # the checkpoint key captures the screen around the cursor instead of being recorded
+    if checkpoint_key and getattr(key, "char", None) == checkpoint_key:
+        if cursor is not None:
+            raw_events.put(('checkpoint', stamp) + cursor)
+        return
+    raw_events.put(('pressed_key', stamp, key))
+    if metrics is not None:
+        metrics.observe('callback', 'pressed_key', (time.perf_counter_ns() - stamp) / 1e9)
     
 
 def on_release(key):
     """On Release
     
-    Event handler for key release events.
+    Event handler for key release events. Runs on the listener thread, so it only enqueues the raw event.
 
     Args:
         key: The key released.
     """
-    global recording
-    
+    stamp = time.perf_counter_ns()
     if recording is not True:
         return False
-    try:
-        logging.info(f"release-{key}")
-        if hasattr(key, "char") and key.char is not None:
-            json_object = {'action':'released_key', 'key':key.char, 'time': time.time(), 'duration': get_duration_event()}
-        elif hasattr(key, "name"):
-            json_object = {'action':'released_key', 'key':key.name, 'time': time.time(), 'duration': get_duration_event()}
-        elif hasattr(key, "vk"):
-            json_object = {'action':'released_key', 'vk':key.vk, 'time': time.time(), 'duration': get_duration_event()}
-    except AttributeError:
-        json_object = {'action':'released_key', 'key':str(key).split(".")[-1], 'time': time.time(), 'duration': get_duration_event()}
-    events.append(json_object)
+    if checkpoint_key and getattr(key, "char", None) == checkpoint_key:
+        return
+    raw_events.put(('released_key', stamp, key))
+    if metrics is not None:
+        metrics.observe('callback', 'released_key', (time.perf_counter_ns() - stamp) / 1e9)
         
 
 def on_move(x, y):
     """On Move
     
-    Event handler for mouse movement events.
+    Event handler for mouse movement events. Runs on the listener thread, so it only enqueues the raw event.
 
     Args:
         x (int): The x-coordinate of the mouse.
         y (int): The y-coordinate of the mouse.
     """
-    global recording
+    global cursor
     
+    stamp = time.perf_counter_ns()
     if recording is not True:
         return False
-    if len(events) >= 1:
-        logging.info(f"moving mouse to [{x}-{y}]")
-        if events[-1]['action'] != "moved":
-            json_object = {'action':'moved', 'x':x, 'y':y, 'time':time.time(), 'duration': get_duration_event()}
-            events.append(json_object)
-        elif events[-1]['action'] == "moved" and time.time() - events[-1]['time'] > 0.05:
-            json_object = {'action':'moved', 'x':x, 'y':y, 'time':time.time(), 'duration': get_duration_event()}
-            events.append(json_object)
-    else:
-        json_object = {'action':'moved', 'x':x, 'y':y, 'time':time.time(), 'duration': get_duration_event()}
-        events.append(json_object)
+    cursor = (x, y)
+    raw_events.put(('moved', stamp, x, y))
+    if metrics is not None:
+        metrics.observe('callback', 'moved', (time.perf_counter_ns() - stamp) / 1e9)
 
 
 def on_click(x, y, button, pressed):
     """On Click
     
-    Event handler for mouse click events.
+    Event handler for mouse click events. Runs on the listener thread, so it only enqueues the raw event.
 
     Args:
         x (int): The x-coordinate of the mouse.
@@ -154,19 +263,21 @@ def on_click(x, y, button, pressed):
         button: The mouse button clicked.
         pressed (bool): Whether the button was pressed or released.
     """
-    global recording
+    global cursor
     
+    stamp = time.perf_counter_ns()
     if recording is not True:
         return False
-    logging.info(f"click on [{x}-{y}]")
-    json_object = {'action':'pressed_mouse' if pressed else 'released_mouse', 'button':str(button).split(".")[-1], 'x':x, 'y':y, 'time':time.time(), 'duration': get_duration_event()}
-    events.append(json_object)
+    cursor = (x, y)
+    raw_events.put(('pressed_mouse' if pressed else 'released_mouse', stamp, x, y, button))
+    if metrics is not None:
+        metrics.observe('callback', 'pressed_mouse' if pressed else 'released_mouse', (time.perf_counter_ns() - stamp) / 1e9)
 
 
 def on_scroll(x, y, dx, dy):
     """On Scroll
     
-    Event handler for mouse scroll events.
+    Event handler for mouse scroll events. Runs on the listener thread, so it only enqueues the raw event.
 
     Args:
         x (int): The x-coordinate of the mouse.
@@ -174,24 +285,146 @@ def on_scroll(x, y, dx, dy):
         dx (int): The horizontal scroll amount.
         dy (int): The vertical scroll amount.
     """
-    global recording
-    
+    stamp = time.perf_counter_ns()
     if recording is not True:
         return False
-    logging.info(f"scrolling to [{x}-{y}]")
-    json_object = {'action': 'scroll', 'vertical_direction': int(dy), 'horizontal_direction': int(dx), 'x':x, 'y':y, 'time': time.time(), 'duration': get_duration_event()}
-    events.append(json_object)
+    raw_events.put(('scroll', stamp, x, y, dx, dy))
+    if metrics is not None:
+        metrics.observe('callback', 'scroll', (time.perf_counter_ns() - stamp) / 1e9)
+
 
+def normalise_key(action, key, event_time, duration):
+    """Normalise Key
+    
+    Builds the recorded event of a key press or release.
+
+    Args:
+        action (str): 'pressed_key' or 'released_key'.
+        key: The pynput key.
+        event_time (float): The time of the event.
+        duration (float): The time elapsed since the previous event.
+
+    Returns:
+        dict: The recorded event.
+    """
+    try:
+        if hasattr(key, "char") and key.char is not None:
+            return {'action':action, 'key':key.char, 'time': event_time, 'duration': duration}
+        elif hasattr(key, "name"):
+            return {'action':action, 'key':key.name, 'time': event_time, 'duration': duration}
+        elif hasattr(key, "vk"):
+            return {'action':action, 'vk':key.vk, 'time': event_time, 'duration': duration}
+    except AttributeError:
+        pass
+    return {'action':action, 'key':str(key).split(".")[-1], 'time': event_time, 'duration': duration}
+
+def normalise_event(raw_event):
+    """Normalise Event
+    
+    Turns a raw event enqueued by a listener callback into the recorded event.
+
+    Args:
+        raw_event (tuple): The action, the time.perf_counter_ns() stamp and the callback arguments.
+
+    Returns:
+        dict: The recorded event.
+    """
+    action, stamp = raw_event[0], raw_event[1]
+    
+    event_time = start_time + (stamp - start_stamp) / 1e9
+    duration = get_duration_event(stamp)
+    
+    if action == 'moved':
+        _, _, x, y = raw_event
+        logs.log_event(action, "moving mouse to [%s-%s]", x, y)
+        return {'action':'moved', 'x':x, 'y':y, 'time':event_time, 'duration': duration}
+    if action in ('pressed_mouse', 'released_mouse'):
+        _, _, x, y, button = raw_event
+        logs.log_event(action, "click on [%s-%s]", x, y)
+        return {'action':action, 'button':str(button).split(".")[-1], 'x':x, 'y':y, 'time':event_time, 'duration': duration}
+    if action == 'scroll':
+        _, _, x, y, dx, dy = raw_event
+        logs.log_event(action, "scrolling to [%s-%s]", x, y)
+        return {'action': 'scroll', 'vertical_direction': int(dy), 'horizontal_direction': int(dx), 'x':x, 'y':y, 'time': event_time, 'duration': duration}
+    if action == 'checkpoint':
+        _, _, x, y = raw_event
+        size = int(options.get_option("checkpoint_size"))
+        event = screen.capture_checkpoint(max(x - size // 2, 0), max(y - size // 2, 0), size, size, options.get_option("checkpoint_timeout"))
+        logging.info(f"checkpoint {event['reference']} around [{x}-{y}]")
+        event.update({'time': event_time, 'duration': duration})
+        return event
+    
+    key = raw_event[2]
+    logs.log_event(action, "%s-%s", 'pressing' if action == 'pressed_key' else 'release', key)
+    return normalise_key(action, key, event_time, duration)
+
+def flush_pending_move():
+    """Flush Pending Move
+    
+    Records the latest mouse position held back by the move sampler, if any.
+    """
+    pending = move_sampler.take_pending()
+    if pending is not None:
+        store_event(normalise_event(('moved',) + pending), pending[0])
+
+def consume_event(raw_event):
+    """Consume Event
+    
+    Normalises a raw event and writes it to the recording. Moves go through the sampling policy, and any move
+    it held back is written before a click, scroll or key event so it happens at the exact cursor position.
+
+    Args:
+        raw_event (tuple): The action, the time.perf_counter_ns() stamp and the callback arguments.
+    """
+    if raw_event[0] == 'moved':
+        if not move_sampler.offer(*raw_event[1:]):
+            return
+    else:
+        flush_pending_move()
+    try:
+        event = normalise_event(raw_event)
+    except (ImportError, OSError) as error:
+        # screenshots need pyautogui and a display
+        logging.error(f"cannot capture checkpoint: {error}")
+        return
+    store_event(event, raw_event[1])
+    if metrics is not None:
+        metrics.count(raw_event[0])
+        metrics.track('queue_depth', raw_events.qsize())
 
-def record_events():
+def consume_events():
+    """Consume Events
+    
+    Consumer thread of the raw events queue: consumes every raw event until the None sentinel is received.
+    """
+    while True:
+        raw_event = raw_events.get()
+        if raw_event is None:
+            break
+        consume_event(raw_event)
+    # last cursor position of the recording
+    flush_pending_move()
+
+
+def record_events(KeyboardListener=None, MouseListener=None, folder=None):
     """Record Events
     
-    Records user events such as keyboard presses, mouse clicks, movements, and scrolls.
+    Records user events such as keyboard presses, mouse clicks, movements, and scrolls, streaming them
+    into a temporary file of the data folder from the first event.
+
+    Args:
+        KeyboardListener: The keyboard listener class, pynput's by default.
+        MouseListener: The mouse listener class, pynput's by default.
+        folder (str): The folder of the temporary recording, the data folder by default.
 
     Returns:
-        list: A list of recorded events.
+        storage.RecordingWriter: The closed writer of the temporary recording.
     """
-    global recording, events
+    global recording, writer, last_event, stop_recording_key, checkpoint_key, cursor, start_time, start_stamp, last_stamp, move_sampler, metrics
+    
+    if KeyboardListener is None or MouseListener is None:
+        from pynput import keyboard, mouse
+        KeyboardListener, MouseListener = keyboard.Listener, mouse.Listener
     
     if recording is True:
         return
@@ -200,14 +433,25 @@ def record_events():
     
     # Declare listeners
     recording = True
-    events = []
-
-    mouse_listener = mouse.Listener(
+    last_event = None
+    stop_recording_key = options.options_config["stop_recording_key"]
+    checkpoint_key = options.get_option("checkpoint_key")
+    cursor = None
+    start_time, start_stamp = time.time(), time.perf_counter_ns()
+    last_stamp = start_stamp
+    move_sampler = MoveSampler(options.get_option("move_min_interval"), options.get_option("move_min_distance"), options.get_option("move_angle_threshold"))
+    metrics = instrumentation.new_session('record')
+    writer = storage.RecordingWriter(storage.new_temp_recording_path(folder or f"{SCRIPT_DIR}/data"))
+
+    consumer = threading.Thread(target=consume_events)
+    consumer.start()
+
+    mouse_listener = MouseListener(
         on_click=on_click,
         on_scroll=on_scroll,
         on_move=on_move)
     
-    keyboard_listener = keyboard.Listener(
+    keyboard_listener = KeyboardListener(
         on_press=lambda event: on_press(event, mouse_listener),
         on_release=on_release)
 
@@ -219,10 +463,46 @@ def record_events():
     keyboard_listener.join()
     mouse_listener.join()
 
-    logging.info("Finishing listeners")
+    # drain the queue before closing the recording
+    raw_events.put(None)
+    consumer.join()
+
+    writer.close()
+    if metrics is not None:
+        metrics.finish()
+    logging.info(f"Finishing listeners, {writer.count} events recorded")
+    
+    if options.get_option("simplify_moves") == 1 and writer.count > 1:
+        report = simplify.simplify_file(writer.path)
+        writer.count = report['events_after']
+    
+    # clean the noise of the raw recording with the configured optimisation passes, none by default: the passes
+    # load the whole recording in memory
+    if options.get_option("optimise_passes") and writer.count > 1:
+        try:
+            report = optimise.optimise_file(writer.path, optimise.parse_passes(options.get_option("optimise_passes")))
+            writer.count = report['events_after']
+        except ValueError as error:
+            logging.error(error)
+    
+    return writer
     
-    return events
     
+def save_recording(recording_writer, path):
+    """Save Recording
+    
+    Moves a captured recording to its final path and indexes it, writing the stats of the session next to it when
+    instrumentation is enabled.
+
+    Args:
+        recording_writer (storage.RecordingWriter): The closed writer of the temporary recording.
+        path (str): The final recording path.
+    """
+    storage.finalize_recording(recording_writer.path, path, options.get_option("compression") or None)
+    if storage.is_binary_recording(path):
+        index.build_index(path)
+    if metrics is not None:
+        metrics.write(path)
     
 def start_record_events_thread(btns, window, refresh_file_selector):
     """Start Record Events Thread
@@ -235,6 +515,8 @@ def start_record_events_thread(btns, window, refresh_file_selector):
         refresh_file_selector (function): The function to refresh file selectors.
     """
     
+    from floating_message import FloatingMessage
+    
     #disable required buttons of GUI
     for btn in btns:
         btn.config(state="disabled")
@@ -252,16 +534,21 @@ def start_record_events_thread(btns, window, refresh_file_selector):
     def thread_function():
         from tkinter import filedialog
         
-        final_events = record_events()
+        recording_writer = record_events()
         
         # check to finish mouse listener (detect release of button right)
-        if len(final_events) > 1:
-            directory = filedialog.asksaveasfilename(initialdir=f"{SCRIPT_DIR}/data", initialfile="record.json", defaultextension=".json", filetypes=(("record file", "*.json"),("All Files", "*.*") ))
+        directory = None
+        if recording_writer.count > 1:
+            extension = storage.COMPRESSED_EXTENSION if options.get_option("compression") else storage.BINARY_EXTENSION
+            directory = filedialog.asksaveasfilename(initialdir=f"{SCRIPT_DIR}/data", initialfile=f"record{extension}", defaultextension=extension, filetypes=(("record file", f"*{storage.BINARY_EXTENSION}"), ("compressed record file", f"*{storage.COMPRESSED_EXTENSION}"), ("json record file", f"*{storage.JSON_EXTENSION}"), ("All Files", "*.*") ))
             logging.info(directory)
-            if directory is not None and directory != "":
-                with open(directory, 'w+') as outfile:
-                    json.dump(events, outfile)
-                refresh_file_selector()
+        
+        if directory is not None and directory != "":
+            save_recording(recording_writer, directory)
+            refresh_file_selector()
+        else:
+            # recording discarded by the user
+            os.remove(recording_writer.path)
 
         #enable required buttons of GUI
         def reenable_btns(btns):
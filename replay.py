@@ -7,16 +7,19 @@ Author: [Author Name]
 
 """
 
-import json
-from tkinter import *
+import os
 import time
 import threading
 
-from pynput import keyboard
 import logging
-from floating_message import FloatingMessage
 
+import instrumentation
+import logs
 import options
+import plan
+import playlist
+from control import ReplayControl
+from scheduler import DeadlineScheduler
 from utils import SCRIPT_DIR
 
 
@@ -26,8 +29,31 @@ playing = False
 looping = False
 looping_check = False
 
+# Control of the current replay session, driven by the hotkeys and the buttons of the floating message
+control = None
+
+# Controllers shared by every replay, so compiled plans stay bound to them
+controllers = {}
+
 # ---------------------------- FUNCTIONS ------------------------------- # 
 
+def get_controllers(KeyboardController, MouseController):
+    """Get Controllers
+    
+    Returns the keyboard and mouse controllers, creating them on first use.
+
+    Args:
+        KeyboardController: The keyboard controller from pynput.
+        MouseController: The mouse controller from pynput.
+
+    Returns:
+        tuple: The keyboard and mouse controller instances.
+    """
+    key = (KeyboardController, MouseController)
+    if key not in controllers:
+        controllers[key] = (KeyboardController(), MouseController())
+    return controllers[key]
+
 
 def minimize_window(window):
     """Minimize Window
@@ -57,39 +83,85 @@ def on_press_replay(key):
     Args:
         key: The key pressed.
     """
-    global playing, looping
-    
-    logging.info(f"replay-pressing-{key}")
+    logs.log_event("replay_pressed_key", "replay-pressing-%s", key)
     
+    if not hasattr(key, 'char') or key.char is None:
+        return
     # check to finish keyboard listener (detect button configured key as 'stop_playing_key')
-    if hasattr(key, 'char') and key.char == options.options_config["stop_playing_key"]:
-        logging.info(f"Finishing replay manually")
-        playing = False
-        looping = False
+    if key.char == options.options_config["stop_playing_key"]:
+        logging.info("Finishing replay manually")
+        stop_replay()
         return False
+    if control is not None and key.char == options.get_option("pause_playing_key"):
+        control.toggle_pause()
+        logging.info(f"replay {control.state}")
+    elif control is not None and key.char == options.get_option("step_playing_key"):
+        control.step()
+
+def start_session():
+    """Start Session
+    
+    Creates the control of a new replay session, the one the hotkeys and buttons drive from then on.
+
+    Returns:
+        ReplayControl: The control of the session.
+    """
+    global control
+    
+    control = ReplayControl()
+    return control
 
-def start_replay_events_thread(btns, file, window, looping_check):
+def stop_replay():
+    """Stop Replay
+    
+    Cancels the current replay session, which stops within the stop latency of its control.
+    """
+    global playing, looping
+    
+    playing = False
+    looping = False
+    if control is not None:
+        control.cancel()
+
+def start_replay_events_thread(btns, file, window, looping_check, speed=1.0, max_gap=None, idle_threshold=None, frame_rate=None):
     """Start Replay Events Thread
     
     Initiates a thread for replaying recorded events.
 
     Args:
         play_btn (tkinter.Button): The button to initiate replay.
-        file (str): The name of the file containing recorded events.
+        file (str): The name of the file containing recorded events, or of a playlist.
         window (tkinter.Tk): The Tkinter window.
         looping_check (bool): Whether to loop the replay or not.
+        speed (float): Speed factor of the replay.
+        max_gap (float): Cap in seconds of any single gap, the 'replay_max_gap' option by default.
+        idle_threshold (float): Length in seconds idle spans are collapsed to, the 'replay_idle_threshold' option by default.
+        frame_rate (float): Rate in Hz mouse moves are coalesced at, the 'replay_frame_rate' option by default.
     """
-    global playing, looping
+    global playing
+    
+    from floating_message import FloatingMessage
+    
+    timing = plan.ReplayTiming(
+        speed=speed,
+        max_gap=max_gap if max_gap is not None else options.get_option("replay_max_gap") or None,
+        idle_threshold=idle_threshold if idle_threshold is not None else options.get_option("replay_idle_threshold") or None,
+        frame_rate=frame_rate if frame_rate is not None else options.get_option("replay_frame_rate") or None)
     
     #disable required buttons of GUI
     for btn in btns:
         btn.config(state="disabled")
         
     playing = True
+    session = start_session()
     
-    #Show tooltip to remember stop button at top left
+    #Show tooltip to remember stop button at top left, with the buttons controlling the replay
     stop_record_message = options.get_i18n_literal("stop_playing_message")
-    floating_message = FloatingMessage(window, stop_record_message.replace("@", options.options_config["stop_playing_key"]))
+    floating_message = FloatingMessage(window, stop_record_message.replace("@", options.options_config["stop_playing_key"]), [
+        (options.get_i18n_literal("pause_resume"), session.toggle_pause),
+        (options.get_i18n_literal("step"), session.step),
+        (options.get_i18n_literal("stop"), stop_replay),
+    ])
     floating_message.show()
     
     if window != None and options.options_config["minimize_when_play"] == 1:
@@ -99,8 +171,6 @@ def start_replay_events_thread(btns, file, window, looping_check):
     def replay_thread_function(file, looping_check):
         global looping
         
-        import json
-        import time
         from pynput.keyboard import Key, Controller as KeyboardController, KeyCode
         from pynput.mouse import Button, Controller as MouseController
             
@@ -109,7 +179,7 @@ def start_replay_events_thread(btns, file, window, looping_check):
         if looping_check is True:
             looping = True
         
-        replay(KeyboardController, MouseController, Button, Key, file, KeyCode)
+        replay(KeyboardController, MouseController, Button, Key, file, KeyCode, timing, session=session)
         
         #enable required buttons of GUI
         def reenable_btns(btns):
@@ -128,30 +198,48 @@ def start_replay_events_thread(btns, file, window, looping_check):
     # Start the thread
     replay_thread.start()
     
-def replay(KeyboardController, MouseController, Button, Key, file, KeyCode):
+def replay(KeyboardController, MouseController, Button, Key, file, KeyCode, timing=None, loops=1, start_time=None, start_index=None, session=None):
     """Replay
     
-    Replays recorded events.
+    Replays recorded events, driven by the stop, pause and step playing keys, again and again while the looping flag
+    of the GUI is set.
 
     Args:
         KeyboardController: The keyboard controller from pynput.
         MouseController: The mouse controller from pynput.
         Button: The mouse button from pynput.
         Key: The keyboard key from pynput.
-        file (str): The name of the file containing recorded events.
+        file (str): The name of the file containing recorded events, or of a playlist.
+        timing (plan.ReplayTiming): Speed factor, gap cap and idle collapsing of the replay.
+        loops (int): Number of times the recording is replayed when not looping.
+        start_time (float): Seconds from the start of the recording the first pass starts at.
+        start_index (int): Index of the event the first pass starts at.
+        session (ReplayControl): The control of the replay, a new session by default.
+
+    Returns:
+        dict: The lateness report of the last replay pass.
     """
-    # Define the function that will run in the thread
+    global playing
     
+    from pynput import keyboard
+    
+    session = session or start_session()
     keyboard_listener = keyboard.Listener(on_press=on_press_replay)
     keyboard_listener.start()
     
-    replay_events(KeyboardController, MouseController, Button, Key, file, KeyCode)
+    if playlist.is_playlist(file):
+        report = replay_playlist(KeyboardController, MouseController, Button, Key, file, KeyCode, timing, session, looping)
+    else:
+        report = replay_events(KeyboardController, MouseController, Button, Key, file, KeyCode, timing, loops, start_time, start_index, session, looping)
+    playing = False
     # Stop keyboard thread
     
     if keyboard_listener.is_alive():
         keyboard_listener.stop()
+    
+    return report
 
-def replay_events(KeyboardController, MouseController, Button, Key, file, KeyCode):
+def replay_events(KeyboardController, MouseController, Button, Key, file, KeyCode, timing=None, loops=1, start_time=None, start_index=None, session=None, loop_forever=False):
     """Replay Events
     
     Replays recorded events.
@@ -161,62 +249,154 @@ def replay_events(KeyboardController, MouseController, Button, Key, file, KeyCod
         MouseController: The mouse controller from pynput.
         Button: The mouse button from pynput.
         Key: The keyboard key from pynput.
-        file (str): The name of the file containing recorded events.
+        file (str): The name of the file containing recorded events, in the data folder, or its path.
+        timing (plan.ReplayTiming): Speed factor, gap cap and idle collapsing of the replay.
+        loops (int): Number of times the recording is replayed when not looping.
+        start_time (float): Seconds from the start of the recording the first pass starts at, the held keys,
+            buttons and mouse position at that point are restored first.
+        start_index (int): Index of the event the first pass starts at.
+        session (ReplayControl): The control pausing, stepping or cancelling the replay, a new one by default.
+        loop_forever (bool): Replay the recording again and again until the session is cancelled.
+
+    Returns:
+        dict: The lateness report of the last replay pass.
     """
-    global playing, looping
-    
     name_of_recording = file
     
     logging.info(name_of_recording)
-    looping_counter = 1
+    looping_counter = loops
+    
+    keyboard, mouse = get_controllers(KeyboardController, MouseController)
+    session = session or ReplayControl()
+    session.attach(keyboard, mouse)
+    path = os.path.join(f"{SCRIPT_DIR}/data", name_of_recording)
+    metrics = instrumentation.new_session('replay')
+    # every event is waited until its absolute deadline, so sleeps and controller calls do not add up
+    scheduler = DeadlineScheduler()
     
-    while looping_counter > 0:
-        # Read events from file
-        f = open(SCRIPT_DIR + f"/data/{name_of_recording}", 'r')
-        json_file = json.load(f)
+    while looping_counter > 0 and not session.cancelled:
+        # Compiled plan of the recording, only parsed again when the file changes
+        operations = plan.load_plan(path, keyboard, mouse, Key, KeyCode, Button, timing, start_time, start_index)
+        # only the first pass is sought, the next ones replay the whole recording
+        start_time = start_index = None
         
-        keyboard = KeyboardController()
-        mouse = MouseController()
+        scheduler.start()
 
-        for json_line in json_file:
-            # logging.info(json_line)
+        for deadline, function, args, action in operations:
+            if action == 'checkpoint':
+                # waited from the previous event on, the next events keep their spacing from the match
+                if not function(*args, wait=session.wait):
+                    if not session.cancelled:
+                        logging.error(f"{name_of_recording} - stopping, the screen did not reach a checkpoint")
+                        session.cancel()
+                    break
+                scheduler.origin = scheduler.clock() - deadline
+                if metrics is not None:
+                    metrics.count(action)
+                continue
             
-            if playing is not True:
+            # waited in slices of the stop latency, a pause or cancel is noticed whatever the gap
+            late = session.wait_until(scheduler, deadline)
+            if late is None:
                 break
-            
-            time.sleep(json_line['duration'])
-            
-            if json_line['action'] == 'pressed_key':
-                if "key" in json_line and hasattr(Key, json_line['key']):
-                    keyboard.press(Key[json_line['key']])
-                elif "vk" in json_line:
-                    keyboard.press(KeyCode.from_vk(json_line['vk']))
-                else:
-                    keyboard.press(json_line['key'])
-                
-            elif json_line['action'] == 'released_key':
-                if "key" in json_line and hasattr(Key, json_line['key']):
-                    keyboard.release(Key[json_line['key']])
-                elif "vk" in json_line:
-                    keyboard.release(KeyCode.from_vk(json_line['vk']))
-                else:
-                    keyboard.release(json_line['key'])
-            
-            elif json_line['action'] == 'moved':
-                mouse.position = (json_line['x'], json_line['y'])  
-            
-            elif json_line['action'] == 'pressed_mouse':
-                mouse.press(Button[json_line['button']]) 
-                
-            elif json_line['action'] == 'released_mouse':
-                mouse.release(Button[json_line['button']])  
-                
-            elif json_line['action'] == 'scroll':
-                mouse.scroll(json_line['button'], json_line['y'])  
+            if metrics is None:
+                function(*args)
+            else:
+                injection_begin = time.perf_counter()
+                function(*args)
+                metrics.observe('injection', action, time.perf_counter() - injection_begin)
+                metrics.observe('overshoot', action, late)
+                metrics.count(action)
+            session.executed(action, args)
+        
+        # a plan still being compiled holds its recording open until it is closed
+        if hasattr(operations, 'close'):
+            operations.close()
+        
+        logging.info(f"{name_of_recording} - lateness report: {scheduler.report()}")
         
-        if looping is not True:
+        if loop_forever is not True:
             looping_counter -= 1
     
     
+    # a cancelled or unbalanced recording must not leave keys or buttons pressed
+    session.release_held()
     logging.info(f"{name_of_recording} - finished!")
-    playing = False
+    
+    report = scheduler.report()
+    if metrics is not None:
+        metrics.track('drift_seconds', report['drift'])
+        metrics.write(path)
+    return report
+
+def preload_plan(path, keyboard, mouse, Key, KeyCode, Button, timing):
+    """Preload Plan
+    
+    Compiles the plan of a recording into the plan cache on a background thread.
+
+    Args:
+        path (str): The path of the recording.
+        keyboard: The keyboard controller.
+        mouse: The mouse controller.
+        Key: The keyboard key from pynput.
+        KeyCode: The keyboard key code from pynput.
+        Button: The mouse button from pynput.
+        timing (plan.ReplayTiming): The replay timing the plan is compiled for.
+
+    Returns:
+        threading.Thread: The started preloading thread.
+    """
+    def preload_thread_function():
+        try:
+            # going through a plan being compiled caches it
+            for _ in plan.load_plan(path, keyboard, mouse, Key, KeyCode, Button, timing):
+                pass
+        except (OSError, ValueError, KeyError) as error:
+            logging.error(f"cannot preload {path}: {error}")
+    
+    preload_thread = threading.Thread(target=preload_thread_function, daemon=True)
+    preload_thread.start()
+    return preload_thread
+
+def replay_playlist(KeyboardController, MouseController, Button, Key, file, KeyCode, timing=None, session=None, loop_forever=False):
+    """Replay Playlist
+    
+    Replays the recordings of a playlist back to back, each one its repeat count times, the whole playlist
+    again and again when looping. The next recording is compiled on a background thread while the current
+    one plays, so switching recordings adds no delay.
+
+    Args:
+        KeyboardController: The keyboard controller from pynput.
+        MouseController: The mouse controller from pynput.
+        Button: The mouse button from pynput.
+        Key: The keyboard key from pynput.
+        file (str): The name of the playlist, in the data folder, or its path.
+        timing (plan.ReplayTiming): Speed factor, gap cap and idle collapsing of the replay.
+        session (ReplayControl): The control of the replay, shared by all its recordings.
+        loop_forever (bool): Replay the whole playlist again and again until the session is cancelled, its
+            recordings are still replayed their repeat count.
+
+    Returns:
+        dict: The lateness report of the last replay pass.
+    """
+    session = session or ReplayControl()
+    entries = playlist.load_playlist(os.path.join(f"{SCRIPT_DIR}/data", file))
+    keyboard, mouse = get_controllers(KeyboardController, MouseController)
+    report = None
+    
+    preload_thread = preload_plan(entries[0][0], keyboard, mouse, Key, KeyCode, Button, timing) if entries else None
+    while not session.cancelled and entries:
+        for position, (path, repeat) in enumerate(entries):
+            if session.cancelled:
+                break
+            # wait for the plan still being compiled rather than compiling it twice
+            preload_thread.join()
+            if position + 1 < len(entries) or loop_forever:
+                next_path = entries[(position + 1) % len(entries)][0]
+                preload_thread = preload_plan(next_path, keyboard, mouse, Key, KeyCode, Button, timing)
+            report = replay_events(KeyboardController, MouseController, Button, Key, path, KeyCode, timing, repeat, session=session)
+        if loop_forever is not True:
+            break
+    
+    logging.info(f"{file} - playlist finished!")
+    return report
@@ -0,0 +1,91 @@
+"""Py Replay Scheduler
+
+This script provides the pacing of replayed events. Instead of sleeping the recorded duration before every event,
+which accumulates every oversleep and every controller call into a growing drift, each event gets an absolute
+deadline on a monotonic clock: the scheduler sleeps coarsely until shortly before it and then waits precisely.
+
+Author: Facundo Giacconi AKA "GiacconiDev"
+
+"""
+
+from array import array
+import statistics
+import time
+
+
+# ---------------------------- CONSTANTS ------------------------------- #
+
+# Last seconds before a deadline waited precisely instead of sleeping
+SPIN_WINDOW = 0.002
+
+# ---------------------------- FUNCTIONS ------------------------------- #
+
+class DeadlineScheduler:
+    """Deadline Scheduler
+
+    Waits for events deadlines, given as offsets from the start of the schedule, and keeps the lateness of each event.
+
+    Args:
+        clock (function): Monotonic clock returning seconds.
+        sleep (function): Sleep function taking seconds.
+        spin_window (float): Seconds before a deadline waited precisely.
+    """
+
+    def __init__(self, clock=time.perf_counter, sleep=time.sleep, spin_window=SPIN_WINDOW):
+        self.clock = clock
+        self.sleep = sleep
+        self.spin_window = spin_window
+        self.origin = None
+        self.lateness = array('d')
+
+    def start(self):
+        """Start
+
+        Sets the origin of the schedule to the current time and clears the lateness of previous runs.
+        """
+        self.origin = self.clock()
+        self.lateness = array('d')
+
+    def wait_until(self, offset):
+        """Wait Until
+
+        Waits until the deadline of an event.
+
+        Args:
+            offset (float): Seconds from the start of the schedule to the event.
+
+        Returns:
+            float: Seconds the event is late (0 or more).
+        """
+        if self.origin is None:
+            self.start()
+        deadline = self.origin + offset
+        remaining = deadline - self.clock()
+        if remaining > self.spin_window:
+            self.sleep(remaining - self.spin_window)
+        while self.clock() < deadline:
+            self.sleep(0)
+        late = self.clock() - deadline
+        self.lateness.append(late)
+        return late
+
+    def report(self):
+        """Report
+
+        Summarizes the lateness of the events waited so far. The drift is the lateness of the last event:
+        since deadlines are absolute, it does not grow with the length of the recording.
+
+        Returns:
+            dict: events count, mean, p50, p99 and max lateness, and final drift in seconds.
+        """
+        if len(self.lateness) == 0:
+            return {'events': 0, 'mean': 0, 'p50': 0, 'p99': 0, 'max': 0, 'drift': 0}
+        ordered = sorted(self.lateness)
+        return {
+            'events': len(ordered),
+            'mean': statistics.fmean(ordered),
+            'p50': ordered[len(ordered) // 2],
+            'p99': ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))],
+            'max': ordered[-1],
+            'drift': self.lateness[-1],
+        }
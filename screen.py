@@ -0,0 +1,163 @@
+"""Py Replay Screen
+
+This script provides the checkpoint events of recordings: instead of trusting a recorded delay, the replay waits
+until a region of the screen matches what it showed when the checkpoint was captured, and goes on as soon as it
+does. A checkpoint references either the hash of the pixels of its region ('hash:<hex digest>') or an image file
+of the data folder located anywhere inside its region ('image:<file name>'), and gives up after a timeout:
+
+    {"action": "checkpoint", "left": 10, "top": 20, "width": 64, "height": 64, "reference": "hash:9f86d081884c7d65",
+     "timeout": 30, "time": 1700000000.0, "duration": 0.5}
+
+Screenshots come from a pluggable source, pyautogui by default (imported on first use), so checkpoints can be
+checked against synthetic images.
+
+Author: Facundo Giacconi AKA "GiacconiDev"
+
+"""
+
+import hashlib
+import logging
+import os
+import time
+
+from utils import SCRIPT_DIR
+
+
+# ---------------------------- CONSTANTS ------------------------------- #
+
+HASH_PREFIX = "hash:"
+IMAGE_PREFIX = "image:"
+
+# Bytes of the pixel hash, 16 hex characters so the reference fits one intern record of binary recordings
+HASH_BYTES = 8
+
+# Seconds between two screenshots of a checkpoint being waited
+CHECKPOINT_POLL_INTERVAL = 0.05
+
+# Function taking a (left, top, width, height) region and returning its screenshot as a PIL image, None until
+# the first screenshot when no source was set
+screenshot_source = None
+
+# ---------------------------- FUNCTIONS ------------------------------- #
+
+def set_screenshot_source(source):
+    """Set Screenshot Source
+
+    Args:
+        source (function): Takes a (left, top, width, height) region and returns its screenshot as a PIL image,
+            None restores the pyautogui one.
+    """
+    global screenshot_source
+
+    screenshot_source = source
+
+def get_screenshot_source():
+    """Get Screenshot Source
+
+    Returns:
+        function: The screenshot source, pyautogui's when none was set.
+    """
+    global screenshot_source
+
+    if screenshot_source is None:
+        import pyautogui
+        screenshot_source = lambda region: pyautogui.screenshot(region=region)
+    return screenshot_source
+
+def region_of(event):
+    """Region Of
+
+    Args:
+        event (dict): The checkpoint event.
+
+    Returns:
+        tuple: The (left, top, width, height) region of the checkpoint.
+    """
+    return (event['left'], event['top'], event['width'], event['height'])
+
+def pixel_hash(image):
+    """Pixel Hash
+
+    Args:
+        image (PIL.Image.Image): The screenshot of a region.
+
+    Returns:
+        str: The hex digest of its size, mode and pixels.
+    """
+    digest = hashlib.blake2b(digest_size=HASH_BYTES)
+    digest.update(f"{image.mode}:{image.size[0]}x{image.size[1]}:".encode('ascii'))
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+def capture_checkpoint(left, top, width, height, timeout, source=None):
+    """Capture Checkpoint
+
+    Captures the pixel hash of a region of the screen as a checkpoint event.
+
+    Args:
+        left (int): Left of the region.
+        top (int): Top of the region.
+        width (int): Width of the region.
+        height (int): Height of the region.
+        timeout (float): Seconds the replay waits for the region before giving up.
+        source (function): The screenshot source, the current one by default.
+
+    Returns:
+        dict: The checkpoint event, without its time and duration.
+    """
+    image = (source or get_screenshot_source())((left, top, width, height))
+    return {'action': 'checkpoint', 'left': left, 'top': top, 'width': width, 'height': height,
+            'reference': f"{HASH_PREFIX}{pixel_hash(image)}", 'timeout': timeout}
+
+def matches(event, image):
+    """Matches
+
+    Args:
+        event (dict): The checkpoint event.
+        image (PIL.Image.Image): The current screenshot of its region.
+
+    Returns:
+        bool: Whether the region shows what the checkpoint references.
+    """
+    reference = event['reference']
+    if reference.startswith(HASH_PREFIX):
+        return pixel_hash(image) == reference[len(HASH_PREFIX):]
+    if reference.startswith(IMAGE_PREFIX):
+        import pyscreeze
+        needle = os.path.join(f"{SCRIPT_DIR}/data", reference[len(IMAGE_PREFIX):])
+        # current pyscreeze raises when the needle is not found, older versions return None
+        try:
+            return pyscreeze.locate(needle, image) is not None
+        except pyscreeze.ImageNotFoundException:
+            return False
+    raise ValueError(f"unknown checkpoint reference {reference}")
+
+def wait_for_checkpoint(event, wait=None, source=None, clock=time.monotonic, poll_interval=CHECKPOINT_POLL_INTERVAL):
+    """Wait For Checkpoint
+
+    Takes screenshots of the region of a checkpoint until it matches, the timeout runs out or the wait is abandoned.
+
+    Args:
+        event (dict): The checkpoint event.
+        wait (function): Waits the given seconds between screenshots, returning False to abandon, time.sleep by default.
+        source (function): The screenshot source, the current one by default.
+        clock (function): Monotonic clock returning seconds.
+        poll_interval (float): Seconds between screenshots.
+
+    Returns:
+        bool: Whether the region matched.
+    """
+    source = source or get_screenshot_source()
+    region = region_of(event)
+    give_up = clock() + event.get('timeout', 0)
+    while True:
+        if matches(event, source(region)):
+            return True
+        remaining = give_up - clock()
+        if remaining <= 0:
+            logging.warning(f"checkpoint {event['reference']} at {region} not matched in {event.get('timeout', 0)} seconds")
+            return False
+        if wait is None:
+            time.sleep(min(poll_interval, remaining))
+        elif wait(min(poll_interval, remaining)) is False:
+            return False
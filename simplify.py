@@ -0,0 +1,157 @@
+"""Py Replay Path Simplifier
+
+This script reduces the 'moved' events of recordings with a time-aware Ramer-Douglas-Peucker simplification:
+a move is dropped when the cursor position interpolated in time between the kept neighbours is within a pixel
+tolerance of it, and kept moves are never further apart in time than a maximum gap. The first and last moves of
+every run are always kept, so clicks and scrolls land at exactly the same coordinates.
+
+Usage:
+    python simplify.py [recording ...]   (defaults to every recording in the data folder)
+
+Author: Facundo Giacconi AKA "GiacconiDev"
+
+"""
+
+import logging
+import os
+import sys
+
+import storage
+from utils import SCRIPT_DIR
+
+
+# ---------------------------- CONSTANTS ------------------------------- #
+
+SIMPLIFY_TOLERANCE_PX = 3
+SIMPLIFY_MAX_GAP = 0.5
+
+# ---------------------------- FUNCTIONS ------------------------------- #
+
+def synchronized_distance(point, start, end):
+    """Synchronized Distance
+
+    Distance between a point and the position interpolated at its time on the segment between start and end.
+
+    Args:
+        point (tuple): time, x and y of the point.
+        start (tuple): time, x and y of the segment start.
+        end (tuple): time, x and y of the segment end.
+
+    Returns:
+        float: The distance in pixels.
+    """
+    span = end[0] - start[0]
+    ratio = (point[0] - start[0]) / span if span > 0 else 0
+    x = start[1] + (end[1] - start[1]) * ratio
+    y = start[2] + (end[2] - start[2]) * ratio
+    return ((point[1] - x) ** 2 + (point[2] - y) ** 2) ** 0.5
+
+def simplify_run(points, tolerance, max_gap):
+    """Simplify Run
+
+    Selects the points of a run of consecutive moves to keep.
+
+    Args:
+        points (list): time, x and y of every move of the run.
+        tolerance (float): Maximum distance in pixels of a dropped move to the simplified path.
+        max_gap (float): Maximum seconds between two kept moves.
+
+    Returns:
+        list: The sorted indexes of the kept points.
+    """
+    keep = {0, len(points) - 1}
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        worst, worst_distance = first + 1, -1
+        for index in range(first + 1, last):
+            distance = synchronized_distance(points[index], points[first], points[last])
+            if distance > worst_distance:
+                worst, worst_distance = index, distance
+        if worst_distance <= tolerance:
+            if points[last][0] - points[first][0] <= max_gap:
+                continue
+            # path is straight enough but too long in time, split it at its middle instead
+            middle_time = (points[first][0] + points[last][0]) / 2
+            worst = min(range(first + 1, last), key=lambda index: abs(points[index][0] - middle_time))
+        keep.add(worst)
+        stack.append((first, worst))
+        stack.append((worst, last))
+    return sorted(keep)
+
+def simplify_moves(events, tolerance=SIMPLIFY_TOLERANCE_PX, max_gap=SIMPLIFY_MAX_GAP):
+    """Simplify Moves
+
+    Simplifies the runs of consecutive 'moved' events of a recording. The durations of dropped events are carried
+    to the next kept event, so every kept event happens at the same time as before.
+
+    Args:
+        events (list): The recorded events.
+        tolerance (float): Maximum distance in pixels of a dropped move to the simplified path.
+        max_gap (float): Maximum seconds between two kept moves.
+
+    Returns:
+        list: The simplified events.
+    """
+    result = []
+    run = []
+    elapsed = 0
+
+    def flush_run():
+        if not run:
+            return
+        kept = simplify_run([(moment, json_line['x'], json_line['y']) for moment, json_line in run], tolerance, max_gap)
+        previous = None
+        for index in kept:
+            moment, json_line = run[index]
+            json_line = dict(json_line)
+            if previous is not None:
+                json_line['duration'] = moment - previous
+            previous = moment
+            result.append(json_line)
+        run.clear()
+
+    for json_line in events:
+        elapsed += json_line['duration']
+        if json_line['action'] == 'moved':
+            run.append((elapsed, json_line))
+            continue
+        # the last move of a run is always kept, so the duration of the next event does not change
+        flush_run()
+        result.append(json_line)
+    flush_run()
+    return result
+
+def simplify_file(path, output=None, tolerance=SIMPLIFY_TOLERANCE_PX, max_gap=SIMPLIFY_MAX_GAP):
+    """Simplify File
+
+    Simplifies the moves of a recording file, through a temporary file and a rename.
+
+    Args:
+        path (str): The path of the recording.
+        output (str): The path of the simplified recording, the same file by default.
+        tolerance (float): Maximum distance in pixels of a dropped move to the simplified path.
+        max_gap (float): Maximum seconds between two kept moves.
+
+    Returns:
+        dict: events before and after the simplification and the reduction ratio.
+    """
+    events = storage.load_events(path)
+    simplified = simplify_moves(events, tolerance, max_gap)
+    storage.save_events_atomically(output or path, simplified)
+    report = {
+        'events_before': len(events),
+        'events_after': len(simplified),
+        'reduction': 1 - len(simplified) / len(events) if events else 0,
+    }
+    logging.info(f"simplified {path}: {report}")
+    return report
+
+
+if __name__ == "__main__":
+    files = sys.argv[1:] or [os.path.join(f"{SCRIPT_DIR}/data", name) for name in storage.list_recordings(f"{SCRIPT_DIR}/data")]
+    for file in files:
+        report = simplify_file(file)
+        print(f"{file}: {report['events_before']} -> {report['events_after']} events ({report['reduction']:.1%} reduction)")
@@ -0,0 +1,622 @@
+"""Py Replay Storage
+
+This script provides the reading and writing of recorded events files. Besides the original json format
+(a list of dicts), recordings can be stored in a compact binary format made of fixed-width records, one per event,
+and a small interned table with the key and button names used by the recording.
+
+Binary layout (little endian):
+    header: magic (4s), format version (H), record size (H)
+    record: opcode (B), time (d), duration (d), x (i), y (i), arg0 (i), arg1 (i)
+            checkpoints keep their region origin in x and y, their interned reference in arg0 and
+            their interned "<width>x<height>/<timeout>" in arg1 (see screen.py)
+    intern: opcode 0 (B), table index (I), utf-8 name padded to 28 bytes; since version 2 longer names (like the
+            image references of checkpoints) go on in the next intern records with the same table index
+
+Author: Facundo Giacconi AKA "GiacconiDev"
+
+"""
+
+import json
+import os
+import re
+import shutil
+import struct
+import time
+
+
+# ---------------------------- CONSTANTS ------------------------------- #
+
+MAGIC = b"CPYT"
+COMPRESSED_MAGIC = b"CPYZ"
+FORMAT_VERSION = 2
+# Version of the binary recordings without long interned names, readable by older versions
+SHORT_NAMES_VERSION = 1
+
+BINARY_EXTENSION = ".rec"
+JSON_EXTENSION = ".json"
+# Delta encoded and compressed recordings (see codec.py)
+COMPRESSED_EXTENSION = ".recz"
+# Recordings still being captured, renamed to their final name once saved
+TEMP_EXTENSION = ".part"
+# Session stats written next to the recordings
+STATS_EXTENSION = ".stats.json"
+# Time-offset index written next to binary recordings (see index.py)
+INDEX_EXTENSION = ".idx"
+# Playlists of recordings (see playlist.py)
+PLAYLIST_EXTENSION = ".playlist"
+
+HEADER = struct.Struct("<4sHH")
+RECORD = struct.Struct("<B3xdd4i")
+INTERN = struct.Struct("<B3xI28s")
+# Bytes of a name in one intern record
+INTERN_NAME_BYTES = INTERN.size - 8
+
+# Records read per chunk while decoding binary files
+READ_CHUNK_RECORDS = 4096
+
+# Characters read per chunk while streaming json files
+READ_CHUNK_CHARS = 1 << 16
+
+# Streaming writers flush to disk after this many events or seconds, whatever comes first
+FLUSH_EVERY_EVENTS = 256
+FLUSH_EVERY_SECONDS = 1.0
+
+OP_INTERN = 0
+OPCODES = {
+    'pressed_key': 1,
+    'released_key': 2,
+    'moved': 3,
+    'pressed_mouse': 4,
+    'released_mouse': 5,
+    'scroll': 6,
+    'checkpoint': 7,
+}
+ACTIONS = {opcode: action for action, opcode in OPCODES.items()}
+
+# arg1 of key records tells how arg0 must be read
+KEY_BY_NAME = 0
+KEY_BY_VK = 1
+
+JSON_DECODER = json.JSONDecoder()
+JSON_WHITESPACE = re.compile(r"[ \t\n\r]*")
+# Characters a number can go on with, a number followed by one of them may have been cut by a chunk
+JSON_CONTINUATION = frozenset("0123456789.eE+-")
+
+# ---------------------------- FUNCTIONS ------------------------------- #
+
+def encode_event(event, intern):
+    """Encode Event
+
+    Converts an event dict into the fields of a binary record.
+
+    Args:
+        event (dict): The recorded event.
+        intern (function): Returns the table index of a key or button name.
+
+    Returns:
+        tuple: opcode, time, duration, x, y, arg0, arg1.
+    """
+    action = event['action']
+    opcode = OPCODES[action]
+    x = int(event.get('x', 0))
+    y = int(event.get('y', 0))
+    arg0 = arg1 = 0
+
+    if action in ('pressed_key', 'released_key'):
+        if 'key' in event:
+            arg0, arg1 = intern(event['key']), KEY_BY_NAME
+        else:
+            arg0, arg1 = int(event['vk']), KEY_BY_VK
+    elif action in ('pressed_mouse', 'released_mouse'):
+        arg0 = intern(event['button'])
+    elif action == 'scroll':
+        arg0 = int(event.get('vertical_direction', 0))
+        arg1 = int(event.get('horizontal_direction', 0))
+    elif action == 'checkpoint':
+        x, y = int(event['left']), int(event['top'])
+        arg0 = intern(event['reference'])
+        arg1 = intern(f"{int(event['width'])}x{int(event['height'])}/{float(event.get('timeout', 0)):g}")
+
+    return opcode, float(event.get('time', 0)), float(event.get('duration', 0)), x, y, arg0, arg1
+
+def decode_event(fields, table):
+    """Decode Event
+
+    Converts the fields of a binary record into the same event dict the recorder writes in json.
+
+    Args:
+        fields (tuple): opcode, time, duration, x, y, arg0, arg1.
+        table (list): The interned key and button names.
+
+    Returns:
+        dict: The recorded event.
+    """
+    opcode, event_time, duration, x, y, arg0, arg1 = fields
+    action = ACTIONS[opcode]
+
+    if action in ('pressed_key', 'released_key'):
+        if arg1 == KEY_BY_VK:
+            return {'action': action, 'vk': arg0, 'time': event_time, 'duration': duration}
+        return {'action': action, 'key': table[arg0], 'time': event_time, 'duration': duration}
+    if action == 'moved':
+        return {'action': action, 'x': x, 'y': y, 'time': event_time, 'duration': duration}
+    if action in ('pressed_mouse', 'released_mouse'):
+        return {'action': action, 'button': table[arg0], 'x': x, 'y': y, 'time': event_time, 'duration': duration}
+    if action == 'checkpoint':
+        size, _, timeout = table[arg1].partition("/")
+        width, _, height = size.partition("x")
+        return {'action': action, 'left': x, 'top': y, 'width': int(width), 'height': int(height), 'reference': table[arg0],
+                'timeout': float(timeout), 'time': event_time, 'duration': duration}
+    return {'action': action, 'vertical_direction': arg0, 'horizontal_direction': arg1, 'x': x, 'y': y, 'time': event_time, 'duration': duration}
+
+
+class RecordingWriter:
+    """Recording Writer
+
+    Writes events one by one into an append-only binary recording file, flushing it periodically
+    so a crash only loses the last unflushed events.
+
+    Args:
+        path (str): The path of the file to write.
+        flush_every (int): Number of events between flushes.
+        flush_interval (float): Maximum seconds between flushes.
+    """
+
+    def __init__(self, path, flush_every=FLUSH_EVERY_EVENTS, flush_interval=FLUSH_EVERY_SECONDS):
+        self.path = path
+        self.table = {}
+        self.count = 0
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.file = open(path, 'wb')
+        self.file.write(HEADER.pack(MAGIC, SHORT_NAMES_VERSION, RECORD.size))
+        self.version = SHORT_NAMES_VERSION
+        self.last_flush = time.monotonic()
+
+    def intern(self, name):
+        """Intern
+
+        Returns the table index of a name, writing new intern records the first time it is seen. A name longer than
+        one record raises the version of the recording in its header.
+
+        Args:
+            name (str): The key or button name.
+
+        Returns:
+            int: The table index.
+        """
+        index = self.table.get(name)
+        if index is None:
+            pieces = split_name(str(name))
+            if len(pieces) > 1 and self.version < FORMAT_VERSION:
+                self.file.seek(0)
+                self.file.write(HEADER.pack(MAGIC, FORMAT_VERSION, RECORD.size))
+                self.file.seek(0, os.SEEK_END)
+                self.version = FORMAT_VERSION
+            index = len(self.table)
+            self.table[name] = index
+            for piece in pieces:
+                self.file.write(INTERN.pack(OP_INTERN, index, piece))
+        return index
+
+    def write(self, event):
+        """Write
+
+        Appends an event to the recording.
+
+        Args:
+            event (dict): The recorded event.
+        """
+        self.file.write(RECORD.pack(*encode_event(event, self.intern)))
+        self.count += 1
+        if self.count % self.flush_every == 0 or time.monotonic() - self.last_flush > self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Flush
+
+        Pushes the buffered events to the operating system.
+        """
+        self.file.flush()
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        """Close
+
+        Flushes and closes the recording file.
+        """
+        if not self.file.closed:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def new_temp_recording_path(folder):
+    """New Temp Recording Path
+
+    Builds a unique path for a recording still being captured.
+
+    Args:
+        folder (str): The folder where recordings are stored.
+
+    Returns:
+        str: The temporary recording path.
+    """
+    return os.path.join(folder, f"~recording-{os.getpid()}-{time.time_ns()}{BINARY_EXTENSION}{TEMP_EXTENSION}")
+
+def finalize_recording(temp_path, path, compression=None):
+    """Finalize Recording
+
+    Moves a captured recording to its final path. Binary destinations are a plain rename,
+    json and compressed ones are converted from the binary temporary file.
+
+    Args:
+        temp_path (str): The temporary recording path.
+        path (str): The final recording path.
+        compression (str): Codec of compressed recordings, 'zlib' or 'lzma'.
+    """
+    if format_for_path(path) != 'binary':
+        save_events(path, iter_binary_events(temp_path), compression=compression)
+        os.remove(temp_path)
+    else:
+        try:
+            os.replace(temp_path, path)
+        except OSError:
+            # destination on another device, rename is not possible
+            shutil.move(temp_path, path)
+
+def list_recordings(folder):
+    """List Recordings
+
+    Lists the recordings of a folder, skipping recordings still being captured, stats, index and playlist files.
+
+    Args:
+        folder (str): The folder where recordings are stored.
+
+    Returns:
+        list: The sorted file names of the recordings.
+    """
+    return sorted(name for name in os.listdir(folder) if not name.endswith((TEMP_EXTENSION, STATS_EXTENSION, INDEX_EXTENSION, PLAYLIST_EXTENSION)))
+
+def remove_recording(path):
+    """Remove Recording
+
+    Deletes a recording with its index and stats files.
+
+    Args:
+        path (str): The path of the recording.
+    """
+    os.remove(path)
+    folder, name = os.path.split(path)
+    for sidecar in os.listdir(folder or "."):
+        if sidecar.startswith(f"{name}.") and sidecar.endswith((STATS_EXTENSION, INDEX_EXTENSION)):
+            os.remove(os.path.join(folder, sidecar))
+
+def is_binary_recording(path):
+    """Is Binary Recording
+
+    Checks the magic bytes of a file.
+
+    Args:
+        path (str): The path of the recording.
+
+    Returns:
+        bool: True if the file is a binary recording.
+    """
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+def recording_format(path):
+    """Recording Format
+
+    Detects the format of a recording by its magic bytes.
+
+    Args:
+        path (str): The path of the recording.
+
+    Returns:
+        str: 'binary', 'compressed' or 'json'.
+    """
+    with open(path, 'rb') as f:
+        magic = f.read(len(MAGIC))
+    if magic == MAGIC:
+        return 'binary'
+    if magic == COMPRESSED_MAGIC:
+        return 'compressed'
+    return 'json'
+
+def recording_version(path):
+    """Recording Version
+
+    Reads the format version of a recording.
+
+    Args:
+        path (str): The path of the recording.
+
+    Returns:
+        int: The binary format version, 0 for json recordings.
+    """
+    with open(path, 'rb') as f:
+        header = f.read(HEADER.size)
+    if len(header) < HEADER.size or header[:len(MAGIC)] != MAGIC:
+        return 0
+    return HEADER.unpack(header)[1]
+
+def split_name(name):
+    """Split Name
+
+    Args:
+        name (str): A key or button name, or a checkpoint reference.
+
+    Returns:
+        list: Its utf-8 encoding in pieces fitting an intern record, never splitting a character.
+    """
+    pieces = [b""]
+    for character in name:
+        encoded = character.encode('utf-8')
+        if len(pieces[-1]) + len(encoded) > INTERN_NAME_BYTES:
+            pieces.append(b"")
+        pieces[-1] += encoded
+    return pieces
+
+def read_intern(table, record):
+    """Read Intern
+
+    Adds the name of an intern record to the table of a recording, or the rest of the last name to it.
+
+    Args:
+        table (list): The names interned so far.
+        record (tuple): The unpacked intern record.
+    """
+    _, index, encoded = record
+    name = encoded.rstrip(b"\0").decode('utf-8')
+    if index < len(table):
+        table[index] += name
+    else:
+        table.append(name)
+
+def iter_binary_events(path):
+    """Iterate Binary Events
+
+    Reads the events of a binary recording one by one.
+
+    Args:
+        path (str): The path of the recording.
+
+    Yields:
+        dict: The recorded events.
+
+    Raises:
+        ValueError: When the file is not a binary recording of a supported version or has a corrupt record.
+    """
+    with open(path, 'rb') as f:
+        header = f.read(HEADER.size)
+        if len(header) < HEADER.size:
+            raise ValueError(f"{path} is not a binary recording")
+        magic, version, record_size = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a binary recording")
+        if version > FORMAT_VERSION or record_size != RECORD.size:
+            raise ValueError(f"{path} uses unsupported recording format version {version}")
+
+        table = []
+        while True:
+            chunk_start = f.tell()
+            chunk = f.read(RECORD.size * READ_CHUNK_RECORDS)
+            # ignore a trailing partial record (e.g. a recording interrupted mid write)
+            usable = len(chunk) - len(chunk) % RECORD.size
+            for offset in range(0, usable, RECORD.size):
+                try:
+                    if chunk[offset] == OP_INTERN:
+                        read_intern(table, INTERN.unpack_from(chunk, offset))
+                        continue
+                    event = decode_event(RECORD.unpack_from(chunk, offset), table)
+                except (KeyError, IndexError, UnicodeDecodeError) as error:
+                    raise ValueError(f"{path} has a corrupt record at byte {chunk_start + offset}: {error!r}") from None
+                yield event
+            if len(chunk) < RECORD.size * READ_CHUNK_RECORDS:
+                break
+
+def iter_json_events(path, chunk_size=READ_CHUNK_CHARS):
+    """Iterate Json Events
+
+    Reads the events of a json recording (a json array of objects) one by one, decoding each one as soon as it has
+    been read, so only one chunk of the file is held in memory at any time.
+
+    Args:
+        path (str): The path of the recording.
+        chunk_size (int): Characters read at once.
+
+    Yields:
+        dict: The recorded events.
+
+    Raises:
+        ValueError: When the file is not a json array, with the character of the file where it is not.
+    """
+    with open(path, 'r') as f:
+        buffer = ""
+        position = 0
+        # characters of the file dropped from the buffer, buffer positions are file positions minus these
+        consumed = 0
+        eof = False
+
+        def fill():
+            nonlocal buffer, position, consumed, eof
+            chunk = f.read(chunk_size)
+            eof = chunk == ""
+            consumed += position
+            buffer = buffer[position:] + chunk
+            position = 0
+
+        def skip_whitespace():
+            nonlocal position
+            while True:
+                position = JSON_WHITESPACE.match(buffer, position).end()
+                if position < len(buffer) or eof:
+                    return
+                fill()
+
+        fill()
+        skip_whitespace()
+        if buffer[position:position + 1] != "[":
+            raise ValueError(f"{path} is not a json recording")
+        position += 1
+        expect_value = True
+        after_comma = False
+
+        while True:
+            skip_whitespace()
+            if position >= len(buffer):
+                raise ValueError(f"{path} ends before the end of its events")
+            if buffer[position] == "]" and not after_comma:
+                return
+            if not expect_value:
+                if buffer[position] != ",":
+                    raise ValueError(f"{path} has an unexpected {buffer[position]!r} at character {consumed + position}")
+                position += 1
+                expect_value = after_comma = True
+                continue
+            try:
+                event, end = JSON_DECODER.raw_decode(buffer, position)
+                # a value touching the end of the buffer, or a number followed by what could be more of it
+                # (2 of 2.5), may continue in the next chunk
+                complete = eof or (end < len(buffer) and buffer[end] not in JSON_CONTINUATION)
+            except json.JSONDecodeError as error:
+                if eof:
+                    raise ValueError(f"{path} is not valid json at character {consumed + error.pos}: {error.msg}") from None
+                complete = False
+            if not complete:
+                fill()
+                continue
+            position = end
+            expect_value = after_comma = False
+            yield event
+
+def iter_events(path):
+    """Iterate Events
+
+    Reads the events of a recording, detecting binary and compressed recordings and falling back to json ones.
+
+    Args:
+        path (str): The path of the recording.
+
+    Yields:
+        dict: The recorded events.
+    """
+    file_format = recording_format(path)
+    if file_format == 'binary':
+        yield from iter_binary_events(path)
+    elif file_format == 'compressed':
+        import codec
+        yield from codec.iter_compressed_events(path)
+    else:
+        yield from iter_json_events(path)
+
+def load_events(path):
+    """Load Events
+
+    Loads all the events of a recording, whatever its format.
+
+    Args:
+        path (str): The path of the recording.
+
+    Returns:
+        list: The recorded events.
+    """
+    return list(iter_events(path))
+
+def recording_info(path):
+    """Recording Info
+
+    Reads the metadata of a recording: format, size, number of events by action and duration.
+
+    Args:
+        path (str): The path of the recording.
+
+    Returns:
+        dict: The recording metadata.
+    """
+    file_format = recording_format(path)
+    version = recording_version(path)
+    counts = {}
+    events_count = 0
+    duration = 0
+    for event in iter_events(path):
+        counts[event['action']] = counts.get(event['action'], 0) + 1
+        events_count += 1
+        duration += event['duration']
+    return {
+        'format': file_format,
+        'version': version,
+        'bytes': os.path.getsize(path),
+        'events': events_count,
+        'counts': counts,
+        'duration': duration,
+    }
+
+def format_for_path(path):
+    """Format For Path
+
+    Args:
+        path (str): The path of a recording.
+
+    Returns:
+        str: The format its extension stands for: 'json', 'compressed' or 'binary'.
+    """
+    if path.lower().endswith(JSON_EXTENSION):
+        return 'json'
+    if path.lower().endswith(COMPRESSED_EXTENSION):
+        return 'compressed'
+    return 'binary'
+
+def save_events(path, events, file_format=None, compression=None):
+    """Save Events
+
+    Saves events choosing the format by the file extension: json for '.json' files, compressed for '.recz' files,
+    binary otherwise.
+
+    Args:
+        path (str): The path of the file to write.
+        events (iterable): The recorded events.
+        file_format (str): Forces the format, chosen by the extension by default.
+        compression (str): Codec of compressed recordings, 'zlib' or 'lzma', zlib by default.
+    """
+    file_format = file_format or format_for_path(path)
+    if file_format == 'json':
+        with open(path, 'w+') as outfile:
+            json.dump(list(events), outfile)
+        return
+
+    if file_format == 'compressed':
+        import codec
+        writer = codec.CompressedWriter(path, compression or 'zlib')
+    else:
+        writer = RecordingWriter(path)
+    with writer:
+        for event in events:
+            writer.write(event)
+
+def save_events_atomically(path, events, compression=None):
+    """Save Events Atomically
+
+    Saves events like save_events, through a temporary file renamed over the destination once complete,
+    so readers never see a half written recording.
+
+    Args:
+        path (str): The path of the file to write.
+        events (iterable): The recorded events.
+        compression (str): Codec of compressed recordings, 'zlib' or 'lzma'.
+    """
+    folder, name = os.path.split(path)
+    temp_path = os.path.join(folder, f"~{name}.{os.getpid()}{TEMP_EXTENSION}")
+    try:
+        save_events(temp_path, events, format_for_path(path), compression)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
@@ -0,0 +1,12 @@
+"""Py Replay Tests Configuration
+
+Makes the modules of the repository importable from the tests.
+
+Author: Facundo Giacconi AKA "GiacconiDev"
+
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,22 @@
+"""Py Replay Bench Tests
+
+Checks the benchmarks leave the modules they drive as they found them.
+
+Author: Facundo Giacconi AKA "GiacconiDev"
+
+"""
+
+import bench
+import record
+
+
+# ---------------------------- FUNCTIONS ------------------------------- #
+
+def test_bench_callbacks_restores_the_recorder():
+    recorder_state = {name: getattr(record, name) for name in bench.RECORDER_GLOBALS}
+
+    results = bench.bench_callbacks(500)
+
+    assert set(results) == {'queued', 'direct'}
+    for name, value in recorder_state.items():
+        assert getattr(record, name) is value, name
@@ -0,0 +1,84 @@
+"""Py Replay Codec Tests
+
+Round trips recordings through the compressed format with both codecs.
+
+Author: Facundo Giacconi AKA "GiacconiDev"
+
+"""
+
+import os
+
+import pytest
+
+import bench
+import codec
+import storage
+
+
+# ---------------------------- CONSTANTS ------------------------------- #
+
+# Most seconds a duration moves in a round trip, half a nanosecond and the float rounding
+DURATION_TOLERANCE = 1e-9
+
+# Most seconds an epoch time moves in a round trip, its float64 nanoseconds are spaced 256 ns apart
+TIME_TOLERANCE = 1e-6
+
+# ---------------------------- FUNCTIONS ------------------------------- #
+
+def assert_round_trip(events, decoded):
+    assert len(decoded) == len(events)
+    for event, back in zip(events, decoded):
+        assert back.keys() == event.keys()
+        assert {key: value for key, value in back.items() if key not in ('time', 'duration')} == \
+               {key: value for key, value in event.items() if key not in ('time', 'duration')}
+        assert abs(back['duration'] - event['duration']) <= DURATION_TOLERANCE
+        assert abs(back['time'] - event['time']) <= TIME_TOLERANCE
+
+def recording(count):
+    events = []
+    for position, event in enumerate(bench.synthetic_events(count, 0.35)):
+        events.append(dict(event, time=1700000000.0 + event['time']))
+        if position == count // 2:
+            events.append({'action': 'checkpoint', 'left': 100, 'top': 200, 'width': 64, 'height': 48,
+                           'reference': f"image:{'long_reference_' * 4}.png", 'timeout': 12.5,
+                           'time': 1700000000.0 + event['time'], 'duration': 0.5})
+    return events
+
+@pytest.mark.parametrize("compression", sorted(codec.CODECS))
+@pytest.mark.parametrize("count", [0, 1, codec.BLOCK_EVENTS * 2 + 5])
+def test_compressed_round_trip(tmp_path, compression, count):
+    events = recording(count) if count else []
+    path = os.path.join(tmp_path, "recording.recz")
+    storage.save_events(path, events, compression=compression)
+
+    assert storage.recording_format(path) == 'compressed'
+    assert_round_trip(events, storage.load_events(path))
+
+@pytest.mark.parametrize("compression", sorted(codec.CODECS))
+def test_compressed_times_are_quantised_to_the_nanosecond(tmp_path, compression):
+    events = [{'action': 'moved', 'x': 1, 'y': 2, 'time': 0.35, 'duration': 0.35}]
+    path = os.path.join(tmp_path, "quantised.recz")
+    storage.save_events(path, events, compression=compression)
+
+    decoded = storage.load_events(path)[0]
+    assert decoded['duration'] == round(0.35 * 1e9) / 1e9
+    assert decoded['time'] == round(0.35 * 1e9) / 1e9
+
+@pytest.mark.parametrize("compression", sorted(codec.CODECS))
+def test_compressed_is_smaller_than_binary(tmp_path, compression):
+    events = recording(5000)
+    binary_path = os.path.join(tmp_path, "recording.rec")
+    compressed_path = os.path.join(tmp_path, "recording.recz")
+    storage.save_events(binary_path, events)
+    storage.save_events(compressed_path, storage.iter_events(binary_path), compression=compression)
+
+    assert os.path.getsize(compressed_path) < os.path.getsize(binary_path) / 4
+    assert_round_trip(events, storage.load_events(compressed_path))
+
+def test_compressed_truncated_recording(tmp_path):
+    path = os.path.join(tmp_path, "truncated.recz")
+    storage.save_events(path, recording(codec.BLOCK_EVENTS + 10), compression='zlib')
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) // 2)
+    with pytest.raises(ValueError):
+        storage.load_events(path)
@@ -0,0 +1,190 @@
+"""Py Replay Control Tests
+
+Drives replay sessions through their control with the bench fake controllers.
+
+Author: Facundo Giacconi AKA "GiacconiDev"
+
+"""
+
+import os
+import threading
+import time
+
+import pytest
+
+import bench
+import plan
+import replay
+import storage
+from control import STOP_LATENCY_MS, ReplayControl
+from scheduler import DeadlineScheduler
+
+
+# ---------------------------- CONSTANTS ------------------------------- #
+
+# Seconds a test waits for the replay thread to reach a state
+STATE_TIMEOUT = 5.0
+
+# ---------------------------- FUNCTIONS ------------------------------- #
+
+class LoggingKeyboardController(bench.FakeKeyboardController):
+    """Logging Keyboard Controller
+
+    Fake keyboard controller keeping the calls it gets.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def press(self, key):
+        super().press(key)
+        self.calls.append(('press', key))
+
+    def release(self, key):
+        super().release(key)
+        self.calls.append(('release', key))
+
+
+class LoggingMouseController(bench.FakeMouseController):
+    """Logging Mouse Controller
+
+    Fake mouse controller keeping the presses and releases it gets.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    def press(self, button):
+        super().press(button)
+        self.calls.append(('press', button))
+
+    def release(self, button):
+        super().release(button)
+        self.calls.append(('release', button))
+
+
+def wait_for(condition):
+    give_up = time.monotonic() + STATE_TIMEOUT
+    while not condition():
+        assert time.monotonic() < give_up
+        time.sleep(0.001)
+
+def start_waiting(control, deadline):
+    """Start Waiting
+
+    Waits for a deadline through the control on a thread of its own.
+
+    Args:
+        control (ReplayControl): The control of the session.
+        deadline (float): Seconds from the start of the schedule to the event.
+
+    Returns:
+        tuple: The thread and the list its lateness and return time are appended to.
+    """
+    result = []
+    scheduler = DeadlineScheduler()
+
+    def wait_thread_function():
+        late = control.wait_until(scheduler, deadline)
+        result.append((late, time.perf_counter()))
+
+    wait_thread = threading.Thread(target=wait_thread_function, daemon=True)
+    wait_thread.start()
+    return wait_thread, result
+
+@pytest.mark.parametrize("pause_first", [False, True])
+def test_cancel_latency(pause_first):
+    latencies = []
+    for _ in range(5):
+        control = ReplayControl()
+        control.attach(LoggingKeyboardController(), LoggingMouseController())
+        if pause_first:
+            control.pause()
+        wait_thread, result = start_waiting(control, 60)
+        time.sleep(0.05)
+        cancelled_at = time.perf_counter()
+        control.cancel()
+        wait_thread.join(STATE_TIMEOUT)
+        late, returned_at = result[0]
+        assert late is None
+        latencies.append(returned_at - cancelled_at)
+    # the best of a few runs, so a busy machine descheduling the thread once does not fail the test
+    assert min(latencies) * 1000 < STOP_LATENCY_MS
+
+def test_pause_releases_the_held_keys_and_resume_presses_them_again():
+    keyboard, mouse = LoggingKeyboardController(), LoggingMouseController()
+    control = ReplayControl()
+    control.attach(keyboard, mouse)
+    control.executed('pressed_key', (bench.FakeKey.shift,))
+    control.executed('pressed_key', (bench.FakeKey.ctrl,))
+    control.executed('released_key', (bench.FakeKey.ctrl,))
+    control.executed('pressed_mouse', (bench.FakeButton.left,))
+
+    control.pause()
+    wait_thread, result = start_waiting(control, 0)
+    wait_for(lambda: len(keyboard.calls) + len(mouse.calls) == 2)
+    # the last pressed is released first, the released ctrl is not touched
+    assert mouse.calls == [('release', bench.FakeButton.left)]
+    assert keyboard.calls == [('release', bench.FakeKey.shift)]
+    assert not result
+
+    control.resume()
+    wait_thread.join(STATE_TIMEOUT)
+    assert result and result[0][0] is not None
+    assert keyboard.calls[1:] == [('press', bench.FakeKey.shift)]
+    assert mouse.calls[1:] == [('press', bench.FakeButton.left)]
+    assert list(control.held) == [('pressed_key', (bench.FakeKey.shift,)), ('pressed_mouse', (bench.FakeButton.left,))]
+
+def test_cancel_while_paused_forgets_the_held_keys():
+    keyboard, mouse = LoggingKeyboardController(), LoggingMouseController()
+    control = ReplayControl()
+    control.attach(keyboard, mouse)
+    control.executed('pressed_key', (bench.FakeKey.shift,))
+
+    control.pause()
+    wait_thread, result = start_waiting(control, 0)
+    wait_for(lambda: keyboard.calls)
+    control.cancel()
+    wait_thread.join(STATE_TIMEOUT)
+
+    assert result[0][0] is None
+    assert keyboard.calls == [('release', bench.FakeKey.shift)]
+    assert control.held == {}
+
+def test_step_runs_exactly_one_event(tmp_path):
+    path = os.path.join(tmp_path, "stepped.rec")
+    events = [{'action': 'moved', 'x': i, 'y': i, 'time': i * 0.01, 'duration': 0.01} for i in range(20)]
+    storage.save_events(path, events)
+    plan.clear_plan_cache()
+    keyboard, mouse = replay.get_controllers(LoggingKeyboardController, LoggingMouseController)
+    injected = mouse.injected
+    control = ReplayControl()
+    control.pause()
+
+    replay_thread = threading.Thread(target=replay.replay_events, daemon=True,
+                                     args=(LoggingKeyboardController, LoggingMouseController, bench.FakeButton,
+                                           bench.FakeKey, path, bench.FakeKeyCode), kwargs={'session': control})
+    replay_thread.start()
+    try:
+        time.sleep(0.1)
+        assert mouse.injected == injected
+
+        for steps in range(1, 4):
+            control.step()
+            wait_for(lambda: mouse.injected == injected + steps)
+            # the replay stays paused after the stepped event
+            time.sleep(0.1)
+            assert mouse.injected == injected + steps
+            assert mouse.position == (steps - 1, steps - 1)
+    finally:
+        control.cancel()
+        replay_thread.join(STATE_TIMEOUT)
+    assert not replay_thread.is_alive()
+    assert mouse.injected == injected + 3
+
+def test_step_pauses_a_playing_replay():
+    control = ReplayControl()
+    control.step()
+    assert control.paused and control.steps == 0
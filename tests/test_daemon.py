@@ -0,0 +1,128 @@
+"""Py Replay Daemon Tests
+
+Runs a replay daemon on a temporary socket with fake controllers and drives it through send_command.
+
+Author: Facundo Giacconi AKA "GiacconiDev"
+
+"""
+
+import os
+import tempfile
+import threading
+import time
+
+import pytest
+
+import bench
+import daemon
+import replay
+import storage
+from control import ReplayControl
+
+
+# ---------------------------- CONSTANTS ------------------------------- #
+
+CONTROLLERS = (bench.FakeKeyboardController, bench.FakeMouseController, bench.FakeButton, bench.FakeKey, bench.FakeKeyCode)
+
+# Seconds a test waits for the daemon to reach a state
+STATE_TIMEOUT = 5.0
+
+# ---------------------------- FUNCTIONS ------------------------------- #
+
+@pytest.fixture
+def socket_path():
+    """Socket Path
+
+    Serves a daemon over a data folder with a long and a short recording, on a temporary socket.
+
+    Yields:
+        str: The path of the socket.
+    """
+    with tempfile.TemporaryDirectory() as folder:
+        storage.save_events(os.path.join(folder, "long.rec"), bench.synthetic_events(100, 0.1))
+        storage.save_events(os.path.join(folder, "short.rec"), bench.synthetic_events(20, 0))
+        path = os.path.join(folder, "daemon.sock")
+        listening = threading.Event()
+        servers = []
+
+        def ready(server):
+            servers.append(server)
+            listening.set()
+
+        serve_thread = threading.Thread(target=daemon.serve, args=(path, folder, CONTROLLERS, ready), daemon=True)
+        serve_thread.start()
+        assert listening.wait(STATE_TIMEOUT)
+        try:
+            yield path
+        finally:
+            servers[0].shutdown()
+            serve_thread.join(STATE_TIMEOUT)
+        assert not os.path.exists(path)
+
+def wait_for_status(socket_path, condition):
+    """Wait For Status
+
+    Args:
+        socket_path (str): The path of the socket.
+        condition (function): Takes a status response and returns whether it is the expected one.
+
+    Returns:
+        dict: The first status response meeting the condition.
+    """
+    give_up = time.monotonic() + STATE_TIMEOUT
+    while True:
+        status = daemon.send_command({'command': "status"}, socket_path)
+        if condition(status) or time.monotonic() > give_up:
+            return status
+        time.sleep(0.01)
+
+def test_play_status_and_stop(socket_path):
+    gui_control = replay.control = ReplayControl()
+    try:
+        response = daemon.send_command({'command': "play", 'file': "long.rec"}, socket_path)
+        assert response == {'ok': True, 'playing': "long.rec"}
+
+        status = daemon.send_command({'command': "status"}, socket_path)
+        assert status['ok'] and status['current']['file'] == "long.rec"
+        assert status['current']['state'] == "playing"
+
+        assert daemon.send_command({'command': "play", 'file': "short.rec"}, socket_path)['ok'] is False
+
+        assert daemon.send_command({'command': "stop"}, socket_path) == {'ok': True, 'stopped': "long.rec"}
+        assert wait_for_status(socket_path, lambda status: status['current'] is None)['current'] is None
+        # the daemon only cancels its own session
+        assert not gui_control.cancelled
+    finally:
+        replay.control = None
+
+def test_invalid_request_leaves_the_daemon_free(socket_path):
+    response = daemon.send_command({'command': "play", 'file': "short.rec", 'speed': "fast"}, socket_path)
+    assert response['ok'] is False
+    assert daemon.send_command({'command': "play", 'file': "short.rec", 'loops': 0}, socket_path)['ok'] is False
+    assert daemon.send_command({'command': "status"}, socket_path)['current'] is None
+    assert daemon.send_command({'command': "play", 'file': "short.rec"}, socket_path)['ok'] is True
+
+def test_unknown_command_and_file(socket_path):
+    assert daemon.send_command({'command': "rewind"}, socket_path)['ok'] is False
+    assert daemon.send_command({'command': "play", 'file': "missing.rec"}, socket_path)['ok'] is False
+
+def test_schedule_and_cancel(socket_path):
+    schedule = daemon.send_command({'command': "play", 'file': "short.rec", 'delay': 60, 'every': 60}, socket_path)['schedule']
+    schedules = daemon.send_command({'command': "status"}, socket_path)['schedules']
+    assert [(entry['schedule'], entry['file'], entry['every']) for entry in schedules] == [(schedule, "short.rec", 60)]
+
+    assert daemon.send_command({'command': "stop", 'schedule': schedule}, socket_path) == {'ok': True, 'cancelled': 1}
+    assert daemon.send_command({'command': "status"}, socket_path)['schedules'] == []
+
+def test_scheduled_replay_runs(socket_path):
+    keyboard, mouse = replay.get_controllers(bench.FakeKeyboardController, bench.FakeMouseController)
+    injected = keyboard.injected + mouse.injected
+    daemon.send_command({'command': "play", 'file': "short.rec", 'delay': 0.05}, socket_path)
+    status = wait_for_status(socket_path, lambda status: not status['schedules'] and status['current'] is None
+                             and keyboard.injected + mouse.injected > injected)
+    assert status['schedules'] == [] and status['current'] is None
+    assert keyboard.injected + mouse.injected > injected
+
+def test_list(socket_path):
+    response = daemon.send_command({'command': "list"}, socket_path)
+    assert response['ok'] and sorted(entry['file'] for entry in response['recordings']) == ["long.rec", "short.rec"]
@@ -0,0 +1,71 @@
+"""Py Replay Engine Tests
+
+Replays synthetic recordings through asyncio sessions with fake controllers.
+
+Author: Facundo Giacconi AKA "GiacconiDev"
+
+"""
+
+import asyncio
+import os
+
+import bench
+import engine
+import plan
+import storage
+
+
+# ---------------------------- FUNCTIONS ------------------------------- #
+
+def new_session(plan_cache=None):
+    return engine.ReplaySession(bench.FakeKeyboardController(), bench.FakeMouseController(), bench.FakeKey,
+                                bench.FakeKeyCode, bench.FakeButton, plan_cache)
+
+def test_sessions_cache_their_own_plans(tmp_path):
+    path = os.path.join(tmp_path, "fast.rec")
+    storage.save_events(path, bench.synthetic_events(200, 0))
+    plan.clear_plan_cache()
+    session = new_session()
+
+    report = asyncio.run(session.play(path, loops=2))
+
+    assert report['events'] == 200
+    assert len(session.plan_cache) == 1
+    assert len(plan.plan_cache) == 0
+    # both passes are replayed, then the keys the synthetic recording left pressed are released
+    assert session.keyboard.injected + session.mouse.injected >= 400
+
+def test_cancel_closes_the_plan_being_compiled(tmp_path, monkeypatch):
+    path = os.path.join(tmp_path, "slow.json")
+    storage.save_events(path, bench.synthetic_events(2000, 0.005))
+    closed = []
+    cache_operations = plan.cache_operations
+
+    def tracked_cache_operations(*args, **kwargs):
+        try:
+            yield from cache_operations(*args, **kwargs)
+        finally:
+            closed.append(True)
+
+    monkeypatch.setattr(plan, "cache_operations", tracked_cache_operations)
+    session = new_session()
+
+    async def play_and_cancel():
+        task = asyncio.create_task(session.play(path))
+        await asyncio.sleep(0.2)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        # a batch still compiling on its worker thread closes the plan when done
+        for _ in range(100):
+            if closed:
+                break
+            await asyncio.sleep(0.01)
+
+    asyncio.run(play_and_cancel())
+
+    assert closed == [True]
+    assert not session.playing
+    assert len(session.plan_cache) == 0
@@ -0,0 +1,96 @@
+"""Py Replay Index Tests
+
+Checks seeks through the index of binary recordings against a linear scan of the events.
+
+Author: Facundo Giacconi AKA "GiacconiDev"
+
+"""
+
+import os
+
+import pytest
+
+import bench
+import index
+import storage
+
+
+# ---------------------------- CONSTANTS ------------------------------- #
+
+EVENT_COUNT = index.CHECKPOINT_INTERVAL * 4 + 37
+
+# Seconds between the synthetic events, not a power of two so the sums are rounded
+EVENT_INTERVAL = 0.013
+
+START_INDICES = (0, 1, index.CHECKPOINT_INTERVAL - 1, index.CHECKPOINT_INTERVAL, index.CHECKPOINT_INTERVAL * 2 + 5,
+                 EVENT_COUNT - 1, EVENT_COUNT, EVENT_COUNT + 10)
+
+START_TIMES = (0, 0.005, EVENT_INTERVAL * index.CHECKPOINT_INTERVAL, EVENT_INTERVAL * 700.5,
+               EVENT_INTERVAL * (EVENT_COUNT - 1), EVENT_INTERVAL * EVENT_COUNT * 2)
+
+# ---------------------------- FUNCTIONS ------------------------------- #
+
+@pytest.fixture
+def recording(tmp_path):
+    path = os.path.join(tmp_path, "recording.rec")
+    storage.save_events(path, bench.synthetic_events(EVENT_COUNT, EVENT_INTERVAL))
+    return path
+
+def linear_seek(path, start_time=None, start_index=None):
+    return list(index.seek_events(storage.iter_events(path), start_time, start_index))
+
+@pytest.mark.parametrize("start_index", START_INDICES)
+def test_seek_by_index_matches_a_linear_scan(recording, start_index):
+    seeked = list(index.iter_events_from(recording, start_index=start_index))
+    assert os.path.exists(index.index_path(recording))
+    assert seeked == linear_seek(recording, start_index=start_index)
+
+@pytest.mark.parametrize("start_time", START_TIMES)
+def test_seek_by_time_matches_a_linear_scan(recording, start_time):
+    assert list(index.iter_events_from(recording, start_time=start_time)) == linear_seek(recording, start_time=start_time)
+
+def test_seek_restores_the_held_state(recording):
+    seeked = list(index.iter_events_from(recording, start_index=index.CHECKPOINT_INTERVAL + 3))
+    # the synthetic recording never releases the vk key, the restore presses it again without waiting
+    assert seeked[0]['action'] == 'moved' and seeked[0]['duration'] == 0
+    assert any(event.get('vk') == 65 and event['action'] == 'pressed_key' and event['duration'] == 0 for event in seeked[1:5])
+
+def test_seek_without_a_start_reads_everything(recording):
+    assert list(index.iter_events_from(recording)) == storage.load_events(recording)
+    assert not os.path.exists(index.index_path(recording))
+
+def test_stale_index_is_rebuilt(recording):
+    index.build_index(recording)
+    stale = index.RecordingIndex(recording)
+    stale_count = stale.count
+    stale.close()
+
+    # a recording saved again with more events no longer matches the size and mtime of the index
+    storage.save_events(recording, bench.synthetic_events(EVENT_COUNT * 2, EVENT_INTERVAL))
+    with pytest.raises(ValueError, match="is stale"):
+        index.RecordingIndex(recording)
+
+    start_index = EVENT_COUNT + 50
+    assert list(index.iter_events_from(recording, start_index=start_index)) == linear_seek(recording, start_index=start_index)
+    rebuilt = index.RecordingIndex(recording)
+    try:
+        assert rebuilt.count > stale_count
+    finally:
+        rebuilt.close()
+
+def test_stale_mtime_alone_rebuilds_the_index(recording):
+    index.build_index(recording)
+    stat = os.stat(recording)
+    os.utime(recording, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    with pytest.raises(ValueError, match="is stale"):
+        index.RecordingIndex(recording)
+
+    assert list(index.iter_events_from(recording, start_index=3)) == linear_seek(recording, start_index=3)
+    index.RecordingIndex(recording).close()
+
+def test_corrupt_index_is_rebuilt(recording):
+    with open(index.index_path(recording), 'wb') as f:
+        f.write(b"not an index")
+    start_time = EVENT_INTERVAL * 300
+    assert list(index.iter_events_from(recording, start_time=start_time)) == linear_seek(recording, start_time=start_time)
+    index.RecordingIndex(recording).close()
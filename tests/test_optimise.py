@@ -0,0 +1,60 @@
+"""Py Replay Optimiser Tests
+
+Runs the optimisation passes over events built the way the recorder writes them.
+
+Author: Facundo Giacconi AKA "GiacconiDev"
+
+"""
+
+import bench
+import optimise
+import record
+
+
+# ---------------------------- FUNCTIONS ------------------------------- #
+
+def key_event(action, key, duration=0.1):
+    return record.normalise_key(action, key, 0, duration)
+
+def move_event(x, y, duration=0.1):
+    return {'action': 'moved', 'x': x, 'y': y, 'time': 0, 'duration': duration}
+
+def test_idle_trim_drops_the_leading_moves_but_the_last_one():
+    events = [move_event(x, 0, 2.0) for x in range(5)] + [
+        {'action': 'pressed_mouse', 'button': 'left', 'x': 4, 'y': 0, 'time': 0, 'duration': 1.5},
+        {'action': 'released_mouse', 'button': 'left', 'x': 4, 'y': 0, 'time': 0, 'duration': 0.1},
+        move_event(9, 9, 3.0),
+    ]
+
+    trimmed, reports = optimise.optimise_events(events, ["idle_trim"], {})
+
+    assert [event['action'] for event in trimmed] == ['moved', 'pressed_mouse', 'released_mouse']
+    assert (trimmed[0]['x'], trimmed[0]['duration'], trimmed[1]['duration']) == (4, 0, 0)
+    assert reports == [{'pass': "idle_trim", 'events_saved': 5, 'seconds_saved': 14.5}]
+
+def test_idle_trim_keeps_recordings_without_meaningful_events():
+    events = [move_event(x, 0, 1.0) for x in range(3)]
+    assert optimise.idle_trim(events, {}) == [dict(events[0], duration=0)] + events[1:]
+
+def test_stop_key_scrub_drops_the_modifiers_left_pressed():
+    # typing the stop recording key with ctrl and shift leaves only their presses, the recorder stops on the key itself
+    events = [
+        key_event('pressed_key', bench.FakeCharKey('a')),
+        key_event('released_key', bench.FakeCharKey('a')),
+        key_event('pressed_key', bench.FakeKey.ctrl),
+        key_event('pressed_key', bench.FakeKey.shift),
+        move_event(1, 1),
+    ]
+    assert events[3] == {'action': 'pressed_key', 'key': 'shift', 'time': 0, 'duration': 0.1}
+
+    scrubbed = optimise.stop_key_scrub(events, {})
+
+    assert [event['action'] for event in scrubbed] == ['pressed_key', 'released_key', 'moved']
+    # the dropped presses carry their wait to the next event
+    assert abs(scrubbed[2]['duration'] - 0.3) < 1e-9
+
+def test_stop_key_scrub_keeps_released_modifiers_and_the_ones_before_other_keys():
+    events = [key_event('pressed_key', bench.FakeKey.shift), key_event('pressed_key', bench.FakeCharKey('A'))]
+    assert optimise.stop_key_scrub(events, {}) == events
+    events = [key_event('pressed_key', bench.FakeKey.shift), key_event('released_key', bench.FakeKey.shift)]
+    assert optimise.stop_key_scrub(events, {}) == events
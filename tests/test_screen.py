@@ -0,0 +1,124 @@
+"""Py Replay Screen Tests
+
+Checks the checkpoints against a fake screenshot source and a fake clock, so no display is needed.
+
+Author: Facundo Giacconi AKA "GiacconiDev"
+
+"""
+
+import os
+import sys
+import types
+
+import screen
+
+
+# ---------------------------- CONSTANTS ------------------------------- #
+
+REGION = (10, 20, 4, 4)
+
+# ---------------------------- FUNCTIONS ------------------------------- #
+
+class FakeImage:
+    """Fake Image
+
+    The part of a PIL image the pixel hash reads.
+    """
+
+    def __init__(self, pixels, mode="RGB", size=(4, 4)):
+        self.pixels = pixels
+        self.mode = mode
+        self.size = size
+
+    def tobytes(self):
+        return self.pixels
+
+
+class FakeScreen:
+    """Fake Screen
+
+    Screenshot source returning the given images one per screenshot, the last one from then on, and a clock that
+    only moves when waited.
+    """
+
+    def __init__(self, *images):
+        self.images = list(images)
+        self.screenshots = []
+        self.now = 0.0
+
+    def __call__(self, region):
+        self.screenshots.append(region)
+        return self.images[min(len(self.screenshots), len(self.images)) - 1]
+
+    def clock(self):
+        return self.now
+
+    def wait(self, seconds):
+        self.now += seconds
+        return True
+
+
+def checkpoint(image, timeout=1):
+    return screen.capture_checkpoint(*REGION, timeout, source=lambda region: image)
+
+def test_capture_checkpoint_references_the_pixel_hash():
+    event = checkpoint(FakeImage(b"a" * 48), timeout=5)
+    assert event['reference'].startswith(screen.HASH_PREFIX)
+    assert screen.region_of(event) == REGION
+    assert event['timeout'] == 5
+    assert event['reference'] != checkpoint(FakeImage(b"b" * 48))['reference']
+
+def test_wait_for_checkpoint_matches_right_away():
+    fake = FakeScreen(FakeImage(b"a" * 48))
+    assert screen.wait_for_checkpoint(checkpoint(FakeImage(b"a" * 48)), fake.wait, fake, fake.clock)
+    assert fake.screenshots == [REGION]
+    assert fake.now == 0
+
+def test_wait_for_checkpoint_times_out_on_a_mismatch():
+    fake = FakeScreen(FakeImage(b"b" * 48))
+    assert not screen.wait_for_checkpoint(checkpoint(FakeImage(b"a" * 48), timeout=1), fake.wait, fake, fake.clock, poll_interval=0.25)
+    assert fake.now == 1
+    assert len(fake.screenshots) == 5
+
+def test_wait_for_checkpoint_matches_after_a_few_polls():
+    fake = FakeScreen(FakeImage(b"b" * 48), FakeImage(b"c" * 48), FakeImage(b"a" * 48))
+    assert screen.wait_for_checkpoint(checkpoint(FakeImage(b"a" * 48)), fake.wait, fake, fake.clock, poll_interval=0.1)
+    assert len(fake.screenshots) == 3
+    assert abs(fake.now - 0.2) < 1e-9
+
+def test_wait_for_checkpoint_stops_when_the_wait_is_abandoned():
+    fake = FakeScreen(FakeImage(b"b" * 48))
+    assert not screen.wait_for_checkpoint(checkpoint(FakeImage(b"a" * 48)), lambda seconds: False, fake, fake.clock)
+    assert len(fake.screenshots) == 1
+
+def test_image_checkpoint_polls_until_the_image_is_located(monkeypatch):
+    class ImageNotFoundException(Exception):
+        pass
+
+    located = []
+
+    def locate(needle, image):
+        located.append((needle, image.tobytes()))
+        if image.tobytes() != b"a" * 48:
+            raise ImageNotFoundException()
+        return (1, 1, 2, 2)
+
+    pyscreeze = types.SimpleNamespace(locate=locate, ImageNotFoundException=ImageNotFoundException)
+    monkeypatch.setitem(sys.modules, "pyscreeze", pyscreeze)
+    event = dict(checkpoint(FakeImage(b"a" * 48)), reference=f"{screen.IMAGE_PREFIX}login_button.png")
+
+    fake = FakeScreen(FakeImage(b"b" * 48), FakeImage(b"b" * 48), FakeImage(b"a" * 48))
+    assert screen.wait_for_checkpoint(event, fake.wait, fake, fake.clock, poll_interval=0.1)
+    assert len(located) == 3
+    assert located[0][0].endswith(os.path.join("data", "login_button.png"))
+
+    # a miss until the timeout gives up instead of raising
+    fake = FakeScreen(FakeImage(b"b" * 48))
+    assert not screen.wait_for_checkpoint(event, fake.wait, fake, fake.clock, poll_interval=0.5)
+    assert fake.now == 1
+
+def test_image_checkpoint_with_a_pyscreeze_returning_none(monkeypatch):
+    pyscreeze = types.SimpleNamespace(locate=lambda needle, image: None, ImageNotFoundException=LookupError)
+    monkeypatch.setitem(sys.modules, "pyscreeze", pyscreeze)
+    event = dict(checkpoint(FakeImage(b"a" * 48)), reference=f"{screen.IMAGE_PREFIX}login_button.png")
+    assert not screen.matches(event, FakeImage(b"a" * 48))
@@ -0,0 +1,218 @@
+"""Py Replay Storage Tests
+
+Checks the streaming json reader against json.load and the binary recordings round trip.
+
+Author: Facundo Giacconi AKA "GiacconiDev"
+
+"""
+
+import json
+import os
+import struct
+
+import pytest
+
+import bench
+import storage
+
+
+# ---------------------------- CONSTANTS ------------------------------- #
+
+CHUNK_SIZES = (1, 2, 3, 5, 7, 16, 64, storage.READ_CHUNK_CHARS)
+
+VALID_JSON = (
+    '[]',
+    ' [ ] ',
+    '[1,2.5,3]',
+    '[-1.25e-3, 1E+10, 0, -0.5]',
+    '[true, false, null, "a,]b", "\\"\\u00e7"]',
+    '[{"action": "moved", "x": 10, "y": 20, "time": 1700000000.125, "duration": 0.35}]',
+    '[\n  {"a": [1, 2, {"b": "]"}]},\n  {"c": 12345678901234567890}\n]\n',
+)
+
+MALFORMED_JSON = (
+    '',
+    '[1,]',
+    '[1 2]',
+    '[1,2.5.3]',
+    '[1-]',
+    '[tru]',
+    '[{"action": "moved"',
+    '[1, 2',
+    '[1, 2,',
+    '[',
+)
+
+# ---------------------------- FUNCTIONS ------------------------------- #
+
+def write_text(folder, text, name="recording.json"):
+    path = os.path.join(folder, name)
+    with open(path, 'w') as f:
+        f.write(text)
+    return path
+
+@pytest.mark.parametrize("text", VALID_JSON)
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_json_reader_matches_json_load(tmp_path, text, chunk_size):
+    path = write_text(tmp_path, text)
+    assert list(storage.iter_json_events(path, chunk_size)) == json.loads(text)
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_json_reader_reads_a_saved_recording(tmp_path, chunk_size):
+    events = list(bench.synthetic_events(300, 0.35))
+    path = os.path.join(tmp_path, "recording.json")
+    storage.save_events(path, events)
+    with open(path) as f:
+        expected = json.load(f)
+    assert list(storage.iter_json_events(path, chunk_size)) == expected == events
+
+@pytest.mark.parametrize("text", MALFORMED_JSON)
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_json_reader_rejects_what_json_load_rejects(tmp_path, text, chunk_size):
+    path = write_text(tmp_path, text)
+    with pytest.raises(ValueError):
+        json.loads(text)
+    with pytest.raises(ValueError):
+        list(storage.iter_json_events(path, chunk_size))
+
+def test_json_reader_rejects_other_json_than_an_array(tmp_path):
+    path = write_text(tmp_path, '{"action": "moved"}')
+    with pytest.raises(ValueError, match="is not a json recording"):
+        list(storage.iter_json_events(path))
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_json_reader_reports_the_character_of_the_error(tmp_path, chunk_size):
+    text = '[1, 2, 3 x]'
+    path = write_text(tmp_path, text)
+    with pytest.raises(ValueError, match=f"'x' at character {text.index('x')}$"):
+        list(storage.iter_json_events(path, chunk_size))
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_json_reader_reports_the_character_of_invalid_json(tmp_path, chunk_size):
+    text = '[1, 2, {"a": }]'
+    path = write_text(tmp_path, text)
+    with pytest.raises(ValueError, match=f"at character {text.index('}')}:"):
+        list(storage.iter_json_events(path, chunk_size))
+
+@pytest.mark.parametrize("chunk_size", CHUNK_SIZES)
+def test_json_reader_truncated_recording(tmp_path, chunk_size):
+    events = list(bench.synthetic_events(20))
+    text = json.dumps(events)
+    for cut in range(1, len(text), 37):
+        path = write_text(tmp_path, text[:cut])
+        with pytest.raises(ValueError):
+            list(storage.iter_json_events(path, chunk_size))
+
+def every_action():
+    return [
+        {'action': 'pressed_key', 'key': 'a', 'time': 1700000000.125, 'duration': 0.0},
+        {'action': 'released_key', 'key': 'shift_r', 'time': 1700000000.25, 'duration': 0.125},
+        {'action': 'pressed_key', 'vk': 65437, 'time': 1700000000.5, 'duration': 0.25},
+        {'action': 'released_key', 'vk': 65437, 'time': 1700000000.75, 'duration': 0.25},
+        {'action': 'moved', 'x': -1920, 'y': 1080, 'time': 1700000001.0, 'duration': 0.35},
+        {'action': 'pressed_mouse', 'button': 'left', 'x': 10, 'y': 20, 'time': 1700000001.1, 'duration': 0.1},
+        {'action': 'released_mouse', 'button': 'right', 'x': 10, 'y': 20, 'time': 1700000001.2, 'duration': 0.1},
+        {'action': 'scroll', 'vertical_direction': -1, 'horizontal_direction': 2, 'x': 5, 'y': 6, 'time': 1700000001.3, 'duration': 0.1},
+        {'action': 'checkpoint', 'left': 10, 'top': 20, 'width': 64, 'height': 32, 'reference': "hash:9f86d081884c7d65",
+         'timeout': 30.0, 'time': 1700000001.4, 'duration': 0.5},
+    ]
+
+def save_binary(folder, events, name="recording.rec"):
+    path = os.path.join(folder, name)
+    storage.save_events(path, events)
+    return path
+
+def test_binary_round_trip_of_every_action(tmp_path):
+    events = every_action()
+    assert {event['action'] for event in events} == set(storage.OPCODES)
+    path = save_binary(tmp_path, events)
+    assert storage.is_binary_recording(path)
+    assert storage.recording_version(path) == storage.SHORT_NAMES_VERSION
+    assert storage.load_events(path) == events
+
+def test_binary_round_trip_across_read_chunks(tmp_path):
+    events = list(bench.synthetic_events(storage.READ_CHUNK_RECORDS * 2 + 17, 0.35))
+    path = save_binary(tmp_path, events)
+    assert storage.load_events(path) == events
+
+def test_binary_long_interned_names(tmp_path):
+    reference = f"{'image:'}{'ñandú_' * 10}login.png"
+    assert len(reference.encode('utf-8')) > storage.INTERN_NAME_BYTES * 2
+    events = every_action() + [
+        {'action': 'checkpoint', 'left': 0, 'top': 0, 'width': 8, 'height': 8, 'reference': reference,
+         'timeout': 2.5, 'time': 1700000002.0, 'duration': 1.0},
+        {'action': 'pressed_key', 'key': 'a', 'time': 1700000002.5, 'duration': 0.5},
+    ]
+    path = save_binary(tmp_path, events)
+    assert storage.recording_version(path) == storage.FORMAT_VERSION
+    assert storage.load_events(path) == events
+
+def test_split_name_never_splits_a_character():
+    name = "ç" * 40
+    pieces = storage.split_name(name)
+    assert all(len(piece) <= storage.INTERN_NAME_BYTES for piece in pieces)
+    assert "".join(piece.decode('utf-8') for piece in pieces) == name
+
+def test_recording_writer_streams_events(tmp_path):
+    path = os.path.join(tmp_path, "streamed.rec")
+    events = every_action()
+    with storage.RecordingWriter(path, flush_every=2) as writer:
+        for event in events[:4]:
+            writer.write(event)
+        # flushed events are readable while the recording goes on
+        assert storage.load_events(path) == events[:4]
+        for event in events[4:]:
+            writer.write(event)
+    assert writer.count == len(events)
+    assert storage.load_events(path) == events
+
+def test_binary_truncated_record_is_ignored(tmp_path):
+    events = every_action()
+    path = save_binary(tmp_path, events)
+    with open(path, 'r+b') as f:
+        f.truncate(os.path.getsize(path) - storage.RECORD.size // 2)
+    assert storage.load_events(path) == events[:-1]
+
+def test_binary_header_only(tmp_path):
+    path = save_binary(tmp_path, [])
+    assert os.path.getsize(path) == storage.HEADER.size
+    assert storage.load_events(path) == []
+
+@pytest.mark.parametrize("header", [b"", b"CPY", storage.HEADER.pack(b"CPYT", storage.FORMAT_VERSION, storage.RECORD.size)[:5]])
+def test_binary_short_header(tmp_path, header):
+    path = os.path.join(tmp_path, "short.rec")
+    with open(path, 'wb') as f:
+        f.write(header)
+    with pytest.raises(ValueError):
+        list(storage.iter_binary_events(path))
+
+@pytest.mark.parametrize("header", [
+    storage.HEADER.pack(b"NOPE", storage.FORMAT_VERSION, storage.RECORD.size),
+    storage.HEADER.pack(storage.MAGIC, storage.FORMAT_VERSION + 1, storage.RECORD.size),
+    storage.HEADER.pack(storage.MAGIC, storage.FORMAT_VERSION, storage.RECORD.size + 8),
+])
+def test_binary_unsupported_header(tmp_path, header):
+    path = os.path.join(tmp_path, "unsupported.rec")
+    with open(path, 'wb') as f:
+        f.write(header + storage.RECORD.pack(3, 0.0, 0.0, 1, 2, 0, 0))
+    with pytest.raises(ValueError):
+        list(storage.iter_binary_events(path))
+
+@pytest.mark.parametrize("record", [
+    # unknown opcode
+    storage.RECORD.pack(99, 0.0, 0.0, 0, 0, 0, 0),
+    # key name missing from the intern table
+    storage.RECORD.pack(storage.OPCODES['pressed_key'], 0.0, 0.0, 0, 0, 7, storage.KEY_BY_NAME),
+    # name that is not utf-8
+    storage.INTERN.pack(storage.OP_INTERN, 0, b"\xff\xfe"),
+])
+def test_binary_corrupt_record(tmp_path, record):
+    path = os.path.join(tmp_path, "corrupt.rec")
+    with open(path, 'wb') as f:
+        f.write(storage.HEADER.pack(storage.MAGIC, storage.FORMAT_VERSION, storage.RECORD.size))
+        f.write(storage.RECORD.pack(storage.OPCODES['moved'], 0.0, 0.0, 1, 2, 0, 0) + record)
+    with pytest.raises(ValueError, match=f"corrupt record at byte {storage.HEADER.size + storage.RECORD.size}"):
+        list(storage.iter_binary_events(path))
+
+def test_binary_records_and_interns_have_the_same_size():
+    assert storage.RECORD.size == storage.INTERN.size == struct.calcsize("<B3xdd4i")
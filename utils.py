@@ -7,6 +7,9 @@ GREEN = "#9bdeac"
 YELLOW = "#f7f5dd"
 FONT_NAME = "Courier"
 
+# Replay speed factors selectable from the main window
+REPLAY_SPEEDS = ["x1", "x2", "x4", "x8"]
+
 languages = {
     "names": ["English", "Español"],
     "langs": ["en", "es"]
@@ -25,6 +28,23 @@ i18n = [
         "minimize_when_record_label": "Minimize when start recording:",
         "stop_recording_key_label": "Stop recording key:",
         "stop_playing_key_label": "Stop playing key:",
+        "pause_playing_key_label": "Pause/resume playing key:",
+        "step_playing_key_label": "Step one event key (paused):",
+        "checkpoint_key_label": "Capture screen checkpoint key:",
+        "checkpoint_size_label": "Checkpoint size in pixels:",
+        "checkpoint_timeout_label": "Checkpoint timeout in seconds:",
+        "optimise_passes_label": "Optimise recordings with passes:",
+        "optimise_max_gap_label": "Cap gaps when optimising to seconds (0 off):",
+        "simplify_moves_label": "Simplify mouse moves after recording:",
+        "move_min_interval_label": "Min. seconds between mouse moves:",
+        "move_min_distance_label": "Min. pixels between mouse moves:",
+        "move_angle_threshold_label": "Mouse direction change (degrees):",
+        "replay_max_gap_label": "Max. seconds between replayed events (0 off):",
+        "replay_idle_threshold_label": "Collapse idle time to seconds (0 off):",
+        "replay_frame_rate_label": "Replay mouse moves at Hz (0 all):",
+        "instrumentation_label": "Save performance stats of sessions:",
+        "events_label": "events",
+        "compression_label": "Compress new recordings with:",
         "key_assignation_label": "Press a key to assign",
         "confirm": "Are you sure?",
         "yes": "Are you sure?",
@@ -36,6 +56,9 @@ i18n = [
         "record": "Record",
         "stop_recording_message": "Stop recording by pressing @ Key",
         "stop_playing_message": "Stop playing by pressing @ Key",
+        "pause_resume": "Pause/Resume",
+        "step": "Step",
+        "stop": "Stop",
     },
     {
         "options": "Opciones",
@@ -44,6 +67,23 @@ i18n = [
         "minimize_when_record_label": "Minimizar al iniciar grabación:",
         "stop_recording_key_label": "Tecla para terminar grabación:",
         "stop_playing_key_label": "Tecla para terminar reproducción:",
+        "pause_playing_key_label": "Tecla para pausar/reanudar reproducción:",
+        "step_playing_key_label": "Tecla para avanzar un evento (en pausa):",
+        "checkpoint_key_label": "Tecla para capturar un punto de control:",
+        "checkpoint_size_label": "Tamaño del punto de control en píxeles:",
+        "checkpoint_timeout_label": "Espera máx. del punto de control (segundos):",
+        "optimise_passes_label": "Optimizar grabaciones con los pasos:",
+        "optimise_max_gap_label": "Limitar esperas al optimizar a segundos (0 no):",
+        "simplify_moves_label": "Simplificar movimientos del ratón al grabar:",
+        "move_min_interval_label": "Segundos mín. entre movimientos del ratón:",
+        "move_min_distance_label": "Píxeles mín. entre movimientos del ratón:",
+        "move_angle_threshold_label": "Cambio de dirección del ratón (grados):",
+        "replay_max_gap_label": "Segundos máx. entre eventos reproducidos (0 no):",
+        "replay_idle_threshold_label": "Reducir inactividad a segundos (0 no):",
+        "replay_frame_rate_label": "Reproducir movimientos a Hz (0 todos):",
+        "instrumentation_label": "Guardar estadísticas de rendimiento:",
+        "events_label": "eventos",
+        "compression_label": "Comprimir grabaciones nuevas con:",
         "key_assignation_label": "Pulsa una tecla para asignar",
         "confirm": "¿Estas seguro?",
         "yes": "¿Estas seguro?",
@@ -55,6 +95,9 @@ i18n = [
         "record": "Grabar",
         "stop_recording_message": "Presiona @ para detener la captura de eventos",
         "stop_playing_message": "Presiona @ para detener la reproducción",
+        "pause_resume": "Pausar/Reanudar",
+        "step": "Avanzar",
+        "stop": "Detener",
     }
 ]
 